@@ -1,3 +1,3 @@
-from . import workflow_router
+from . import admin_router, workflow_router
 
-__all__ = ["workflow_router"]
+__all__ = ["admin_router", "workflow_router"]
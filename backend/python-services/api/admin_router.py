@@ -0,0 +1,99 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Literal, Optional
+from config.database import pool_stats, query_log
+from config.settings import settings
+from services.change_feed import change_feed
+from services.notifications import notification_listener
+from services.reference_cache import reference_cache
+from services.workflow_graph import workflow_graph
+from utils.profiling import ProfiledRoute
+from utils.single_flight import single_flight_stats
+import hmac
+import logging
+
+logger = logging.getLogger(__name__)
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    """
+    Every admin endpoint needs the X-Admin-Token header to match ADMIN_TOKEN;
+    without ADMIN_TOKEN the endpoints are disabled
+    """
+    if not settings.admin_token:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode("utf-8"), settings.admin_token.encode("utf-8")):
+        logger.warning("Admin request rejected: missing or invalid X-Admin-Token")
+        raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token")
+
+router = APIRouter(prefix="/admin", tags=["admin"], route_class=ProfiledRoute, dependencies=[Depends(require_admin_token)])
+
+@router.get("/cache")
+async def get_cache_stats():
+    """
+    Get reference data cache statistics (hit/miss counters, evictions, invalidations)
+    """
+    logger.info("GET /admin/cache - Fetching reference cache statistics")
+    stats = reference_cache.stats()
+    stats["listenerConnected"] = notification_listener.connected
+    return stats
+
+@router.post("/cache/clear")
+async def clear_cache():
+    """
+    Drop every reference data cache entry
+    """
+    logger.info("POST /admin/cache/clear - Clearing reference cache")
+    reference_cache.clear()
+    return {"message": "Reference cache cleared"}
+
+@router.get("/db-pools")
+async def get_db_pool_stats():
+    """
+    Get size, utilization and acquire-wait statistics of the primary and replica pools
+    """
+    logger.info("GET /admin/db-pools - Fetching database pool statistics")
+    return {"pools": pool_stats()}
+
+@router.get("/workflow-graph")
+async def get_workflow_graph_stats():
+    """
+    Get orchestrator graph index statistics (workflows, links, rebuilds)
+    """
+    logger.info("GET /admin/workflow-graph - Fetching workflow graph statistics")
+    return workflow_graph.stats()
+
+@router.get("/single-flight")
+async def get_single_flight_stats():
+    """
+    Get request coalescing statistics per single-flight group (leaders, coalesced, in flight)
+    """
+    logger.info("GET /admin/single-flight - Fetching single-flight statistics")
+    return {"groups": single_flight_stats()}
+
+@router.get("/change-feed")
+async def get_change_feed_stats():
+    """
+    Get workflow change feed statistics (subscribers, events, dropped subscribers)
+    """
+    logger.info("GET /admin/change-feed - Fetching change feed statistics")
+    return change_feed.stats()
+
+@router.get("/queries")
+async def get_query_stats(
+    sort: Literal["total", "mean", "max", "calls", "rows", "slow"] = Query("total", description="Order statements by this aggregate, highest first"),
+    limit: int = Query(50, ge=1, le=1000),
+    plans: bool = Query(False, description="Include the full EXPLAIN output of the captured plans")
+):
+    """
+    Get per-statement latency and row-count aggregates with the last captured plan of slow statements
+    """
+    logger.info("GET /admin/queries - Fetching statement statistics")
+    return query_log.stats(sort=sort, limit=limit, include_plans=plans)
+
+@router.post("/queries/reset")
+async def reset_query_stats():
+    """
+    Drop every statement aggregate and captured plan
+    """
+    logger.info("POST /admin/queries/reset - Resetting statement statistics")
+    query_log.reset()
+    return {"message": "Statement statistics reset"}
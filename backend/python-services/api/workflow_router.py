@@ -1,51 +1,41 @@
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
-from config.database import get_db
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, field_validator
+from datetime import datetime
+from typing import Any, List, Literal, Optional
+from config.database import get_db, get_read_db
+from config.settings import settings
 from models.document import DocumentConfig
-from models.workflow import WorkflowDetail
+from models.workflow import ConditionalSaveWorkflowRequest, SaveWorkflowRequest, WorkflowDetail, naive_utc
+from services.change_feed import HEARTBEAT, ChangeFeedFull, Subscription, change_feed
+from services.prompt_composer import compose_prompt, iter_prompt
+from services.reference_cache import DATAPOINTS_KEY, DOCTYPES_KEY, reference_cache
+from services.test_data_sampler import TestDataSampler
+from services.test_run_executor import test_run_executor
+from services.workflow_bulk import BulkImportError, import_workflows, iter_export, iter_ndjson_lines
+from services.workflow_graph import workflow_graph
+from services.workflow_patch import InvalidPatchedWorkflow, WorkflowVersionConflict, patch_workflow
+from services.workflow_repository import (
+    WORKFLOW_LIST_COLUMNS,
+    WorkflowRepository,
+    build_workflow_list_query,
+    build_workflow_search_query,
+    normalize_workflow_row,
+)
+from services.workflow_save import SAVE_UNCHANGED, save_workflow_changes
+from services.workflow_validator import validate_links, validate_steps
+from utils.json_patch import JsonPatchError, JsonPatchTestFailed
+from utils.profiling import ProfiledRoute
+from utils.single_flight import flight_key, single_flight
+from utils.transport import json_bytes, json_response, make_etag, not_modified, set_etag
+import asyncio
+import hashlib
 import logging
-import json
+import time
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(tags=["workflow"])
-
-def compose_prompt(workflow_data: List[dict]) -> str:
-    """
-    Compose a formatted prompt from workflow steps.
-
-    Args:
-        workflow_data: List of workflow step dictionaries
-
-    Returns:
-        Formatted prompt string combining all workflow steps
-    """
-    output_blocks = []
-
-    for item in workflow_data:
-        step_id = item.get("id", "")
-        node = item.get("node", "")
-        prerequisite = (item.get("prerequisite") or "").strip()
-        prompt = (item.get("prompt") or "").strip()
-        note = (item.get("note") or "").strip()
-
-        block_lines = [
-            f"## STEP {step_id}: Invoke node `{node}`"
-        ]
-
-        if prerequisite:
-            block_lines.append(f"**PREREQUISITES TO EXECUTE THIS STEP**\n{prerequisite}\n**INSTRUCTIONS OF THE STEP:**")
-
-        if prompt:
-            block_lines.append(prompt)
-
-        if note:
-            block_lines.append(f"**IMPORTANT NOTE**\n{note}")
-
-        output_blocks.append("\n".join(block_lines))
-
-    return "\n\n".join(output_blocks)
+router = APIRouter(tags=["workflow"], route_class=ProfiledRoute)
 
 class WorkflowRequest(BaseModel):
     name: str
@@ -65,6 +55,9 @@ class CreateWorkflowRequest(BaseModel):
 class GetWorkflowDetailsRequest(BaseModel):
     id: int
 
+class GetWorkflowDetailsBatchRequest(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=500)
+
 class DatapointItem(BaseModel):
     id: int
     datapointName: str
@@ -73,6 +66,11 @@ class WorkflowDetailsResponse(BaseModel):
     workflowDetails: dict
     datapointList: List[DatapointItem]
 
+class WorkflowDetailsBatchResponse(BaseModel):
+    workflows: List[dict]
+    datapointList: List[DatapointItem]
+    notFound: List[int]
+
 class WorkflowResponse(BaseModel):
     id: str
     name: str
@@ -81,79 +79,182 @@ class WorkflowResponse(BaseModel):
     status: str
 
 @router.get("/documents", response_model=List[str])
-async def get_documents():
+async def get_documents(request: Request, response: Response):
     """
     Get all document types from gpt_doc_config table
-    Returns list of unique document types
+    Returns list of unique document types (served from the reference data cache)
     """
-    logger.info("GET /documents - Fetching document types from database")
+    logger.info("GET /documents - Fetching document types")
     try:
-        pool = await get_db()
-        query = "SELECT DISTINCT doctype FROM common.gpt_doc_config ORDER BY doctype"
-        logger.debug(f"Executing query: {query}")
-
-        rows = await pool.fetch(query)
-        logger.info(f"Query executed successfully. Retrieved {len(rows)} document types")
-
-        documents = [row["doctype"] for row in rows]
+        pool = await get_read_db()
+        documents = await reference_cache.get_doctypes(pool)
+
+        etag = reference_cache.etag(DOCTYPES_KEY, documents)
+        cached = not_modified(request, etag)
+        if cached:
+            return cached
+        set_etag(response, etag)
         logger.info(f"Returning {len(documents)} documents: {documents[:5]}{'...' if len(documents) > 5 else ''}")
 
+        if settings.fast_json_responses:
+            # Serialized once per cached list rather than once per request
+            headers = {name: response.headers[name] for name in ("ETag", "Cache-Control")}
+            return Response(content=reference_cache.json_body(DOCTYPES_KEY, documents), media_type="application/json", headers=headers)
+
         return documents
     except Exception as e:
         logger.error(f"Error fetching documents: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/documents/config", response_model=List[DocumentConfig])
+async def get_document_configs(
+    doctype: Optional[str] = None,
+    category: Optional[str] = None,
+    provider: Optional[str] = None
+):
+    """
+    Get gpt_doc_config rows, optionally filtered by doctype, category and provider
+    """
+    logger.info(f"GET /documents/config - doctype={doctype}, category={category}, provider={provider}")
+    try:
+        pool = await get_read_db()
+        index = await reference_cache.get_document_configs(pool)
+        configs = index.filter(doctype=doctype, category=category, provider=provider)
+        logger.info(f"Returning {len(configs)} document configs")
+
+        return configs
+    except Exception as e:
+        logger.error(f"Error fetching document configs: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+def workflow_list_etag(key: tuple, rows) -> str:
+    """
+    Compute the ETag of a workflow list page from its (id, updated_at) pairs.
+
+    `key` is the normalized route and parameters (see flight_key).
+
+    Any insert, update or delete touching the page changes the fingerprint, so
+    the same ETag comes out of a narrow id/updated_at query (to answer
+    If-None-Match) and of the full rows (when serving a 200).
+    """
+    fingerprint = hashlib.sha256()
+    for row in rows:
+        updated_at = row["updated_at"]
+        fingerprint.update(f"{row['id']}:{updated_at.isoformat() if updated_at else ''},".encode("utf-8"))
+    params = [item for item in key[1:] if item[0] != "generation"]
+    return make_etag("workflows", params, len(rows), fingerprint.hexdigest())
+
+# Coalesces identical concurrent GET /workflows loads
+workflow_flights = single_flight("workflows")
+
+# Number of rows fetched per round trip when streaming workflows
+WORKFLOW_STREAM_PREFETCH = 500
+
+# WorkflowDetail fields in declaration order, i.e. the serialized key order
+WORKFLOW_DETAIL_FIELDS = tuple(WorkflowDetail.model_fields)
+
+def workflow_list_item(row) -> dict:
+    """
+    WorkflowDetail-shaped dict built straight from a list row.
+
+    Serializes to the same JSON as WorkflowDetail(**normalize_workflow_row(row))
+    without creating (and later re-validating) a model per row.
+    """
+    row_dict = normalize_workflow_row(row)
+    return {field: row_dict.get(field) for field in WORKFLOW_DETAIL_FIELDS}
+
+async def stream_workflows(repository: WorkflowRepository, query: str, params: list):
+    """
+    Yield workflows as NDJSON lines from a server-side asyncpg cursor.
+    """
+    async for row in repository.iter_list(query, params, WORKFLOW_STREAM_PREFETCH):
+        if settings.fast_json_responses:
+            yield json_bytes(workflow_list_item(row)) + b"\n"
+        else:
+            yield WorkflowDetail(**normalize_workflow_row(row)).model_dump_json() + "\n"
+
 @router.get("/workflows", response_model=List[WorkflowDetail])
-async def get_all_workflows():
+async def get_all_workflows(
+    request: Request,
+    response: Response,
+    cursor: Optional[int] = Query(None, description="Return workflows with id greater than this cursor"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit to return every matching workflow"),
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    flowType: Optional[str] = None,
+    runtype: Optional[str] = None,
+    stream: bool = Query(False, description="Stream workflows as NDJSON instead of a JSON array")
+):
     """
-    Get all workflow details from mortgage_workflow table
+    Get workflow details from mortgage_workflow table
     Returns workflow details with id, workflowName, description, category, doc_type, other_doc, version, flowType
+
+    Supports keyset pagination on id (cursor/limit), server-side filters and
+    NDJSON streaming. When a page is full, the cursor for the next page is
+    returned in the X-Next-Cursor header. Non-streamed responses carry an ETag
+    and answer If-None-Match with 304.
     """
-    logger.info("GET /workflows - Fetching all workflows from database")
+    logger.info(f"GET /workflows - Fetching workflows (cursor={cursor}, limit={limit}, stream={stream})")
     try:
-        pool = await get_db()
-        query = """
-            SELECT
-                id,
-                "workflowName",
-                description,
-                category,
-                doc_type,
-                other_doc,
-                version,
-                "flowType",
-                data_point,
-                runtype
-            FROM common.mortgage_workflow
-            ORDER BY id
-        """
-        logger.debug(f"Executing query: {query}")
-
-        rows = await pool.fetch(query)
-        logger.info(f"Query executed successfully. Retrieved {len(rows)} workflows")
-
-        workflows = []
-        for row in rows:
-            row_dict = dict(row)
-            # Handle other_doc - can be array (list) or string for backward compatibility
-            if row_dict.get('other_doc'):
-                if isinstance(row_dict['other_doc'], str):
-                    # Old format: comma-separated string
-                    other_docs_str = row_dict['other_doc']
-                    row_dict['other_doc'] = [doc.strip() for doc in other_docs_str.split(',') if doc.strip()]
-                    logger.debug(f"Converted other_doc from string '{other_docs_str}' to list {row_dict['other_doc']}")
-                # else: already a list from database array type
+        pool = await get_read_db()
+        repository = WorkflowRepository(pool)
+
+        if stream:
+            query, params = build_workflow_list_query(cursor, limit, category, doc_type, flowType, runtype)
+            logger.debug(f"Streaming query: {query}")
+            return StreamingResponse(
+                stream_workflows(repository, query, params),
+                media_type="application/x-ndjson"
+            )
+
+        # Fetch one extra row to know whether another page exists
+        page_limit = limit + 1 if limit is not None else None
+        list_args = (cursor, page_limit, category, doc_type, flowType, runtype)
+        # Concurrent identical reads share one query; the cache generation is
+        # part of the key so a read never joins a load that started before a write
+        key = flight_key(
+            "workflows", generation=reference_cache.generation, cursor=cursor, limit=limit,
+            category=category, doc_type=doc_type, flowType=flowType, runtype=runtype
+        )
+
+        if request.headers.get("if-none-match"):
+            # Revalidation: fingerprint the page from a narrow query before fetching bodies
+            async def load_etag():
+                version_query, params = build_workflow_list_query(*list_args, columns="id, updated_at")
+                return workflow_list_etag(key, await repository.fetch_list(version_query, params))
+            cached = not_modified(request, await workflow_flights.do(("etag",) + key, load_etag))
+            if cached:
+                return cached
+
+        async def load_page():
+            query, params = build_workflow_list_query(*list_args, columns=WORKFLOW_LIST_COLUMNS + ", updated_at")
+            logger.debug(f"Executing query: {query}")
+            rows = await repository.fetch_list(query, params)
+            logger.info(f"Query executed successfully. Retrieved {len(rows)} workflows")
+            page = {"etag": workflow_list_etag(key, rows), "nextCursor": None}
+            if limit is not None and len(rows) > limit:
+                rows = rows[:limit]
+                page["nextCursor"] = str(rows[-1]["id"])
+            page["count"] = len(rows)
+            if settings.fast_json_responses:
+                # Serialized once for every request sharing this load
+                page["body"] = json_bytes([workflow_list_item(row) for row in rows])
             else:
-                row_dict['other_doc'] = None
+                page["rows"] = rows
+            return page
 
-            # Use data_point as workflowName if workflowName is not present
-            if not row_dict.get('workflowName') and row_dict.get('data_point'):
-                row_dict['workflowName'] = row_dict['data_point']
-                logger.debug(f"Using data_point '{row_dict['data_point']}' as workflowName")
+        page = await workflow_flights.do(key, load_page)
+        set_etag(response, page["etag"])
+        if page["nextCursor"] is not None:
+            response.headers["X-Next-Cursor"] = page["nextCursor"]
+        logger.info(f"Returning {page['count']} workflows")
 
-            workflows.append(WorkflowDetail(**row_dict))
+        if settings.fast_json_responses:
+            # Fast path: rows -> dicts -> JSON bytes, bypassing response_model validation
+            headers = {name: response.headers[name] for name in ("ETag", "Cache-Control", "X-Next-Cursor") if name in response.headers}
+            return Response(content=page["body"], media_type="application/json", headers=headers)
 
-        logger.info(f"Returning {len(workflows)} workflows")
+        workflows = [WorkflowDetail(**normalize_workflow_row(row)) for row in page["rows"]]
 
         if workflows:
             logger.debug(f"Sample workflow: {workflows[0].workflowName if workflows[0].workflowName else 'N/A'}")
@@ -163,6 +264,165 @@ async def get_all_workflows():
         logger.error(f"Error fetching workflows: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.get("/workflows/export")
+async def export_workflows(
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    flowType: Optional[str] = None,
+    runtype: Optional[str] = None
+):
+    """
+    Export workflows (settings and steps) as NDJSON, one workflow per line.
+
+    The output can be fed back to POST /workflows/import.
+    """
+    logger.info(f"GET /workflows/export - Exporting workflows (category={category}, doc_type={doc_type})")
+    try:
+        pool = await get_read_db()
+        return StreamingResponse(
+            iter_export(pool, category, doc_type, flowType, runtype),
+            media_type="application/x-ndjson",
+            headers={"Content-Disposition": 'attachment; filename="workflows.ndjson"'}
+        )
+    except Exception as e:
+        logger.error(f"Error exporting workflows: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+class WorkflowSearchResult(WorkflowDetail):
+    score: float
+
+class WorkflowSearchResponse(BaseModel):
+    query: str
+    results: List[WorkflowSearchResult]
+    nextOffset: Optional[int] = None
+
+@router.get("/workflows/search", response_model=WorkflowSearchResponse)
+async def search_workflows(
+    q: str = Query(..., min_length=2, max_length=200, description="Text to look for in names, descriptions, datapoints, document types and step prompts"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    flowType: Optional[str] = None,
+    runtype: Optional[str] = None
+):
+    """
+    Ranked substring and fuzzy search over workflows.
+
+    Backed by the pg_trgm index from sql/004_workflow_search.sql. Results are
+    ordered by score (name matches first); when a page is full, nextOffset
+    gives the offset of the next page.
+    """
+    logger.info(f"GET /workflows/search - Searching workflows (q={q!r}, limit={limit}, offset={offset})")
+    try:
+        pool = await get_read_db()
+        repository = WorkflowRepository(pool)
+
+        # Fetch one extra row to know whether another page exists
+        query, params = build_workflow_search_query(q, limit + 1, offset, category, doc_type, flowType, runtype)
+        rows = await repository.search(query, params)
+        next_offset = offset + limit if len(rows) > limit else None
+        rows = rows[:limit]
+        logger.info(f"Search returned {len(rows)} workflows")
+
+        results = [dict(workflow_list_item(row), score=round(row["score"], 4)) for row in rows]
+        content = {"query": q, "results": results, "nextOffset": next_offset}
+        if settings.fast_json_responses:
+            return json_response(content)
+        return WorkflowSearchResponse(**content)
+    except Exception as e:
+        logger.error(f"Error searching workflows: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+class ImportErrorItem(BaseModel):
+    line: int
+    error: str
+
+class WorkflowImportResponse(BaseModel):
+    received: int
+    inserted: int
+    updated: int
+    invalid: int
+    errors: List[ImportErrorItem]
+    durationMs: float
+
+async def stream_changes(subscription: Subscription):
+    """Yield queued change frames, with a heartbeat comment whenever the stream is idle"""
+    try:
+        # Ask EventSource to reconnect quickly; it then sends Last-Event-ID itself
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                frame = await asyncio.wait_for(subscription.queue.get(), timeout=settings.change_feed_heartbeat_seconds)
+            except asyncio.TimeoutError:
+                yield HEARTBEAT
+                continue
+            if frame is None:
+                break
+            yield frame
+    finally:
+        change_feed.unsubscribe(subscription)
+
+@router.get("/workflows/changes")
+async def workflow_changes(
+    lastEventId: Optional[str] = Query(None, description="Resume after this event (same as the Last-Event-ID header)"),
+    last_event_id: Optional[str] = Header(None)
+):
+    """
+    Server-Sent Events stream of workflow changes (create, update, save, delete).
+
+    Each "change" event carries {op, id, version, updated_at}. A "resync"
+    event means changes may have been missed and the list should be
+    refetched. All subscribers share the process's single LISTEN connection.
+    """
+    try:
+        subscription = change_feed.subscribe(last_event_id or lastEventId)
+    except ChangeFeedFull as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+
+    logger.info(f"GET /workflows/changes - Subscriber connected ({change_feed.stats()['subscribers']} open)")
+    return StreamingResponse(
+        stream_changes(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.post("/workflows/import", response_model=WorkflowImportResponse)
+async def import_workflows_ndjson(
+    request: Request,
+    mode: str = Query("insert", pattern="^(insert|upsert)$", description="insert creates new workflows; upsert overwrites by id"),
+    batch_size: int = Query(1000, ge=1, le=10000),
+    skip_invalid: bool = Query(False, description="Import valid lines even when some lines are invalid")
+):
+    """
+    Import workflows from an NDJSON request body (one SaveWorkflowRequest per line).
+
+    Lines may also carry id and version (as produced by /workflows/export).
+    The prompt of every workflow is composed from its steps. Invalid lines
+    roll back the whole import (422) unless skip_invalid is set.
+    """
+    logger.info(f"POST /workflows/import - Importing workflows (mode={mode}, batch_size={batch_size})")
+    try:
+        pool = await get_db()
+        result = await import_workflows(
+            pool,
+            iter_ndjson_lines(request.stream()),
+            mode=mode,
+            batch_size=batch_size,
+            skip_invalid=skip_invalid
+        )
+        if result["inserted"] or result["updated"]:
+            reference_cache.invalidate_table("mortgage_workflow")
+            workflow_graph.invalidate()
+        return result
+    except BulkImportError as e:
+        logger.warning(f"Workflow import rejected: {str(e)}")
+        raise HTTPException(status_code=422, detail={"message": str(e), "invalid": e.invalid, "errors": e.errors})
+    except Exception as e:
+        logger.error(f"Error importing workflows: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @router.post("/workflows", response_model=WorkflowResponse)
 async def create_workflow(workflow: WorkflowRequest):
     """
@@ -211,46 +471,20 @@ async def update_workflow(workflow_id: int, workflow: CreateWorkflowRequest):
     logger.debug(f"Update details: name={workflow.workflowName}, type={workflow.flowType}, category={workflow.category}")
 
     try:
-        pool = await get_db()
+        repository = WorkflowRepository(await get_db())
+
+        logger.debug(f"Executing update query for workflow ID {workflow_id}")
 
-        # Check if workflow exists
-        check_query = "SELECT id FROM common.mortgage_workflow WHERE id = $1"
-        existing = await pool.fetchrow(check_query, workflow_id)
+        # Update the workflow; no row back means it does not exist
+        row = await repository.update_metadata(workflow_id, workflow)
 
-        if not existing:
+        if not row:
             logger.warning(f"Workflow with ID {workflow_id} not found")
             raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
 
-        # Update the workflow
-        update_query = """
-            UPDATE common.mortgage_workflow
-            SET
-                "workflowName" = $1,
-                description = $2,
-                category = $3,
-                doc_type = $4,
-                other_doc = $5,
-                version = $6,
-                "flowType" = $7,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = $8
-            RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType"
-        """
-
-        logger.debug(f"Executing update query for workflow ID {workflow_id}")
-
-        row = await pool.fetchrow(
-            update_query,
-            workflow.workflowName,
-            workflow.description,
-            workflow.category,
-            workflow.doc_type,
-            workflow.other_doc,
-            workflow.version,
-            workflow.flowType,
-            workflow_id
-        )
-
+        # Name, category and version are listed by /workflows (and /datapoints)
+        reference_cache.invalidate_table("mortgage_workflow")
+        workflow_graph.invalidate(workflow_id)
         logger.info(f"Workflow {workflow_id} updated successfully")
 
         # Convert the result to response format
@@ -274,19 +508,15 @@ async def delete_workflow(workflow_id: int):
     logger.info(f"DELETE /workflows/{workflow_id} - Deleting workflow by ID")
 
     try:
-        pool = await get_db()
+        repository = WorkflowRepository(await get_db())
 
-        # Check if workflow exists
-        check_query = "SELECT id FROM common.mortgage_workflow WHERE id = $1"
-        existing = await pool.fetchrow(check_query, workflow_id)
-
-        if not existing:
+        # Delete the workflow; nothing deleted means it does not exist
+        if not await repository.delete(workflow_id):
             logger.warning(f"Workflow with ID {workflow_id} not found")
             raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
 
-        # Delete the workflow
-        delete_query = "DELETE FROM common.mortgage_workflow WHERE id = $1"
-        await pool.execute(delete_query, workflow_id)
+        reference_cache.invalidate_table("mortgage_workflow")
+        workflow_graph.invalidate(workflow_id)
 
         logger.info(f"Workflow {workflow_id} deleted successfully")
         return {"message": "Workflow deleted successfully", "id": workflow_id}
@@ -297,71 +527,133 @@ async def delete_workflow(workflow_id: int):
         logger.error(f"Error deleting workflow: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+def workflow_details_etag(row, datapoint_etag: str) -> str:
+    """ETag of a workflow details response from the row version and the datapoint list"""
+    updated_at = row["updated_at"]
+    return make_etag("workflow", row["id"], updated_at.isoformat() if updated_at else "", row["version"], datapoint_etag)
+
+def workflow_details_dict(row) -> dict:
+    """Workflow details row as a response dict"""
+    workflow_dict = dict(row)
+
+    # Convert updated_at to string if present
+    if workflow_dict.get('updated_at'):
+        workflow_dict['updated_at'] = workflow_dict['updated_at'].isoformat()
+
+    return workflow_dict
+
+async def load_workflow_details(workflow_id: int, http_request: Request, response: Response):
+    """
+    Fetch one workflow with the datapoint list, honouring If-None-Match.
+
+    When the client revalidates, only the row's updated_at/version are read
+    before deciding between a 304 and the full body.
+    """
+    pool = await get_read_db()
+    repository = WorkflowRepository(pool)
+
+    # Get all datapoints (where data_point is not null)
+    datapoint_list = await reference_cache.get_datapoints(pool)
+    datapoint_etag = reference_cache.etag(DATAPOINTS_KEY, datapoint_list)
+
+    if http_request.headers.get("if-none-match"):
+        version_row = await repository.get_version(workflow_id)
+        if version_row:
+            cached = not_modified(http_request, workflow_details_etag(version_row, datapoint_etag))
+            if cached:
+                return cached
+
+    # Get workflow details
+    workflow_row = await repository.get_details(workflow_id)
+
+    if not workflow_row:
+        logger.warning(f"Workflow with ID {workflow_id} not found")
+        raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+
+    set_etag(response, workflow_details_etag(workflow_row, datapoint_etag))
+    workflow_dict = workflow_details_dict(workflow_row)
+
+    # Handle JSONB workflow field - asyncpg returns it as list/dict already
+    # No need to parse, FastAPI will serialize it properly
+    if workflow_dict.get('workflow') is not None:
+        logger.info(f"Workflow field type: {type(workflow_dict['workflow'])}, "
+                   f"contains {len(workflow_dict['workflow']) if isinstance(workflow_dict['workflow'], list) else 'N/A'} steps")
+
+    logger.info(f"Workflow details retrieved for: {workflow_dict.get('workflowName')}")
+    logger.info(f"Retrieved {len(datapoint_list)} datapoints")
+
+    return WorkflowDetailsResponse(
+        workflowDetails=workflow_dict,
+        datapointList=datapoint_list
+    )
+
 @router.post("/getworkflowdetails", response_model=WorkflowDetailsResponse)
-async def get_workflow_details(request: GetWorkflowDetailsRequest):
+async def get_workflow_details(request: GetWorkflowDetailsRequest, http_request: Request, response: Response):
     """
     Get workflow details by ID and return all datapoints
     """
     logger.info(f"POST /getworkflowdetails - Fetching workflow details for ID: {request.id}")
 
     try:
-        pool = await get_db()
+        return await load_workflow_details(request.id, http_request, response)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching workflow details: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-        # Get workflow details
-        workflow_query = """
-            SELECT
-                id, category, doc_type, prompt, is_informational, data_point, is_contextual,
-                output_structure, other_doc, output_category, note, is_image_analysis,
-                updated_at, isconsistent, iterations, model_name, "workflowName", description,
-                workflow, "flowType", version, "connectedPrompts", "parentOrchestrator", runtype
-            FROM common.mortgage_workflow
-            WHERE id = $1
-        """
-
-        workflow_row = await pool.fetchrow(workflow_query, request.id)
-
-        if not workflow_row:
-            logger.warning(f"Workflow with ID {request.id} not found")
-            raise HTTPException(status_code=404, detail=f"Workflow with ID {request.id} not found")
-
-        workflow_dict = dict(workflow_row)
-
-        # Convert updated_at to string if present
-        if workflow_dict.get('updated_at'):
-            workflow_dict['updated_at'] = workflow_dict['updated_at'].isoformat()
-
-        # Handle JSONB workflow field - asyncpg returns it as list/dict already
-        # No need to parse, FastAPI will serialize it properly
-        if workflow_dict.get('workflow') is not None:
-            logger.info(f"Workflow field type: {type(workflow_dict['workflow'])}, "
-                       f"contains {len(workflow_dict['workflow']) if isinstance(workflow_dict['workflow'], list) else 'N/A'} steps")
-
-        logger.info(f"Workflow details retrieved for: {workflow_dict.get('workflowName')}")
-
-        # Get all datapoints (where data_point is not null)
-        datapoint_query = """
-            SELECT DISTINCT id, data_point as "datapointName"
-            FROM common.mortgage_workflow
-            WHERE data_point IS NOT NULL
-            ORDER BY data_point
-        """
-
-        datapoint_rows = await pool.fetch(datapoint_query)
-        datapoint_list = [{"id": row["id"], "datapointName": row["datapointName"]} for row in datapoint_rows]
-
-        logger.info(f"Retrieved {len(datapoint_list)} datapoints")
-
-        return WorkflowDetailsResponse(
-            workflowDetails=workflow_dict,
-            datapointList=datapoint_list
-        )
+@router.get("/getworkflowdetails", response_model=WorkflowDetailsResponse)
+async def get_workflow_details_cacheable(id: int, http_request: Request, response: Response):
+    """
+    Get workflow details by ID (cacheable GET variant supporting conditional requests)
+    """
+    logger.info(f"GET /getworkflowdetails - Fetching workflow details for ID: {id}")
 
+    try:
+        return await load_workflow_details(id, http_request, response)
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error fetching workflow details: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@router.post("/getworkflowdetails/batch", response_model=WorkflowDetailsBatchResponse)
+async def get_workflow_details_batch(request: GetWorkflowDetailsBatchRequest):
+    """
+    Get the details of several workflows (e.g. an orchestrator and its children) at once.
+
+    All rows are fetched with a single query and the datapoint list is
+    returned once for the whole batch. Workflows come back in request order;
+    ids that do not exist are listed in notFound instead of failing the batch.
+    """
+    logger.info(f"POST /getworkflowdetails/batch - Fetching workflow details for {len(request.ids)} IDs")
+
+    try:
+        pool = await get_read_db()
+        repository = WorkflowRepository(pool)
+
+        # Preserve the request order while dropping duplicate ids
+        workflow_ids = list(dict.fromkeys(request.ids))
+
+        datapoint_list = await reference_cache.get_datapoints(pool)
+        rows_by_id = {row["id"]: row for row in await repository.get_details_many(workflow_ids)}
+
+        workflows = [workflow_details_dict(rows_by_id[workflow_id]) for workflow_id in workflow_ids if workflow_id in rows_by_id]
+        not_found = [workflow_id for workflow_id in workflow_ids if workflow_id not in rows_by_id]
+
+        if not_found:
+            logger.warning(f"Workflows not found: {not_found}")
+        logger.info(f"Workflow details retrieved for {len(workflows)} workflows")
+
+        return WorkflowDetailsBatchResponse(
+            workflows=workflows,
+            datapointList=datapoint_list,
+            notFound=not_found
+        )
+    except Exception as e:
+        logger.error(f"Error fetching workflow details batch: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @router.post("/createworkflow", response_model=WorkflowDetail)
 async def create_new_workflow(workflow: CreateWorkflowRequest):
     """
@@ -371,39 +663,15 @@ async def create_new_workflow(workflow: CreateWorkflowRequest):
     logger.debug(f"Workflow details: type={workflow.flowType}, doc_type={workflow.doc_type}, category={workflow.category}")
 
     try:
-        pool = await get_db()
-
-        # Insert the new workflow into the database
-        query = """
-            INSERT INTO common.mortgage_workflow
-            (
-                "workflowName",
-                category,
-                doc_type,
-                other_doc,
-                version,
-                "flowType",
-                updated_at
-            )
-            VALUES
-            (
-                $1, $2, $3, $4, $5, $6, CURRENT_TIMESTAMP
-            )
-            RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType"
-        """
+        repository = WorkflowRepository(await get_db())
 
         logger.debug(f"Executing insert query with values: name={workflow.workflowName}, type={workflow.flowType}, other_doc={workflow.other_doc}")
 
-        row = await pool.fetchrow(
-            query,
-            workflow.workflowName,
-            workflow.category,
-            workflow.doc_type,
-            workflow.other_doc,
-            workflow.version,
-            workflow.flowType
-        )
+        # Insert the new workflow into the database
+        row = await repository.create(workflow)
 
+        reference_cache.invalidate_table("mortgage_workflow")
+        workflow_graph.invalidate(row["id"])
         logger.info(f"Workflow created successfully with ID: {row['id']}")
 
         # Convert the result to response format
@@ -417,85 +685,126 @@ async def create_new_workflow(workflow: CreateWorkflowRequest):
         logger.error(f"Error creating workflow: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-class SaveWorkflowRequest(BaseModel):
-    workflowName: str
-    description: Optional[str] = None
-    category: str
-    doc_type: str
-    other_doc: Optional[List[str]] = None
-    flowType: str
-    runtype: Optional[str] = 'loan'
+class ComposePromptRequest(BaseModel):
     workflow: List[dict]
-    data_point: Optional[str] = None
+
+@router.post("/workflows/compose-prompt")
+async def preview_composed_prompt(request: ComposePromptRequest):
+    """
+    Stream the prompt composed from the given workflow steps as plain text
+    """
+    logger.info(f"POST /workflows/compose-prompt - Composing prompt for {len(request.workflow)} steps")
+    return StreamingResponse(iter_prompt(request.workflow), media_type="text/plain; charset=utf-8")
+
+class ValidateWorkflowRequest(BaseModel):
+    # Steps are checked by the validator itself, so any JSON value is accepted here
+    workflow: List[Any]
+    # Optional: the workflow being edited and its proposed orchestrator links
+    workflowId: Optional[int] = None
+    connectedPrompts: Optional[List[int]] = None
+    parentOrchestrator: Optional[List[int]] = None
+
+@router.post("/workflows/validate")
+async def validate_workflow(request: ValidateWorkflowRequest):
+    """
+    Validate a workflow without saving it
+
+    Checks the steps (schema, duplicate ids, missing nodes, unknown
+    connections, cycles; prerequisite findings are warnings) and, when workflowId or links are
+    given, that the orchestrator links point at existing workflows and do not
+    form a cycle. Accepts the save payload as is; other fields are ignored.
+    """
+    logger.info(f"POST /workflows/validate - Validating {len(request.workflow)} steps")
+
+    try:
+        start = time.perf_counter()
+        result = validate_steps(request.workflow)
+
+        if request.workflowId is not None or request.connectedPrompts is not None or request.parentOrchestrator is not None:
+            await workflow_graph.ensure_fresh(await get_db())
+            validate_links(workflow_graph, request.workflowId, request.connectedPrompts, request.parentOrchestrator, result)
+
+        logger.info(f"Workflow validation found {result.error_count} errors and {result.warning_count} warnings")
+        return dict(
+            result.to_dict(),
+            stepCount=len(request.workflow),
+            durationMs=round((time.perf_counter() - start) * 1000, 3)
+        )
+
+    except Exception as e:
+        logger.error(f"Error validating workflow: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Error validating workflow: {str(e)}")
+
+def reject_invalid_steps(steps: List[dict]):
+    """Save-time validation: 422 with the issues when the steps have errors"""
+    if not settings.validate_workflows_on_save:
+        return
+    result = validate_steps(steps)
+    if not result.valid:
+        logger.warning(f"Workflow save rejected: {result.summary()}")
+        raise HTTPException(status_code=422, detail=dict(
+            result.to_dict(),
+            message=f"The workflow has {result.error_count} validation errors"
+        ))
+
+async def rejected_save(repository: WorkflowRepository, workflow_id: int) -> HTTPException:
+    """
+    Why a guarded save wrote nothing: 404 when the workflow does not exist,
+    otherwise 409 with its current state so the client can merge and retry.
+    """
+    row = await repository.get_details(workflow_id)
+    if row is None:
+        logger.warning(f"Workflow with ID {workflow_id} not found")
+        return HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+    current = workflow_details_dict(row)
+    logger.warning(f"Save of workflow {workflow_id} rejected: it is at version {row['version']} ({current.get('updated_at')})")
+    return HTTPException(status_code=409, detail={
+        "message": f"Workflow {workflow_id} was changed since it was read",
+        "currentVersion": row["version"] or 1,
+        "currentUpdatedAt": current.get("updated_at"),
+        "current": current,
+    })
 
 @router.put("/workflows/{workflow_id}/save")
-async def save_workflow_normal(workflow_id: int, request: SaveWorkflowRequest):
+async def save_workflow_normal(workflow_id: int, request: ConditionalSaveWorkflowRequest):
     """
     Save workflow - overwrites existing workflow steps and settings
+
+    Only what changed is written: a payload identical to the stored workflow
+    returns at once (changed=false) and a settings-only change leaves the
+    steps and prompt untouched. With expectedVersion and/or expectedUpdatedAt
+    the save only applies when the workflow still matches them, otherwise 409
+    with its current state. Steps that fail validation are rejected with 422.
     """
     logger.info(f"PUT /workflows/{workflow_id}/save - Normal save for workflow")
     logger.debug(f"Save details: name={request.workflowName}, steps count={len(request.workflow)}")
+    reject_invalid_steps(request.workflow)
 
     try:
         pool = await get_db()
 
-        # Check if workflow exists
-        check_query = "SELECT id FROM common.mortgage_workflow WHERE id = $1"
-        existing = await pool.fetchrow(check_query, workflow_id)
-
-        if not existing:
-            logger.warning(f"Workflow with ID {workflow_id} not found")
-            raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
-
-        # Compose prompt from workflow steps
-        composed_prompt = compose_prompt(request.workflow)
-        logger.debug(f"Composed prompt length: {len(composed_prompt)} characters")
-
-        # Update the workflow with new steps and settings
-        update_query = """
-            UPDATE common.mortgage_workflow
-            SET
-                "workflowName" = $1,
-                description = $2,
-                category = $3,
-                doc_type = $4,
-                other_doc = $5,
-                "flowType" = $6,
-                runtype = $7,
-                workflow = $8,
-                prompt = $9,
-                data_point = $10,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = $11
-            RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType", runtype
-        """
-
-        logger.debug(f"Executing normal save update for workflow ID {workflow_id}")
-
-        # Convert workflow list to JSON string for JSONB column
-        workflow_json = json.dumps(request.workflow)
-
-        row = await pool.fetchrow(
-            update_query,
-            request.workflowName,
-            request.description,
-            request.category,
-            request.doc_type,
-            request.other_doc,
-            request.flowType,
-            request.runtype,
-            workflow_json,
-            composed_prompt,
-            request.data_point,
-            workflow_id
+        # No row back means the workflow does not exist or no longer matches
+        # the expected version/updated_at
+        row, outcome = await save_workflow_changes(
+            pool, workflow_id, request, request.expectedVersion, request.expectedUpdatedAt
         )
 
-        logger.info(f"Workflow {workflow_id} saved successfully")
+        if not row:
+            raise await rejected_save(WorkflowRepository(pool), workflow_id)
+
+        changed = outcome != SAVE_UNCHANGED
+        if changed:
+            reference_cache.invalidate_table("mortgage_workflow")
+            workflow_graph.invalidate(workflow_id)
+            logger.info(f"Workflow {workflow_id} saved successfully ({outcome})")
 
         return {
             "success": True,
-            "message": "Workflow saved successfully",
-            "workflowId": workflow_id
+            "message": "Workflow saved successfully" if changed else "No changes to save",
+            "workflowId": workflow_id,
+            "changed": changed,
+            "versionNumber": row["version"] or 1,
+            "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None
         }
 
     except HTTPException:
@@ -505,111 +814,228 @@ async def save_workflow_normal(workflow_id: int, request: SaveWorkflowRequest):
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.put("/workflows/{workflow_id}/save-version")
-async def save_workflow_as_version(workflow_id: int, request: SaveWorkflowRequest):
+async def save_workflow_as_version(workflow_id: int, request: ConditionalSaveWorkflowRequest):
     """
-    Save workflow as new version - appends current workflow to historicalworkflow JSONB column
+    Save workflow as new version - archives the current workflow as a row in
+    mortgage_workflow_version and increments the version number
+
+    With expectedVersion and/or expectedUpdatedAt the save only applies when
+    the workflow still matches them, otherwise 409 with its current state.
+    Steps that fail validation are rejected with 422.
     """
     logger.info(f"PUT /workflows/{workflow_id}/save-version - Save as new version")
     logger.debug(f"Save details: name={request.workflowName}, steps count={len(request.workflow)}")
+    reject_invalid_steps(request.workflow)
 
     try:
-        pool = await get_db()
+        repository = WorkflowRepository(await get_db())
+
+        # Compose prompt from workflow steps
+        composed_prompt = compose_prompt(request.workflow)
+        logger.debug(f"Composed prompt length: {len(composed_prompt)} characters")
 
-        # Check if workflow exists and get current historicalworkflow
-        check_query = """
-            SELECT id, historicalworkflow, workflow, version
-            FROM common.mortgage_workflow
-            WHERE id = $1
-        """
-        existing = await pool.fetchrow(check_query, workflow_id)
+        logger.debug(f"Executing save as version update for workflow ID {workflow_id}")
 
-        if not existing:
-            logger.warning(f"Workflow with ID {workflow_id} not found")
-            raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+        # Archive the current steps and save the new ones in one statement
+        row = await repository.save_version(workflow_id, request, composed_prompt, request.expectedVersion, request.expectedUpdatedAt)
 
-        # Get existing historical workflow or create empty dict
-        historical = existing['historicalworkflow'] if existing['historicalworkflow'] else {}
-        current_workflow = existing['workflow']
-        current_version = existing['version'] if existing['version'] else 1
+        if not row:
+            raise await rejected_save(repository, workflow_id)
 
-        # Calculate next version number for database version column
-        new_version = current_version + 1
+        new_version = row["version"]
+        reference_cache.invalidate_table("mortgage_workflow")
+        workflow_graph.invalidate(workflow_id)
+        logger.info(f"Workflow {workflow_id} saved as version {new_version} successfully")
 
-        # Calculate next historical version number (for JSON structure)
-        if isinstance(historical, dict) and historical:
-            # Get the highest version number in historical
-            version_numbers = [int(k) for k in historical.keys() if k.isdigit()]
-            next_historical_version = max(version_numbers) + 1 if version_numbers else current_version
-        else:
-            next_historical_version = current_version
+        return {
+            "success": True,
+            "message": f"Workflow saved as version {new_version}",
+            "workflowId": workflow_id,
+            "versionNumber": new_version,
+            "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None
+        }
 
-        # If there's a current workflow, save it to historical with current version
-        if current_workflow:
-            historical[str(next_historical_version)] = current_workflow
-            logger.info(f"Saving current workflow as historical version {next_historical_version}")
-            logger.info(f"New version will be: {new_version}")
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error saving workflow as version: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-        # Compose prompt from workflow steps
-        composed_prompt = compose_prompt(request.workflow)
-        logger.debug(f"Composed prompt length: {len(composed_prompt)} characters")
+class PatchWorkflowRequest(BaseModel):
+    baseVersion: int
+    patch: List[dict] = Field(..., min_length=1, max_length=10000)
+    saveAsVersion: bool = False
+    # Also require the updated_at the client read; a concurrent save then means 409
+    expectedUpdatedAt: Optional[datetime] = None
+    # Re-apply the patch when another save at baseVersion lands first
+    rebase: bool = True
 
-        # Update the workflow with new steps, settings, and historical data
-        update_query = """
-            UPDATE common.mortgage_workflow
-            SET
-                "workflowName" = $1,
-                description = $2,
-                category = $3,
-                doc_type = $4,
-                other_doc = $5,
-                "flowType" = $6,
-                runtype = $7,
-                workflow = $8,
-                historicalworkflow = $9,
-                version = $10,
-                prompt = $11,
-                data_point = $12,
-                updated_at = CURRENT_TIMESTAMP
-            WHERE id = $13
-            RETURNING id, "workflowName", version
-        """
+    _normalize_updated_at = field_validator("expectedUpdatedAt")(naive_utc)
 
-        logger.debug(f"Executing save as version update for workflow ID {workflow_id}")
+@router.patch("/workflows/{workflow_id}")
+async def patch_workflow_delta(workflow_id: int, request: PatchWorkflowRequest):
+    """
+    Delta save - applies an RFC 6902 JSON Patch to the stored workflow
+
+    The patch addresses the SaveWorkflowRequest document (e.g.
+    /workflow/3/prompt, /workflow/-, /description) and is rejected with 409
+    when the workflow is no longer at baseVersion (or expectedUpdatedAt) or a
+    "test" op fails. A save by someone else at the same version is rebased
+    onto unless rebase is false.
+    With saveAsVersion the current steps are archived first, like save-version.
+    """
+    logger.info(f"PATCH /workflows/{workflow_id} - Delta save with {len(request.patch)} operations (baseVersion={request.baseVersion})")
 
-        # Convert workflow list and historical dict to JSON strings for JSONB columns
-        workflow_json = json.dumps(request.workflow)
-        historical_json = json.dumps(historical)
-
-        row = await pool.fetchrow(
-            update_query,
-            request.workflowName,
-            request.description,
-            request.category,
-            request.doc_type,
-            request.other_doc,
-            request.flowType,
-            request.runtype,
-            workflow_json,
-            historical_json,
-            new_version,
-            composed_prompt,
-            request.data_point,
-            workflow_id
+    try:
+        row = await patch_workflow(
+            await get_db(),
+            workflow_id,
+            request.patch,
+            request.baseVersion,
+            save_as_version=request.saveAsVersion,
+            expected_updated_at=request.expectedUpdatedAt,
+            rebase=request.rebase
         )
 
-        logger.info(f"Workflow {workflow_id} saved as version {new_version} successfully")
+        if not row:
+            logger.warning(f"Workflow with ID {workflow_id} not found")
+            raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+
+        reference_cache.invalidate_table("mortgage_workflow")
+        workflow_graph.invalidate(workflow_id)
+        logger.info(f"Workflow {workflow_id} patched successfully (version {row['version']})")
 
         return {
             "success": True,
-            "message": f"Workflow saved as version {new_version}",
+            "message": f"Workflow saved as version {row['version']}" if request.saveAsVersion else "Workflow saved successfully",
             "workflowId": workflow_id,
-            "versionNumber": new_version
+            "versionNumber": row["version"],
+            "updatedAt": row["updated_at"].isoformat() if row["updated_at"] else None
         }
 
     except HTTPException:
         raise
+    except WorkflowVersionConflict as e:
+        logger.warning(str(e))
+        raise HTTPException(status_code=409, detail={
+            "message": str(e),
+            "currentVersion": e.current_version,
+            "currentUpdatedAt": e.current_updated_at.isoformat() if e.current_updated_at else None
+        })
+    except JsonPatchTestFailed as e:
+        logger.warning(f"Patch of workflow {workflow_id} rejected: {str(e)}")
+        raise HTTPException(status_code=409, detail={"message": str(e), "operation": e.index})
+    except JsonPatchError as e:
+        logger.warning(f"Patch of workflow {workflow_id} rejected: {str(e)}")
+        raise HTTPException(status_code=422, detail={"message": str(e), "operation": e.index})
+    except InvalidPatchedWorkflow as e:
+        logger.warning(f"Patch of workflow {workflow_id} produced an invalid workflow: {str(e)}")
+        raise HTTPException(status_code=422, detail={"message": str(e)})
     except Exception as e:
-        logger.error(f"Error saving workflow as version: {str(e)}", exc_info=True)
+        logger.error(f"Error patching workflow: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+class WorkflowVersionInfo(BaseModel):
+    version: int
+    createdAt: Optional[str] = None
+    stepCount: Optional[int] = None
+    sizeBytes: Optional[int] = None
+
+class WorkflowVersionsResponse(BaseModel):
+    workflowId: int
+    currentVersion: int
+    versions: List[WorkflowVersionInfo]
+
+class WorkflowVersionResponse(BaseModel):
+    workflowId: int
+    version: int
+    createdAt: Optional[str] = None
+    workflow: Optional[List[dict]] = None
+
+@router.get("/workflows/{workflow_id}/versions", response_model=WorkflowVersionsResponse)
+async def list_workflow_versions(workflow_id: int):
+    """
+    List archived versions of a workflow (metadata only, no steps)
+    """
+    logger.info(f"GET /workflows/{workflow_id}/versions - Listing workflow versions")
+
+    try:
+        repository = WorkflowRepository(await get_db())
+        result = await repository.list_versions(workflow_id)
+
+        if result is None:
+            logger.warning(f"Workflow with ID {workflow_id} not found")
+            raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+
+        logger.info(f"Returning {len(result['versions'])} archived versions for workflow {workflow_id}")
+
+        return WorkflowVersionsResponse(workflowId=workflow_id, **result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error listing workflow versions: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/workflows/{workflow_id}/versions/{version}", response_model=WorkflowVersionResponse)
+async def get_workflow_version(workflow_id: int, version: int):
+    """
+    Get the steps of a single workflow version (archived or current)
+    """
+    logger.info(f"GET /workflows/{workflow_id}/versions/{version} - Fetching workflow version")
+
+    try:
+        repository = WorkflowRepository(await get_db())
+        result = await repository.get_version_steps(workflow_id, version)
+
+        if result is None:
+            logger.warning(f"Version {version} of workflow {workflow_id} not found")
+            raise HTTPException(status_code=404, detail=f"Version {version} of workflow {workflow_id} not found")
+
+        return WorkflowVersionResponse(workflowId=workflow_id, **result)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching workflow version: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
+@router.get("/workflows/{workflow_id}/tree")
+async def get_workflow_tree(
+    workflow_id: int,
+    details: bool = Query(False, description="Also return the full details of every workflow in the tree")
+):
+    """
+    Resolve the whole orchestrator tree below a workflow in one call
+
+    Returns every workflow reachable through connectedPrompts/parentOrchestrator
+    links with its children and depth, a topological order (orchestrators
+    before their sub-workflows), any cycles and links to missing workflows.
+    """
+    logger.info(f"GET /workflows/{workflow_id}/tree - Resolving orchestrator tree (details={details})")
+
+    try:
+        # The index is refreshed from the primary so it never trails a write just made
+        await workflow_graph.ensure_fresh(await get_db())
+        tree = workflow_graph.tree(workflow_id)
+
+        if tree is None:
+            logger.warning(f"Workflow with ID {workflow_id} not found")
+            raise HTTPException(status_code=404, detail=f"Workflow with ID {workflow_id} not found")
+
+        if details:
+            repository = WorkflowRepository(await get_read_db())
+            rows = await repository.get_details_many(tree["topologicalOrder"])
+            by_id = {row["id"]: workflow_details_dict(row) for row in rows}
+            tree["workflows"] = [by_id[node] for node in tree["topologicalOrder"] if node in by_id]
+
+        logger.info(f"Workflow {workflow_id} tree has {len(tree['nodes'])} workflows and {len(tree['cycles'])} cycles")
+        return tree
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error resolving workflow tree: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 class PrepareTestDataRequest(BaseModel):
@@ -623,122 +1049,126 @@ class PrepareTestDataRequest(BaseModel):
     runtype: str
     workflow: List[dict]
     data_point: Optional[str] = None
+    sampling: Literal["first", "random", "stratified"] = "first"
+    sampleSize: int = Field(100, ge=1, le=1000)
+    seed: Optional[int] = Field(None, ge=0, le=2 ** 31 - 1)
+    samplePercent: Optional[float] = Field(
+        None, gt=0, le=100,
+        description="TABLESAMPLE SYSTEM percentage for random/stratified; defaults to one reading about TEST_SAMPLE_MAX_SCAN_ROWS rows"
+    )
+    cursor: Optional[str] = None
 
 @router.post("/workflows/prepare-test")
 async def prepare_test_data(request: PrepareTestDataRequest):
     """
     Prepare test data for workflow testing by:
     1. Compiling the complete workflow payload
-    2. Querying sub_document_indexing table for loans/borrowers based on doc types and runtype
+    2. Sampling loans/borrowers from sub_document_indexing based on doc types and runtype
+
+    Loans are picked in loan_number order (sampling=first), by a seeded hash
+    (random) or with an equal share per doc type (stratified). Pass the
+    returned nextCursor (and seed) to page through more loans.
+
+    random and stratified hash and sort every candidate loan on each page, so
+    on indexing tables larger than TEST_SAMPLE_MAX_SCAN_ROWS they pick from a
+    TABLESAMPLE subset of that size unless samplePercent is given.
     """
     try:
-        pool = await get_db()
+        pool = await get_read_db()
 
         # Build list of document types to search for
         doc_types = [request.doc_type]
         if request.other_doc:
             doc_types.extend(request.other_doc)
+        doc_types = list(dict.fromkeys(doc_types))
 
         logger.info(f"Preparing test data for workflow {request.workflowId}")
         logger.info(f"Document types: {doc_types}")
-        logger.info(f"Run type: {request.runtype}")
-
-        # Query based on runtype
-        if request.runtype == 'loan':
-            # Get unique loan numbers for the specified document types
-            query = """
-                SELECT DISTINCT loan_number
-                FROM common.sub_document_indexing
-                WHERE doc_type = ANY($1)
-                AND loan_number IS NOT NULL
-                AND loan_number != ''
-                ORDER BY loan_number
-                LIMIT 100
-            """
-
-            rows = await pool.fetch(query, doc_types)
-            loan_details = [
-                {
-                    'loanNumber': row['loan_number'],
-                    'borrowerIDs': []
-                }
-                for row in rows
-            ]
-
-            logger.info(f"Found {len(loan_details)} unique loan numbers")
-
-            return {
-                "testWorkflow": {
-                    "workflowName": request.workflowName,
-                    "description": request.description,
-                    "category": request.category,
-                    "doc_type": request.doc_type,
-                    "other_doc": request.other_doc,
-                    "flowType": request.flowType,
-                    "runtype": request.runtype,
-                    "workflow": request.workflow,
-                    "data_point": request.data_point
-                },
-                "loanDetails": loan_details
-            }
+        logger.info(f"Run type: {request.runtype}, sampling: {request.sampling}, sample size: {request.sampleSize}")
+
+        try:
+            sample = await TestDataSampler(pool).sample(
+                doc_types,
+                borrower_level=request.runtype != 'loan',
+                mode=request.sampling,
+                sample_size=request.sampleSize,
+                seed=request.seed,
+                cursor=request.cursor,
+                sample_percent=request.samplePercent
+            )
+        except (TypeError, ValueError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        logger.info(f"Found {len(sample.loan_details)} unique loan numbers")
 
-        else:  # borrower level
-            # Get loan numbers with their borrowers for the specified document types
-            query = """
-                SELECT DISTINCT loan_number, borrower_id
-                FROM common.sub_document_indexing
-                WHERE doc_type = ANY($1)
-                AND loan_number IS NOT NULL
-                AND loan_number != ''
-                AND borrower_id IS NOT NULL
-                AND borrower_id != ''
-                ORDER BY loan_number, borrower_id
-                LIMIT 200
-            """
-
-            rows = await pool.fetch(query, doc_types)
-
-            # Group borrowers by loan number
-            loans_dict = {}
-            for row in rows:
-                loan_num = row['loan_number']
-                borrower = row['borrower_id']
-
-                if loan_num not in loans_dict:
-                    loans_dict[loan_num] = {
-                        'loanNumber': loan_num,
-                        'borrowerIDs': []
-                    }
-
-                if borrower not in [b['id'] for b in loans_dict[loan_num]['borrowerIDs']]:
-                    # First borrower is primary, rest are not
-                    is_primary = len(loans_dict[loan_num]['borrowerIDs']) == 0
-                    loans_dict[loan_num]['borrowerIDs'].append({
-                        'id': borrower,
-                        'isPrimary': is_primary
-                    })
-
-            loan_details = list(loans_dict.values())
-
-            logger.info(f"Found {len(loan_details)} unique loan numbers with borrowers")
-
-            return {
-                "testWorkflow": {
-                    "workflowName": request.workflowName,
-                    "description": request.description,
-                    "category": request.category,
-                    "doc_type": request.doc_type,
-                    "other_doc": request.other_doc,
-                    "flowType": request.flowType,
-                    "runtype": request.runtype,
-                    "workflow": request.workflow,
-                    "data_point": request.data_point
-                },
-                "loanDetails": loan_details
+        return {
+            "testWorkflow": {
+                "workflowName": request.workflowName,
+                "description": request.description,
+                "category": request.category,
+                "doc_type": request.doc_type,
+                "other_doc": request.other_doc,
+                "flowType": request.flowType,
+                "runtype": request.runtype,
+                "workflow": request.workflow,
+                "data_point": request.data_point
+            },
+            "loanDetails": sample.loan_details,
+            "sampling": {
+                "mode": request.sampling,
+                "seed": sample.seed,
+                "sampleSize": request.sampleSize,
+                "samplePercent": sample.sample_percent,
+                "nextCursor": sample.next_cursor
             }
+        }
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error preparing test data: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Error preparing test data: {str(e)}")
+
+class TestBorrower(BaseModel):
+    id: str
+    isPrimary: Optional[bool] = None
+
+class TestLoan(BaseModel):
+    loanNumber: str
+    borrowerIDs: List[TestBorrower] = []
+
+class TestRunRequest(BaseModel):
+    testWorkflow: SaveWorkflowRequest
+    loanDetails: List[TestLoan] = Field(..., min_length=1)
+    concurrency: Optional[int] = Field(None, ge=1)
+    timeoutSeconds: Optional[float] = Field(None, gt=0)
+
+async def stream_test_run(workflow: dict, loan_details: List[dict], concurrency: int, timeout: float):
+    events = test_run_executor.run(workflow, loan_details, concurrency, timeout)
+    try:
+        async for event in events:
+            yield json_bytes(event) + b"\n"
+    finally:
+        await events.aclose()
+
+@router.post("/workflows/test-run")
+async def run_workflow_test(request: TestRunRequest):
+    """
+    Run a workflow against prepared test data (the testWorkflow and loanDetails
+    returned by /workflows/prepare-test).
+
+    Runs one model call per loan (runtype=loan) or per borrower, at most
+    `concurrency` at a time, and streams NDJSON: a start line, one result
+    line per loan/borrower in completion order, then a summary line.
+    """
+    concurrency = min(request.concurrency or settings.test_run_concurrency, settings.test_run_max_concurrency)
+    timeout = request.timeoutSeconds or settings.test_run_timeout_seconds
+    loan_details = [loan.model_dump() for loan in request.loanDetails]
+    logger.info(
+        f"Test run of '{request.testWorkflow.workflowName}' on {len(loan_details)} loans "
+        f"(runtype={request.testWorkflow.runtype}, concurrency={concurrency})"
+    )
+    return StreamingResponse(
+        stream_test_run(request.testWorkflow.model_dump(), loan_details, concurrency, timeout),
+        media_type="application/x-ndjson"
+    )
@@ -0,0 +1,137 @@
+"""
+Micro-benchmark: compose_prompt vs the original implementation and vs a
+per-step memoization cache.
+
+The cache was the first approach to avoid re-rendering unchanged steps. It
+loses to plain rendering: a lookup has to hash each step's text, which
+costs more than the strip and copy of rendering it. It is kept here so the
+comparison can be re-run.
+
+Run from backend/python-services:
+    python -m benchmarks.bench_compose_prompt [--steps 500] [--repeat 50] [--rounds 5]
+"""
+import argparse
+import io
+import os
+import time
+from typing import Dict, List
+
+# Settings require DB credentials at import time; none are used here
+for name in ("DB_HOST", "DB_USERNAME", "DB_PASSWORD", "DB_NAME"):
+    os.environ.setdefault(name, "benchmark")
+
+from services.prompt_composer import compose_prompt, render_step, write_prompt
+
+def legacy_compose_prompt(workflow_data: List[dict]) -> str:
+    """The original compose_prompt implementation, kept for comparison"""
+    output_blocks = []
+
+    for item in workflow_data:
+        step_id = item.get("id", "")
+        node = item.get("node", "")
+        prerequisite = (item.get("prerequisite") or "").strip()
+        prompt = (item.get("prompt") or "").strip()
+        note = (item.get("note") or "").strip()
+
+        block_lines = [
+            f"## STEP {step_id}: Invoke node `{node}`"
+        ]
+
+        if prerequisite:
+            block_lines.append(f"**PREREQUISITES TO EXECUTE THIS STEP**\n{prerequisite}\n**INSTRUCTIONS OF THE STEP:**")
+
+        if prompt:
+            block_lines.append(prompt)
+
+        if note:
+            block_lines.append(f"**IMPORTANT NOTE**\n{note}")
+
+        output_blocks.append("\n".join(block_lines))
+
+    return "\n\n".join(output_blocks)
+
+class MemoizedComposer:
+    """Blocks cached under the str() of the fields they are rendered from"""
+
+    def __init__(self):
+        self._blocks: Dict[tuple, str] = {}
+
+    def compose(self, workflow_data: List[dict]) -> str:
+        blocks = []
+        for item in workflow_data:
+            get = item.get
+            key = (str(get("id", "")), str(get("node", "")), str(get("prerequisite") or ""), str(get("prompt") or ""), str(get("note") or ""))
+            block = self._blocks.get(key)
+            if block is None:
+                block = self._blocks[key] = render_step(item)
+            blocks.append(block)
+        return "\n\n".join(blocks)
+
+def make_workflow(steps: int, prompt_size: int) -> List[dict]:
+    """Synthetic orchestrator-sized workflow; fresh string objects like a parsed request"""
+    return [
+        {
+            "id": i,
+            "name": f"Step {i}",
+            "node": ("text extraction", "insights executor", "output generator")[i % 3],
+            "prerequisite": f"  Step {i - 1} must be complete  " if i % 2 else "",
+            "prompt": "".join(["  ", f"Extract field {i}. " * (prompt_size // 20), "  "]),
+            "note": f"Note for step {i}" if i % 5 == 0 else "",
+        }
+        for i in range(1, steps + 1)
+    ]
+
+def clone(workflow: List[dict]) -> List[dict]:
+    """Copy with new string objects, as each save request would deliver"""
+    return [{key: value.encode().decode() if isinstance(value, str) else value for key, value in step.items()} for step in workflow]
+
+def timed(fn, inputs_factory, rounds: int) -> float:
+    """Best-of-rounds mean milliseconds per call; inputs are fresh each round"""
+    best = float("inf")
+    for _ in range(rounds):
+        inputs = inputs_factory()
+        start = time.perf_counter()
+        for workflow in inputs:
+            fn(workflow)
+        best = min(best, (time.perf_counter() - start) / len(inputs) * 1000)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=500)
+    parser.add_argument("--prompt-size", type=int, default=800, help="approximate characters per step prompt")
+    parser.add_argument("--repeat", type=int, default=50, help="saves per timing round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workflow = make_workflow(args.steps, args.prompt_size)
+    edited_workflow = clone(workflow)
+    edited_workflow[len(edited_workflow) // 2]["prompt"] += " edited"
+
+    def requests():
+        return [clone(workflow) for _ in range(args.repeat)]
+
+    expected = legacy_compose_prompt(workflow)
+    memoized = MemoizedComposer()
+    assert compose_prompt(workflow) == expected, "output differs from legacy output"
+    assert memoized.compose(workflow) == expected, "memoized output differs from legacy output"
+
+    legacy_ms = timed(legacy_compose_prompt, requests, args.rounds)
+    compose_ms = timed(compose_prompt, requests, args.rounds)
+    stream_ms = timed(lambda w: write_prompt(w, io.StringIO().write), requests, args.rounds)
+    cold_ms = timed(lambda w: MemoizedComposer().compose(w), requests, args.rounds)
+    warm_ms = timed(memoized.compose, requests, args.rounds)
+    # Alternate between the original and the edited workflow so one step changes on every save
+    toggle = [clone(workflow) if i % 2 else clone(edited_workflow) for i in range(args.repeat)]
+    edit_ms = timed(memoized.compose, lambda: [clone(w) for w in toggle], args.rounds)
+
+    print(f"compose_prompt: {args.steps} steps, ~{args.prompt_size} chars/prompt, {len(expected):,} chars output")
+    print(f"  legacy                    {legacy_ms:8.3f} ms")
+    print(f"  compose_prompt            {compose_ms:8.3f} ms  ({legacy_ms / compose_ms:.1f}x)")
+    print(f"  streamed into a writer    {stream_ms:8.3f} ms")
+    print(f"  step cache, cold          {cold_ms:8.3f} ms  ({legacy_ms / cold_ms:.1f}x)")
+    print(f"  step cache, unchanged     {warm_ms:8.3f} ms  ({legacy_ms / warm_ms:.1f}x)")
+    print(f"  step cache, one edited    {edit_ms:8.3f} ms  ({legacy_ms / edit_ms:.1f}x)")
+
+if __name__ == "__main__":
+    main()
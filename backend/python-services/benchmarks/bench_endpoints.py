@@ -0,0 +1,213 @@
+"""
+Endpoint benchmark: latency percentiles and throughput of the API routes.
+
+Drives the FastAPI app in-process through httpx's ASGI transport against
+benchmarks.fake_pool.FakePool (no database needed), at several concurrency
+levels, and writes the results to JSON. Pass a previous results file with
+--compare to print the change per endpoint.
+
+Run from backend/python-services:
+    python -m benchmarks.bench_endpoints [--concurrency 1 10 50] [--requests 200]
+        [--latency-ms 2] [--jitter-ms 1] [--pool-size 10] [--endpoint workflows-page ...]
+        [--output benchmarks/results/endpoints.json] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+# Settings require DB credentials at import time; none are used here
+for name in ("DB_HOST", "DB_USERNAME", "DB_PASSWORD", "DB_NAME"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+from benchmarks.fake_pool import FakeDatabase, FakePool, make_steps
+from config import database
+from main import app
+
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(__file__), "results", "endpoints.json")
+
+def _save_body(steps: int) -> dict:
+    return {
+        "workflowName": "Benchmark workflow",
+        "description": "Saved by the endpoint benchmark",
+        "category": "income",
+        "doc_type": "Document Type 001",
+        "other_doc": ["Document Type 002"],
+        "flowType": "agentic",
+        "runtype": "loan",
+        "workflow": make_steps(steps),
+        "data_point": "Datapoint 1",
+    }
+
+WRITE_IDS = range(100, 200)
+
+def endpoints(steps: int) -> Dict[str, dict]:
+    """Benchmarked requests by name"""
+    save_body = _save_body(steps)
+    patch_body = {"baseVersion": 1, "patch": [{"op": "replace", "path": "/workflow/0/prompt", "value": "Extract the borrower name."}]}
+    return {
+        "documents": {"method": "GET", "url": "/api/v1/documents"},
+        "documents-config": {"method": "GET", "url": "/api/v1/documents/config?category=income"},
+        "workflows-page": {"method": "GET", "url": "/api/v1/workflows?limit=100"},
+        "workflows-all": {"method": "GET", "url": "/api/v1/workflows"},
+        "workflow-search": {"method": "GET", "url": "/api/v1/workflows/search?q=workflow%2012&limit=20"},
+        "workflow-details": {"method": "GET", "url": "/api/v1/getworkflowdetails?id=42"},
+        "workflow-tree": {"method": "GET", "url": "/api/v1/workflows/41/tree?details=true"},
+        "workflow-details-batch": {"method": "POST", "url": "/api/v1/getworkflowdetails/batch", "json": {"ids": list(range(1, 21))}},
+        "compose-prompt": {"method": "POST", "url": "/api/v1/workflows/compose-prompt", "json": {"workflow": save_body["workflow"]}},
+        # Writes rotate over 100 workflows (editors working on different workflows)
+        "save-workflow": {"method": "PUT", "url": "/api/v1/workflows/{id}/save", "ids": WRITE_IDS, "json": save_body},
+        # Autosave of an unchanged workflow: after the first request every save is a no-op
+        "save-workflow-unchanged": {"method": "PUT", "url": "/api/v1/workflows/42/save", "json": save_body},
+        "patch-workflow": {"method": "PATCH", "url": "/api/v1/workflows/{id}", "ids": WRITE_IDS, "json": patch_body},
+        # Every request patches the same workflow: compare-and-swap conflicts and rebases
+        "patch-workflow-same-row": {"method": "PATCH", "url": "/api/v1/workflows/42", "json": patch_body},
+        "prepare-test": {
+            "method": "POST",
+            "url": "/api/v1/workflows/prepare-test",
+            "json": dict(save_body, workflowId=42, runtype="borrower", sampling="random", seed=7),
+        },
+    }
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+async def measure(client: httpx.AsyncClient, request: dict, concurrency: int, total: int) -> dict:
+    """Send `total` requests with `concurrency` workers; returns latency/throughput stats"""
+    latencies: List[float] = []
+    errors = 0
+    remaining = total
+    ids = itertools.cycle(request.get("ids") or [None])
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            url = request["url"].format(id=next(ids)) if "ids" in request else request["url"]
+            start = time.perf_counter()
+            response = await client.request(request["method"], url, json=request.get("json"))
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50Ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95Ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99Ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "maxMs": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results: List[dict], previous_path: str):
+    """Print rps and p95 change against a previous results file"""
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    before = {(item["endpoint"], item["concurrency"]): item for item in previous["results"]}
+    print(f"\nCompared with {previous_path} (commit {previous['meta'].get('commit')}):")
+    for item in results:
+        old = before.get((item["endpoint"], item["concurrency"]))
+        if not old:
+            continue
+        rps_change = (item["rps"] - old["rps"]) / old["rps"] * 100 if old["rps"] else 0.0
+        p95_change = (item["p95Ms"] - old["p95Ms"]) / old["p95Ms"] * 100 if old["p95Ms"] else 0.0
+        print(f"  {item['endpoint']:<24} c={item['concurrency']:<4} rps {rps_change:+7.1f}%   p95 {p95_change:+7.1f}%")
+
+async def run(args) -> List[dict]:
+    pool = FakePool(
+        FakeDatabase(workflows=args.workflows, steps=args.steps),
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        max_size=args.pool_size,
+    )
+    database.db_pool = pool
+    selected = endpoints(args.steps)
+    names = args.endpoint or list(selected)
+
+    results = []
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", limits=limits) as client:
+        print(f"{'endpoint':<24} {'conc':>5} {'rps':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        for name in names:
+            request = selected[name]
+            # Warm-up: fills caches and lets the first request pay one-off costs
+            await measure(client, request, 1, min(5, args.requests))
+            for concurrency in args.concurrency:
+                stats = await measure(client, request, concurrency, args.requests)
+                results.append(dict(stats, endpoint=name))
+                print(
+                    f"{name:<24} {concurrency:>5} {stats['rps']:>10.1f} {stats['p50Ms']:>9.2f} "
+                    f"{stats['p95Ms']:>9.2f} {stats['p99Ms']:>9.2f} {stats['errors']:>7}"
+                )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="simulated latency of every query")
+    parser.add_argument("--jitter-ms", type=float, default=1.0, help="extra random latency per query")
+    parser.add_argument("--pool-size", type=int, default=10)
+    parser.add_argument("--workflows", type=int, default=1000, help="rows in the fake mortgage_workflow table")
+    parser.add_argument("--steps", type=int, default=20, help="steps per workflow")
+    parser.add_argument("--endpoint", action="append", choices=sorted(endpoints(1)), help="only run these endpoints")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--compare", help="previous results file to compare against")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    results = asyncio.run(run(args))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "latencyMs": args.latency_ms,
+            "jitterMs": args.jitter_ms,
+            "poolSize": args.pool_size,
+            "workflows": args.workflows,
+            "steps": args.steps,
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Micro-benchmark: server-side workflow validation of very large workflows.
+
+Run from backend/python-services:
+    python -m benchmarks.bench_validate_workflow [--steps 10000] [--repeat 20] [--rounds 5]
+"""
+import argparse
+import os
+import time
+from typing import Callable, List
+
+# Settings require DB credentials at import time; none are used here
+for name in ("DB_HOST", "DB_USERNAME", "DB_PASSWORD", "DB_NAME"):
+    os.environ.setdefault(name, "benchmark")
+
+from benchmarks.bench_compose_prompt import clone, make_workflow
+from services.workflow_validator import STEPS_SCHEMA, _well_typed, prerequisite_parser, validate_steps
+
+def timed(fn: Callable[[List[dict]], object], inputs_factory, rounds: int, before: Callable[[], object] = lambda: None) -> float:
+    """Best-of-rounds mean milliseconds per call; before() runs untimed ahead of every call"""
+    best = float("inf")
+    for _ in range(rounds):
+        total = 0.0
+        inputs = inputs_factory()
+        for workflow in inputs:
+            before()
+            start = time.perf_counter()
+            fn(workflow)
+            total += time.perf_counter() - start
+        best = min(best, total / len(inputs) * 1000)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--steps", type=int, default=10000)
+    parser.add_argument("--prompt-size", type=int, default=200, help="approximate characters per step prompt")
+    parser.add_argument("--repeat", type=int, default=20, help="validations per timing round")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    workflow = make_workflow(args.steps, args.prompt_size)
+    # The first step has no step 0 to wait for
+    workflow[0]["prerequisite"] = ""
+    edited_workflow = clone(workflow)
+    edited_workflow[len(edited_workflow) // 2]["prerequisite"] = f"Step {len(edited_workflow) // 3} and step 2 must be complete"
+    # Step 10 waits for step 11, which waits for step 10: the cycle search has to run
+    broken_workflow = clone(workflow)
+    broken_workflow[9]["prerequisite"] = "Step 11 must be complete"
+
+    assert validate_steps(workflow).valid, "synthetic workflow should be valid"
+    broken = validate_steps(broken_workflow)
+    assert any(issue["code"] == "prerequisite_cycle" for issue in broken.warnings), "cycle not reported"
+
+    def requests(source):
+        return lambda: [clone(source) for _ in range(args.repeat)]
+
+    types_ms = timed(_well_typed, requests(workflow), args.rounds)
+    schema_ms = timed(STEPS_SCHEMA.validate_python, requests(workflow), args.rounds)
+    cold_ms = timed(validate_steps, requests(workflow), args.rounds, before=prerequisite_parser.clear)
+    warm_ms = timed(validate_steps, requests(workflow), args.rounds)
+    toggle = [clone(workflow) if i % 2 else clone(edited_workflow) for i in range(args.repeat)]
+    edit_ms = timed(validate_steps, lambda: [clone(w) for w in toggle], args.rounds)
+    broken_ms = timed(validate_steps, requests(broken_workflow), args.rounds)
+
+    print(f"validate_steps: {args.steps} steps, ~{args.prompt_size} chars/prompt")
+    print(f"  step type check                   {types_ms:8.3f} ms")
+    print(f"  pydantic schema (errors only)     {schema_ms:8.3f} ms")
+    print(f"  full, prerequisites not yet seen  {cold_ms:8.3f} ms")
+    print(f"  full, unchanged save              {warm_ms:8.3f} ms")
+    print(f"  full, one prerequisite edited     {edit_ms:8.3f} ms")
+    print(f"  full, with a cycle to report      {broken_ms:8.3f} ms  ({broken.error_count} errors, {broken.warning_count} warnings)")
+
+if __name__ == "__main__":
+    main()
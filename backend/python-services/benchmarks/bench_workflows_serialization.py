@@ -0,0 +1,142 @@
+"""
+Benchmark: GET /workflows response building, pydantic models vs the fast path.
+
+Drives the FastAPI app in-process (httpx ASGI transport) against an
+in-memory pool returning synthetic rows, checks that both modes produce
+byte-identical bodies, then reports requests/second for each.
+
+Run from backend/python-services:
+    python -m benchmarks.bench_workflows_serialization [--rows 10000] [--requests 20] [--rounds 3]
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import logging
+import os
+import time
+from typing import List
+
+# Settings require DB credentials at import time; none are used here
+for name in ("DB_HOST", "DB_USERNAME", "DB_PASSWORD", "DB_NAME"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+from main import app
+from config import database
+from config.settings import settings
+from utils import transport
+
+class _Transaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class RowsPool:
+    """Minimal pool stand-in: every query returns the same rows"""
+
+    def __init__(self, rows: List[dict]):
+        self.rows = rows
+
+    async def fetch(self, query, *args, **kwargs):
+        return self.rows
+
+    def acquire(self, **kwargs):
+        pool = self
+
+        class Connection:
+            def transaction(self, **kwargs):
+                return _Transaction()
+
+            async def cursor(self, query, *args, prefetch=None):
+                for row in pool.rows:
+                    yield row
+
+        @contextlib.asynccontextmanager
+        async def acquire():
+            yield Connection()
+        return acquire()
+
+def make_rows(count: int) -> List[dict]:
+    """Synthetic mortgage_workflow list rows covering every normalization branch"""
+    rows = []
+    for i in range(1, count + 1):
+        rows.append({
+            "id": i,
+            "workflowName": None if i % 7 == 0 else f"Workflow {i} – Schedule B income “calc”",
+            "description": f"Line one\nline two \"quoted\" \\ tab\there {i}" if i % 3 else None,
+            "category": ("income", "liability", "asset", "credit")[i % 4],
+            "doc_type": ("W2", "Paystub", "Schedule B", "1099")[i % 4],
+            # Old comma-separated format, array format and empty
+            "other_doc": "W2, Paystub" if i % 5 == 0 else (["W2", "Bank Statement"] if i % 2 else None),
+            "version": i % 9 + 1,
+            "flowType": "agentic" if i % 2 else "sequential",
+            "data_point": f"Datapoint {i} ✓\u001f",
+            "runtype": "loan" if i % 2 else "borrower",
+            "updated_at": datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=i),
+        })
+    return rows
+
+async def fetch(client: httpx.AsyncClient, path: str) -> bytes:
+    response = await client.get(path)
+    response.raise_for_status()
+    return response.content
+
+async def throughput(client: httpx.AsyncClient, path: str, requests: int, rounds: int) -> float:
+    """Best-of-rounds requests/second for sequential requests"""
+    best = 0.0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(requests):
+            await fetch(client, path)
+        best = max(best, requests / (time.perf_counter() - start))
+    return best
+
+async def run(args):
+    database.db_pool = RowsPool(make_rows(args.rows))
+    transport_ = httpx.ASGITransport(app=app)
+    path = "/api/v1/workflows"
+
+    async with httpx.AsyncClient(transport=transport_, base_url="http://benchmark") as client:
+        settings.fast_json_responses = False
+        model_body = await fetch(client, path)
+        model_stream = await fetch(client, path + "?stream=true")
+
+        settings.fast_json_responses = True
+        fast_body = await fetch(client, path)
+        fast_stream = await fetch(client, path + "?stream=true")
+        assert fast_body == model_body, "fast path JSON differs from the pydantic response"
+        assert fast_stream == model_stream, "fast path NDJSON differs from the pydantic stream"
+
+        # The stdlib fallback (orjson not installed) must produce the same bytes too
+        orjson_module, transport.orjson = transport.orjson, None
+        try:
+            assert await fetch(client, path) == model_body, "stdlib fallback JSON differs"
+        finally:
+            transport.orjson = orjson_module
+
+        settings.fast_json_responses = False
+        model_rps = await throughput(client, path, args.requests, args.rounds)
+        settings.fast_json_responses = True
+        fast_rps = await throughput(client, path, args.requests, args.rounds)
+
+    fast_label = "fast path, " + ("orjson" if transport.orjson is not None else "stdlib json")
+    print(f"GET /workflows: {args.rows:,} rows, {len(model_body):,} bytes per response (identical in both modes)")
+    print(f"  {'pydantic models + response_model':<34}{model_rps:8.2f} req/s  {1000 / model_rps:8.1f} ms/req")
+    print(f"  {fast_label:<34}{fast_rps:8.2f} req/s  {1000 / fast_rps:8.1f} ms/req  ({fast_rps / model_rps:.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=20, help="requests per timing round")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+"""
+In-memory stand-in for the asyncpg pool, for benchmarks.
+
+FakePool implements the subset of the pool/connection API the services use
+(fetch, fetchrow, fetchval, execute, acquire, transaction, cursor,
+copy_records_to_table) on top of FakeDatabase, which answers the
+application's queries from synthetic rows. Every query sleeps for a
+configurable latency (plus jitter) and the pool never hands out more than
+max_size connections at once, so queueing under concurrency behaves like
+the real pool.
+"""
+import asyncio
+import datetime
+import json
+import random
+import re
+from typing import List, Optional
+
+_CONDITION = re.compile(r'("?\w+"?) (=|>) \$(\d+)')
+
+class FakeDatabase:
+    """Synthetic common.mortgage_workflow, gpt_doc_config and sub_document_indexing data"""
+
+    def __init__(self, workflows: int = 1000, steps: int = 20, doc_configs: int = 200, loans: int = 500):
+        self.doc_configs = [
+            {
+                "doctype": f"Document Type {i:03d}",
+                "doc_category": ("income", "liability", "asset", "credit")[i % 4],
+                "doc_provider": ("provider-a", "provider-b", None)[i % 3],
+                "is_multiborrower": i % 2 == 0,
+                "borrower_field_name": "borrower_name" if i % 2 == 0 else None,
+                "ssn_field_name": "ssn" if i % 2 == 0 else None,
+                "dynamic_borrower_tag": i % 5 == 0,
+            }
+            for i in range(doc_configs)
+        ]
+        self.workflows = {}
+        updated_at = datetime.datetime(2024, 1, 1)
+        for i in range(1, workflows + 1):
+            self.workflows[i] = {
+                "id": i,
+                "workflowName": f"Workflow {i}",
+                "description": f"Synthetic workflow {i}",
+                "category": ("income", "liability", "asset", "credit")[i % 4],
+                "doc_type": self.doc_configs[i % doc_configs]["doctype"],
+                "other_doc": [self.doc_configs[(i + 1) % doc_configs]["doctype"]],
+                "version": 1,
+                "flowType": "orchestrator" if i % 10 == 1 else "agentic",
+                "data_point": f"Datapoint {i}",
+                "runtype": "loan" if i % 2 else "borrower",
+                "updated_at": updated_at + datetime.timedelta(minutes=i),
+                "workflow": json.dumps(make_steps(steps)),
+                "prompt": None,
+                # Every tenth workflow orchestrates the next nine (char(n) elements, space padded)
+                "connectedPrompts": [f"{child:<10}" for child in range(i + 1, min(i + 10, workflows + 1))] if i % 10 == 1 else None,
+                "parentOrchestrator": None,
+                "steps_hash": None,
+                "settings_hash": None,
+            }
+        self.loans = [
+            {"loan_number": f"LN{i:08d}", "sort_key": None, "borrower_ids": [f"B{i}-1", f"B{i}-2"]}
+            for i in range(loans)
+        ]
+
+    def _list(self, query: str, args: tuple) -> List[dict]:
+        rows = list(self.workflows.values())
+        where = query.split(" WHERE ", 1)[1] if " WHERE " in query else ""
+        for column, operator, index in _CONDITION.findall(where.split(" ORDER BY ")[0]):
+            column = column.strip('"')
+            value = args[int(index) - 1]
+            if operator == ">":
+                rows = [row for row in rows if row[column] > value]
+            else:
+                rows = [row for row in rows if row[column] == value]
+        match = re.search(r"LIMIT \$(\d+)", query)
+        if match:
+            rows = rows[:args[int(match.group(1)) - 1]]
+        return rows
+
+    def _search(self, args: tuple) -> List[dict]:
+        needle, limit, offset = args[0], args[-2], args[-1]
+        rows = []
+        for row in self.workflows.values():
+            text = " ".join(str(row[column] or "") for column in ("workflowName", "description", "data_point", "doc_type", "workflow")).lower()
+            if needle in text:
+                rows.append(dict(row, score=4.0 if needle in row["workflowName"].lower() else 1.0))
+        rows.sort(key=lambda row: (-row["score"], row["id"]))
+        return rows[offset:offset + limit]
+
+    def _guarded_save(self, query: str, args: tuple) -> Optional[dict]:
+        """A save with compare-and-swap guards; stores the content hashes it sets"""
+        where = query.rsplit("WHERE id = ", 1)[1]
+        arg = lambda pattern, text: args[int(re.search(pattern, text).group(1)) - 1]
+        row = self.workflows.get(arg(r"^\$(\d+)", where))
+        if row is None:
+            return None
+        guards = {
+            "version": arg(r"COALESCE\(version, 1\) = \$(\d+)", where),
+            "updated_at": arg(r"updated_at = \$(\d+)", where),
+        }
+        if re.search(r"steps_hash = \$\d+\)", where):
+            guards["steps_hash"] = arg(r"steps_hash = \$(\d+)\)", where)
+        if any(value is not None and row[column] != value for column, value in guards.items()):
+            return None
+        if " AS outcome" in query:
+            # Change-aware save: compare the hashes it would set with the stored ones
+            steps_hash, settings_hash = args[13], args[14]
+            if row["steps_hash"] == steps_hash and row["settings_hash"] == settings_hash:
+                return dict(row, outcome="unchanged")
+            outcome = "settings" if row["steps_hash"] == steps_hash else "full"
+            row["steps_hash"], row["settings_hash"] = steps_hash, settings_hash
+            row["updated_at"] = max(datetime.datetime.now(), row["updated_at"] + datetime.timedelta(microseconds=1))
+            return dict(row, outcome=outcome)
+        for column, index in re.findall(r"(\w+_hash) = \$(\d+),", query):
+            row[column] = args[int(index) - 1]
+        row["updated_at"] = max(datetime.datetime.now(), row["updated_at"] + datetime.timedelta(microseconds=1))
+        if query.lstrip().startswith("WITH current_workflow"):
+            row["version"] += 1
+        return dict(row)
+
+    def answer(self, kind: str, query: str, args: tuple):
+        """Result of one query, shaped like asyncpg's for the given call kind"""
+        if "common.gpt_doc_config" in query:
+            if "DISTINCT doctype" in query:
+                return [{"doctype": row["doctype"]} for row in self.doc_configs]
+            return self.doc_configs
+        if "FROM pg_class" in query:
+            return {"reltuples": len(self.loans)}
+        if "sub_document_indexing" in query:
+            return self.loans[:100]
+        if 'data_point as "datapointName"' in query:
+            return [{"id": row["id"], "datapointName": row["data_point"]} for row in self.workflows.values()]
+        if "search_text" in query:
+            return self._search(args)
+        if "ANY($1" in query and "mortgage_workflow" in query:
+            return [self.workflows[i] for i in args[0] if i in self.workflows]
+        if "::bigint IS NULL" in query:
+            return self._guarded_save(query, args)
+        if query.lstrip().startswith(("UPDATE", "WITH current_workflow")):
+            row = self.workflows.get(args[-1])
+            return dict(row, version=row["version"] + 1) if row and kind == "fetchrow" else row
+        if query.lstrip().startswith("INSERT"):
+            return {"id": len(self.workflows) + 1, "workflowName": args[0], "version": 1}
+        if "WHERE id = $1" in query:
+            row = self.workflows.get(args[0])
+            return row if kind != "fetch" else ([row] if row else [])
+        if "FROM common.mortgage_workflow" in query:
+            return self._list(query, args)
+        return [] if kind == "fetch" else None
+
+def make_steps(count: int) -> List[dict]:
+    return [
+        {
+            "id": i,
+            "name": f"Step {i}",
+            "node": ("text extraction", "insights executor", "output generator")[i % 3],
+            "prerequisite": f"Step {i - 1} must be complete" if i > 1 else "",
+            "prompt": f"Extract field {i} from the document. " * 10,
+            "note": "",
+            "connectedPrompts": [],
+        }
+        for i in range(1, count + 1)
+    ]
+
+class _Transaction:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class FakeConnection:
+    def __init__(self, pool: "FakePool"):
+        self._pool = pool
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._pool._query("fetch", query, args)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        result = await self._pool._query("fetchrow", query, args)
+        if isinstance(result, list):
+            return result[0] if result else None
+        return result
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        row = await self.fetchrow(query, *args)
+        return next(iter(row.values())) if row else None
+
+    async def execute(self, query: str, *args, **kwargs):
+        await self._pool._query("execute", query, args)
+        return "UPDATE 1"
+
+    async def copy_records_to_table(self, table_name: str, *, records, columns=None, **kwargs):
+        await self._pool._sleep()
+        return f"COPY {len(records)}"
+
+    def transaction(self, **kwargs):
+        return _Transaction()
+
+    async def cursor(self, query: str, *args, prefetch: Optional[int] = None):
+        rows = await self._pool._query("fetch", query, args)
+        for row in rows:
+            yield row
+
+class _Acquire:
+    def __init__(self, pool: "FakePool"):
+        self._pool = pool
+
+    async def __aenter__(self) -> FakeConnection:
+        await self._pool._slots.acquire()
+        self._pool.in_use += 1
+        return FakeConnection(self._pool)
+
+    async def __aexit__(self, *exc_info):
+        self._pool.in_use -= 1
+        self._pool._slots.release()
+        return False
+
+class FakePool:
+    """
+    asyncpg.Pool stand-in backed by FakeDatabase.
+
+    Args:
+        database: Data to answer queries from
+        latency: Seconds each query takes
+        jitter: Extra random seconds (uniform 0..jitter) per query
+        max_size: Connections available at once; further acquires wait
+    """
+
+    def __init__(self, database: Optional[FakeDatabase] = None, latency: float = 0.0, jitter: float = 0.0, max_size: int = 10):
+        self.database = database or FakeDatabase()
+        self.latency = latency
+        self.jitter = jitter
+        self.max_size = max_size
+        self.in_use = 0
+        self.queries = 0
+        self._slots = asyncio.Semaphore(max_size)
+
+    async def _sleep(self):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+    async def _query(self, kind: str, query: str, args: tuple):
+        self.queries += 1
+        await self._sleep()
+        return self.database.answer(kind, query, args)
+
+    def acquire(self, **kwargs) -> _Acquire:
+        return _Acquire(self)
+
+    async def fetch(self, query: str, *args, **kwargs):
+        async with self.acquire() as connection:
+            return await connection.fetch(query, *args)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        async with self.acquire() as connection:
+            return await connection.fetchrow(query, *args)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        async with self.acquire() as connection:
+            return await connection.fetchval(query, *args)
+
+    async def execute(self, query: str, *args, **kwargs):
+        async with self.acquire() as connection:
+            return await connection.execute(query, *args)
+
+    def get_size(self) -> int:
+        return self.max_size
+
+    def get_idle_size(self) -> int:
+        return self.max_size - self.in_use
+
+    def get_min_size(self) -> int:
+        return self.max_size
+
+    def get_max_size(self) -> int:
+        return self.max_size
+
+    async def close(self):
+        pass
@@ -0,0 +1,109 @@
+"""
+Bulk export/import of workflows as NDJSON, straight against the database.
+
+Usage:
+    python bulk_cli.py export [-o workflows.ndjson] [--category income] [--doc-type W2] [--flow-type F] [--runtype loan]
+    python bulk_cli.py import workflows.ndjson [--mode insert|upsert] [--batch-size 1000] [--skip-invalid]
+
+Connection settings are read from the environment / .env like the API.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import sys
+
+from config.database import connect_db, disconnect_db, get_db
+from services.workflow_bulk import (
+    DEFAULT_IMPORT_BATCH_SIZE,
+    BulkImportError,
+    import_workflows,
+    iter_export,
+    iter_ndjson_lines,
+)
+
+logger = logging.getLogger("bulk_cli")
+
+# Bytes read from the input file per chunk
+READ_CHUNK_SIZE = 1024 * 1024
+
+async def read_chunks(path: str):
+    """Yield the file (or stdin for '-') in binary chunks"""
+    stream = sys.stdin.buffer if path == "-" else open(path, "rb")
+    try:
+        while True:
+            chunk = await asyncio.to_thread(stream.read, READ_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+async def run_export(args) -> int:
+    pool = await get_db()
+    output = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    count = 0
+    try:
+        async for line in iter_export(pool, args.category, args.doc_type, args.flow_type, args.runtype):
+            output.write(line)
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    logger.info(f"Exported {count} workflows to {args.output}")
+    return 0
+
+async def run_import(args) -> int:
+    pool = await get_db()
+    try:
+        result = await import_workflows(
+            pool,
+            iter_ndjson_lines(read_chunks(args.input)),
+            mode=args.mode,
+            batch_size=args.batch_size,
+            skip_invalid=args.skip_invalid
+        )
+    except BulkImportError as e:
+        logger.error(str(e))
+        for error in e.errors:
+            logger.error(f"  line {error['line']}: {error['error']}")
+        return 1
+
+    print(json.dumps(result, indent=2))
+    return 0
+
+async def main(args) -> int:
+    await connect_db()
+    try:
+        return await args.handler(args)
+    finally:
+        await disconnect_db()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk export/import of workflows as NDJSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write workflows as NDJSON")
+    export_parser.add_argument("-o", "--output", default="-", help="Output file (default: stdout)")
+    export_parser.add_argument("--category")
+    export_parser.add_argument("--doc-type")
+    export_parser.add_argument("--flow-type")
+    export_parser.add_argument("--runtype")
+    export_parser.set_defaults(handler=run_export)
+
+    import_parser = subparsers.add_parser("import", help="Load workflows from NDJSON")
+    import_parser.add_argument("input", help="NDJSON file ('-' for stdin)")
+    import_parser.add_argument("--mode", choices=["insert", "upsert"], default="insert",
+                               help="insert creates new workflows; upsert overwrites by id")
+    import_parser.add_argument("--batch-size", type=int, default=DEFAULT_IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--skip-invalid", action="store_true",
+                               help="Import valid lines even when some lines are invalid")
+    import_parser.set_defaults(handler=run_import)
+
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    # Logs go to stderr so that `export` can write NDJSON to stdout
+    logging.basicConfig(level=logging.INFO, stream=sys.stderr, format="%(asctime)s - %(levelname)s - %(message)s")
+    sys.exit(asyncio.run(main(parse_args())))
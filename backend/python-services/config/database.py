@@ -1,40 +1,304 @@
+import asyncio
 import asyncpg
+import itertools
 from config.settings import settings
-from typing import Optional
+from typing import List, Optional, Sequence
+from urllib.parse import urlsplit
+from utils.metrics import DB_POOL_ACQUIRE_WAIT, registry
+from utils.profiling import RequestProfile, current_profile
+from utils.query_log import QueryLog, status_rows
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
-# Database connection pool
-db_pool: Optional[asyncpg.Pool] = None
+query_log = QueryLog(
+    threshold_ms=settings.slow_query_threshold_ms,
+    explain_sample_rate=settings.slow_query_explain_sample_rate,
+    explain_interval=settings.slow_query_explain_interval_seconds,
+    explain_timeout=settings.slow_query_explain_timeout_seconds,
+    max_statements=settings.query_stats_max_statements,
+    window=settings.query_stats_window,
+)
 
-async def connect_db():
-    """Connect to the database"""
-    global db_pool
+def _found(value) -> int:
+    return int(value is not None)
+
+class InstrumentedConnection:
+    """
+    Proxy of a pooled asyncpg connection that times every statement into
+    the query log (and the request profile, when the request is profiled);
+    everything else (transaction(), cursor(), ...) passes through.
+    """
+
+    def __init__(self, connection: asyncpg.Connection, pool: "InstrumentedPool", profile: Optional[RequestProfile]):
+        self._connection = connection
+        self._pool = pool
+        self._profile = profile
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def _record(self, query: str, args: tuple, seconds: float, rows: Optional[int]):
+        query_log.record(query, args, seconds, rows, self._pool)
+        if self._profile is not None:
+            self._profile.add_statement(query, seconds)
+
+    async def _timed(self, query: str, args: tuple, statement, count_rows):
+        start_time = time.perf_counter()
+        try:
+            result = await statement
+        except Exception:
+            self._record(query, args, time.perf_counter() - start_time, None)
+            raise
+        self._record(query, args, time.perf_counter() - start_time, count_rows(result))
+        return result
+
+    async def fetch(self, query: str, *args, **kwargs):
+        return await self._timed(query, args, self._connection.fetch(query, *args, **kwargs), len)
+
+    async def fetchrow(self, query: str, *args, **kwargs):
+        return await self._timed(query, args, self._connection.fetchrow(query, *args, **kwargs), _found)
+
+    async def fetchval(self, query: str, *args, **kwargs):
+        return await self._timed(query, args, self._connection.fetchval(query, *args, **kwargs), _found)
+
+    async def execute(self, query: str, *args, **kwargs):
+        return await self._timed(query, args, self._connection.execute(query, *args, **kwargs), status_rows)
+
+    async def executemany(self, command: str, args, **kwargs):
+        # Rows are the parameter sets; they are logged as one "tuple[n]" parameter
+        args = list(args)
+        return await self._timed(command, (args,), self._connection.executemany(command, args, **kwargs), lambda _: len(args))
+
+    async def copy_records_to_table(self, table_name: str, **kwargs):
+        statement = self._connection.copy_records_to_table(table_name, **kwargs)
+        return await self._timed(f"COPY {table_name}", (), statement, status_rows)
+
+class _TimedAcquire:
+    """Wraps asyncpg's acquire context, records how long the caller waited and instruments the connection"""
+
+    def __init__(self, pool: "InstrumentedPool", timeout: Optional[float]):
+        self._pool = pool
+        self._context = pool.pool.acquire(timeout=timeout)
+
+    async def __aenter__(self) -> InstrumentedConnection:
+        pool = self._pool
+        start_time = time.perf_counter()
+        pool.waiting += 1
+        try:
+            connection = await self._context.__aenter__()
+        finally:
+            pool.waiting -= 1
+            waited = time.perf_counter() - start_time
+            pool.record_wait(waited)
+        profile = current_profile()
+        if profile is not None:
+            profile.add("pool", waited)
+        return InstrumentedConnection(connection, pool, profile)
+
+    async def __aexit__(self, *exc_info):
+        return await self._context.__aexit__(*exc_info)
+
+class InstrumentedPool:
+    """
+    asyncpg pool wrapper that measures the time spent waiting in acquire().
+
+    Exposes the subset of the asyncpg.Pool API the services use; the query
+    helpers acquire through the timed path, exactly like Pool.fetch() does.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, name: str = "primary"):
+        self.pool = pool
+        self.name = name
+        # Coroutines currently blocked in acquire()
+        self.waiting = 0
+        self.acquisitions = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float):
+        self.acquisitions += 1
+        self.total_wait += seconds
+        if seconds > self.max_wait:
+            self.max_wait = seconds
+        DB_POOL_ACQUIRE_WAIT.observe(seconds, self.name)
+
+    def acquire(self, *, timeout: Optional[float] = None) -> _TimedAcquire:
+        return _TimedAcquire(self, timeout)
+
+    async def fetch(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as connection:
+            return await connection.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as connection:
+            return await connection.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: Optional[float] = None):
+        async with self.acquire() as connection:
+            return await connection.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def execute(self, query: str, *args, timeout: Optional[float] = None):
+        async with self.acquire() as connection:
+            return await connection.execute(query, *args, timeout=timeout)
+
+    async def executemany(self, command: str, args, *, timeout: Optional[float] = None):
+        async with self.acquire() as connection:
+            return await connection.executemany(command, args, timeout=timeout)
+
+    def get_size(self) -> int:
+        return self.pool.get_size()
+
+    def get_idle_size(self) -> int:
+        return self.pool.get_idle_size()
+
+    def get_min_size(self) -> int:
+        return self.pool.get_min_size()
+
+    def get_max_size(self) -> int:
+        return self.pool.get_max_size()
+
+    def utilization(self) -> float:
+        """Share of max_size currently checked out"""
+        return (self.get_size() - self.get_idle_size()) / self.get_max_size()
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "size": self.get_size(),
+            "idle": self.get_idle_size(),
+            "minSize": self.get_min_size(),
+            "maxSize": self.get_max_size(),
+            "utilization": round(self.utilization(), 4),
+            "waiting": self.waiting,
+            "acquisitions": self.acquisitions,
+            "avgWaitMs": round(self.total_wait / self.acquisitions * 1000, 3) if self.acquisitions else 0.0,
+            "maxWaitMs": round(self.max_wait * 1000, 3),
+        }
+
+    async def close(self):
+        await self.pool.close()
+
+# Database connection pools
+db_pool: Optional[InstrumentedPool] = None
+read_pools: List[InstrumentedPool] = []
+_read_rotation = itertools.count()
+
+def all_pools() -> List[InstrumentedPool]:
+    """Primary pool followed by the read-replica pools"""
+    return ([db_pool] if db_pool else []) + read_pools
+
+def _pool_gauge(read):
+    def collect():
+        return {(pool.name,): read(pool) for pool in all_pools()}
+    return collect
+
+registry.callback_gauge("db_pool_connections", "Connections currently open in the pool", ("pool",), _pool_gauge(lambda pool: pool.get_size()))
+registry.callback_gauge("db_pool_idle_connections", "Open connections not checked out", ("pool",), _pool_gauge(lambda pool: pool.get_idle_size()))
+registry.callback_gauge("db_pool_max_connections", "Upper bound of the pool size", ("pool",), _pool_gauge(lambda pool: pool.get_max_size()))
+registry.callback_gauge("db_pool_utilization", "Share of the maximum pool size checked out", ("pool",), _pool_gauge(lambda pool: pool.utilization()))
+registry.callback_gauge("db_pool_waiting", "Coroutines waiting for a connection", ("pool",), _pool_gauge(lambda pool: pool.waiting))
+
+def _connect_kwargs(dsn: Optional[str] = None) -> dict:
+    """Connection arguments: the given DSN, DATABASE_URL, or the individual DB_* settings"""
+    dsn = dsn or settings.database_url
+    if dsn:
+        return {"dsn": dsn}
+    return {
+        "host": settings.db_host,
+        "port": settings.db_port,
+        "user": settings.db_username,
+        "password": settings.db_password,
+        "database": settings.db_name,
+    }
+
+def _describe(connect_kwargs: dict) -> str:
+    """host:port/database for logs, without credentials"""
+    if "dsn" in connect_kwargs:
+        parsed = urlsplit(connect_kwargs["dsn"])
+        return f"{parsed.hostname}:{parsed.port or 5432}{parsed.path}"
+    return f"{connect_kwargs['host']}:{connect_kwargs['port']}/{connect_kwargs['database']}"
+
+async def _prepare_statement(connection: asyncpg.Connection, query: str):
+    """
+    Prepare a statement once on a new connection.
+
+    This checks that it parses and loads the codecs of any custom types it
+    uses, which the connection keeps. fetch()/execute() do not reuse the
+    prepared statement itself: they still parse their own on first use.
+    """
+    await connection.prepare(query)
+
+def _statement_warmer(statements: Sequence[str]):
+    """asyncpg `init` callback preparing the given statements on every new connection"""
+    async def init(connection: asyncpg.Connection):
+        for query in statements:
+            try:
+                await _prepare_statement(connection, query)
+            except Exception as e:
+                # A statement that fails to prepare (e.g. a pending migration)
+                # is simply parsed on first use instead
+                logger.warning(f"Could not prepare statement during warm-up: {str(e)}")
+    return init
+
+async def _create_pool(connect_kwargs: dict, name: str, statements: Sequence[str] = ()) -> InstrumentedPool:
+    # asyncpg opens the min_size connections concurrently and runs `init` on each
+    pool = await asyncpg.create_pool(
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        max_inactive_connection_lifetime=settings.db_max_inactive_connection_lifetime,
+        statement_cache_size=settings.db_statement_cache_size,
+        command_timeout=settings.db_command_timeout,
+        init=_statement_warmer(statements) if statements else None,
+        **connect_kwargs
+    )
+    return InstrumentedPool(pool, name=name)
+
+async def connect_db(statements: Sequence[str] = ()):
+    """
+    Connect to the database (and to the read replicas, when configured)
+
+    Args:
+        statements: Queries to prepare on every pool connection as it is opened
+    """
+    global db_pool, read_pools
     try:
-        logger.info(f"Connecting to database: {settings.db_host}:{settings.db_port}/{settings.db_name}")
+        connect_kwargs = _connect_kwargs()
+        logger.info(f"Connecting to database: {_describe(connect_kwargs)}")
 
-        db_pool = await asyncpg.create_pool(
-            host=settings.db_host,
-            port=settings.db_port,
-            user=settings.db_username,
-            password=settings.db_password,
-            database=settings.db_name,
-            min_size=1,
-            max_size=10
-        )
+        db_pool = await _create_pool(connect_kwargs, "primary", statements)
 
-        logger.info(f"Successfully connected to database: {settings.db_name}")
-        logger.info(f"Connection pool created with min_size=1, max_size=10")
+        logger.info(f"Successfully connected to database: {_describe(connect_kwargs)}")
+        logger.info(f"Connection pool created with min_size={settings.db_pool_min_size}, max_size={settings.db_pool_max_size}")
 
     except Exception as e:
         logger.error(f"Failed to connect to database: {str(e)}", exc_info=True)
         raise
 
+    async def connect_replica(index: int, dsn: str) -> Optional[InstrumentedPool]:
+        replica_kwargs = _connect_kwargs(dsn)
+        try:
+            pool = await _create_pool(replica_kwargs, f"replica{index}", statements)
+            logger.info(f"Connected to read replica {index}: {_describe(replica_kwargs)}")
+            return pool
+        except Exception as e:
+            # Reads fall back to the primary rather than failing startup
+            logger.warning(f"Read replica {index} unavailable ({_describe(replica_kwargs)}): {str(e)}")
+            return None
+
+    replicas = await asyncio.gather(*(
+        connect_replica(index, dsn) for index, dsn in enumerate(settings.read_replica_urls(), start=1)
+    ))
+    read_pools = [pool for pool in replicas if pool is not None]
+
 async def disconnect_db():
     """Disconnect from the database"""
-    global db_pool
+    global db_pool, read_pools
     try:
+        for pool in read_pools:
+            await pool.close()
+        read_pools = []
         if db_pool:
             logger.info("Closing database connection pool")
             await db_pool.close()
@@ -44,6 +308,10 @@ async def disconnect_db():
     except Exception as e:
         logger.error(f"Error closing database connection: {str(e)}", exc_info=True)
 
+async def create_listener_connection() -> asyncpg.Connection:
+    """Open a dedicated connection for LISTEN/NOTIFY, kept outside the pool"""
+    return await asyncpg.connect(**_connect_kwargs())
+
 async def get_db():
     """Get database connection"""
     if not db_pool:
@@ -52,3 +320,23 @@ async def get_db():
 
     logger.debug("Returning database connection pool")
     return db_pool
+
+async def get_read_db():
+    """
+    Get a pool for read-only queries.
+
+    Returns the least busy read-replica pool, or the primary pool when no
+    replica is configured. Replicas may lag slightly behind the primary, so
+    reads that must see a write just made should use get_db().
+    """
+    if not read_pools:
+        return await get_db()
+
+    # Rotate the starting point so that equally busy replicas share the load
+    offset = next(_read_rotation) % len(read_pools)
+    candidates = read_pools[offset:] + read_pools[:offset]
+    return min(candidates, key=lambda pool: pool.get_size() - pool.get_idle_size())
+
+def pool_stats() -> List[dict]:
+    """Size, utilization and acquire-wait statistics of every pool"""
+    return [pool.stats() for pool in all_pools()]
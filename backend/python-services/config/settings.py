@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Application settings
@@ -18,9 +18,112 @@ class Settings(BaseSettings):
     db_name: str
     database_url: Optional[str] = None
 
+    # Connection pool settings (applied to the primary and every replica pool)
+    db_pool_min_size: int = 5
+    db_pool_max_size: int = 10
+    db_statement_cache_size: int = 100
+    db_max_inactive_connection_lifetime: float = 300.0
+    db_command_timeout: Optional[float] = None
+
+    # Slow query log: statements slower than this are logged with their parameter shapes (0 disables)
+    slow_query_threshold_ms: float = 500.0
+    # Fraction of slow reads re-run under EXPLAIN (ANALYZE, BUFFERS) in a read-only transaction,
+    # at most once per statement per interval (0 disables the capture)
+    slow_query_explain_sample_rate: float = 0.1
+    slow_query_explain_interval_seconds: float = 300.0
+    slow_query_explain_timeout_seconds: float = 10.0
+    # Statements with their own latency/row-count aggregates (later ones share one entry)
+    query_stats_max_statements: int = 500
+    # Latest calls per statement the p50/p95 latencies are computed over
+    query_stats_window: int = 256
+
+    # Comma-separated DSNs of read replicas used by read-only endpoints
+    db_read_replica_urls: Optional[str] = None
+
+    # Startup: check the hot statements (and load their type codecs) on every new
+    # pool connection, and how long /readyz waits for the database before
+    # reporting not ready
+    db_warmup_statements: bool = True
+    readiness_check_timeout_seconds: float = 2.0
+
+    # Test data sampling (POST /workflows/prepare-test): random/stratified loans are
+    # picked from a TABLESAMPLE of about this many indexing rows when the table is
+    # larger and the request has no samplePercent (0 always reads every matching row)
+    test_sample_max_scan_rows: int = 1000000
+
+    # Reference data cache settings
+    reference_cache_ttl_seconds: int = 300
+    reference_cache_max_entries: int = 128
+    reference_cache_notify_channel: str = "reference_data_changed"
+
+    # Workflow change feed (GET /workflows/changes, Server-Sent Events) fed by
+    # NOTIFY on this channel (sql/006); per-client queue, replay buffer for
+    # Last-Event-ID and idle heartbeat interval
+    workflow_changes_channel: str = "workflow_changes"
+    change_feed_max_subscribers: int = 5000
+    change_feed_queue_size: int = 256
+    change_feed_replay_size: int = 1000
+    change_feed_heartbeat_seconds: float = 15.0
+
+    # Orchestrator graph index: full rebuild interval (writes through the API refresh it incrementally)
+    workflow_graph_ttl_seconds: int = 300
+
+    # Workflow validation (POST /workflows/validate): reject saves, save-versions,
+    # PATCHes and imports whose steps have structural errors (prerequisite findings
+    # are only warnings), and how many prerequisite texts are kept parsed between validations
+    validate_workflows_on_save: bool = True
+    workflow_validation_cache_size: int = 20000
+
+    # How often a delta save (PATCH) is re-applied when another save lands
+    # between reading the workflow and writing it back
+    save_conflict_retries: int = 5
+
+    # Test runs (POST /workflows/test-run): model calls in flight per run and the
+    # per-call timeout. Without TEST_RUN_MODEL_URL a local stub model answers every call.
+    test_run_concurrency: int = 8
+    test_run_max_concurrency: int = 64
+    test_run_timeout_seconds: float = 60.0
+    test_run_model_url: Optional[str] = None
+    test_run_stub_latency_ms: float = 50.0
+
+    # Response compression settings
+    compression_minimum_size: int = 1024
+    gzip_compression_level: int = 6
+    brotli_quality: int = 4
+    # Streamed responses are flushed to the client once this many bytes are
+    # pending, or this long after the oldest pending chunk
+    compression_flush_bytes: int = 65536
+    compression_flush_interval_ms: float = 100.0
+
+    # Build list responses straight from database rows and serialize them with
+    # orjson (when installed), skipping the per-row pydantic models
+    fast_json_responses: bool = True
+
+    # Logging settings
+    log_level: str = "INFO"
+    log_format: str = "json"  # json or text
+    # Fraction of requests whose INFO/DEBUG logs are kept (warnings and errors always are)
+    log_sample_rate: float = 1.0
+
+    # Per-request profiling: requests sending "X-Profile: <token>" get a Server-Timing
+    # header (unset disables it); a sampled fraction is profiled into the log only
+    profiling_token: Optional[str] = None
+    profiling_sample_rate: float = 0.0
+    # Folded stack files written for "X-Profile-Sampler: true" requests
+    profiling_output_dir: str = "profiles"
+    profiling_sampler_interval_ms: float = 5.0
+
+    # Token the /admin endpoints require in the X-Admin-Token header (unset disables them)
+    admin_token: Optional[str] = None
+
     # API Keys and secrets
     secret_key: str = "your-secret-key-here"
 
+    def read_replica_urls(self) -> List[str]:
+        if not self.db_read_replica_urls:
+            return []
+        return [url.strip() for url in self.db_read_replica_urls.split(",") if url.strip()]
+
     class Config:
         env_file = ".env"
         case_sensitive = False
@@ -1,84 +1,139 @@
-from fastapi import FastAPI, Request
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from api import workflow_router
+from fastapi.responses import JSONResponse, PlainTextResponse
+from api import admin_router, workflow_router
+from config import database
 from config.settings import settings
-from config.database import connect_db, disconnect_db
+from config.database import connect_db, disconnect_db, get_read_db
+from services.change_feed import change_feed
+from services.notifications import notification_listener
+from services.reference_cache import reference_cache
+from services.test_run_executor import test_run_executor
+from services.warmup import check_database, hot_statements, prime_reference_cache, readiness
+from services.workflow_graph import workflow_graph
+from utils.logging_config import configure_logging, stop_logging
+from utils.metrics import RequestInstrumentationMiddleware, registry
+from utils.profiling import ProfilingMiddleware
+from utils.transport import CompressionMiddleware
 import logging
 import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
+# Configure logging: records are queued and written by a background thread
+configure_logging(
+    level=settings.log_level,
+    log_format=settings.log_format,
+    sample_rate=settings.log_sample_rate
 )
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title="MSI Agentic Platform - Python Services",
-    description="Backend services for MSI Agentic Platform",
-    version="1.0.0"
-)
-
-# Configure CORS
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-# Request logging middleware
-@app.middleware("http")
-async def log_requests(request: Request, call_next):
-    start_time = time.time()
-
-    logger.info(f"Incoming request: {request.method} {request.url.path}")
-    logger.debug(f"Request headers: {dict(request.headers)}")
-
+async def start_notification_listener():
+    """
+    Invalidate the reference data cache and feed the workflow change feed on
+    Postgres NOTIFY; TTL expiry covers listener outages for the cache
+    """
+    await notification_listener.subscribe(settings.reference_cache_notify_channel, reference_cache.handle_notification)
+    await notification_listener.subscribe(settings.reference_cache_notify_channel, workflow_graph.handle_notification)
+    await notification_listener.subscribe(settings.workflow_changes_channel, change_feed.handle_notification)
+    notification_listener.on_disconnect(reference_cache.clear)
+    notification_listener.on_disconnect(workflow_graph.invalidate)
+    notification_listener.on_disconnect(change_feed.handle_disconnect)
     try:
-        response = await call_next(request)
-        process_time = time.time() - start_time
-
-        logger.info(
-            f"Request completed: {request.method} {request.url.path} "
-            f"- Status: {response.status_code} - Time: {process_time:.3f}s"
-        )
+        await notification_listener.start()
+    except Exception as e:
+        # Retry in the background; until then the caches rely on their TTL only
+        logger.warning(f"Notification listener unavailable, retrying in the background: {str(e)}")
+        notification_listener.schedule_reconnect()
 
-        return response
+async def warm_up():
+    """Prime the reference data caches so the first requests are served from memory"""
+    try:
+        await prime_reference_cache(await get_read_db())
     except Exception as e:
-        process_time = time.time() - start_time
-        logger.error(
-            f"Request failed: {request.method} {request.url.path} "
-            f"- Error: {str(e)} - Time: {process_time:.3f}s",
-            exc_info=True
-        )
-        raise
+        # Not fatal: the caches load on first use instead
+        readiness.error = f"Reference cache warm-up failed: {str(e)}"
+        logger.warning(readiness.error)
 
-# Event handlers for database connection
-@app.on_event("startup")
-async def startup():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     logger.info("Application startup initiated")
     try:
-        await connect_db()
-        logger.info("Application startup completed successfully")
+        await connect_db(hot_statements() if settings.db_warmup_statements else ())
+        readiness.mark("database")
+        await start_notification_listener()
+        readiness.mark("listener")
+        await warm_up()
+        readiness.mark("caches")
+        readiness.mark_ready()
+        logger.info(
+            f"Application startup completed successfully - Ready in {readiness.time_to_ready:.3f}s",
+            extra={"phases": readiness.phases}
+        )
     except Exception as e:
+        readiness.error = str(e)
         logger.error(f"Application startup failed: {str(e)}", exc_info=True)
         raise
 
-@app.on_event("shutdown")
-async def shutdown():
+    yield
+
     logger.info("Application shutdown initiated")
+    readiness.mark_stopping()
+    # End open change feed streams so the server is not held up by them
+    change_feed.close()
     try:
+        await notification_listener.stop()
+        await test_run_executor.close()
         await disconnect_db()
         logger.info("Application shutdown completed successfully")
     except Exception as e:
         logger.error(f"Application shutdown failed: {str(e)}", exc_info=True)
+    finally:
+        # Flush queued log records before the process exits
+        stop_logging()
+
+app = FastAPI(
+    title="MSI Agentic Platform - Python Services",
+    description="Backend services for MSI Agentic Platform",
+    version="1.0.0",
+    lifespan=lifespan
+)
+
+# Configure CORS
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "X-Request-ID", "Server-Timing"],
+)
+
+# Compress JSON/NDJSON responses (brotli when accepted, otherwise gzip)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.gzip_compression_level,
+    brotli_quality=settings.brotli_quality,
+    flush_size=settings.compression_flush_bytes,
+    flush_interval=settings.compression_flush_interval_ms / 1000,
+)
+
+# On-demand per-request profiling (inside the instrumentation so profiles carry the request id)
+app.add_middleware(
+    ProfilingMiddleware,
+    token=settings.profiling_token,
+    sample_rate=settings.profiling_sample_rate,
+    output_dir=settings.profiling_output_dir,
+    sampler_interval=settings.profiling_sampler_interval_ms / 1000,
+)
+
+# Request ids, latency metrics and access logging (outermost, so it times everything)
+app.add_middleware(RequestInstrumentationMiddleware)
 
 # Include routers
 app.include_router(workflow_router.router, prefix="/api/v1")
+app.include_router(admin_router.router, prefix="/api/v1")
 
 @app.get("/")
 async def root():
@@ -93,6 +148,30 @@ async def health_check():
     logger.info("Health check endpoint accessed")
     return {"status": "healthy"}
 
+@app.get("/livez")
+async def liveness_check():
+    """Liveness probe: the process is up and its event loop is responsive"""
+    return {"status": "alive", "uptimeSeconds": round(time.perf_counter() - readiness.started_at, 3)}
+
+@app.get("/readyz")
+async def readiness_check():
+    """Readiness probe: warm-up has finished and the primary database answers; 503 otherwise"""
+    database_error = await check_database(database.db_pool, settings.readiness_check_timeout_seconds)
+    ready = readiness.ready and database_error is None
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not ready",
+            "database": database_error or "ok",
+            **readiness.snapshot()
+        }
+    )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request latency, in-flight, error and database pool metrics in Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -1,4 +1,4 @@
 from .document import DocumentConfig
-from .workflow import WorkflowDetail
+from .workflow import SaveWorkflowRequest, WorkflowDetail, WorkflowImportRecord
 
-__all__ = ["DocumentConfig", "WorkflowDetail"]
+__all__ = ["DocumentConfig", "SaveWorkflowRequest", "WorkflowDetail", "WorkflowImportRecord"]
@@ -1,4 +1,5 @@
-from pydantic import BaseModel
+from datetime import datetime, timezone
+from pydantic import BaseModel, field_validator
 from typing import Optional, List
 
 class WorkflowDetail(BaseModel):
@@ -16,3 +17,37 @@ class WorkflowDetail(BaseModel):
 
     class Config:
         from_attributes = True
+
+class SaveWorkflowRequest(BaseModel):
+    """Workflow steps and settings as saved from the editor"""
+    workflowName: str
+    description: Optional[str] = None
+    category: str
+    doc_type: str
+    other_doc: Optional[List[str]] = None
+    flowType: str
+    runtype: Optional[str] = 'loan'
+    workflow: List[dict]
+    data_point: Optional[str] = None
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """updated_at is a timestamp without time zone; compare client values as naive UTC"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+class ConditionalSaveWorkflowRequest(SaveWorkflowRequest):
+    """
+    A save that only applies when the workflow is still at expectedVersion
+    and/or expectedUpdatedAt (as last read by the client); omit both to
+    overwrite unconditionally.
+    """
+    expectedVersion: Optional[int] = None
+    expectedUpdatedAt: Optional[datetime] = None
+
+    _normalize_updated_at = field_validator("expectedUpdatedAt")(naive_utc)
+
+class WorkflowImportRecord(SaveWorkflowRequest):
+    """One NDJSON line of a bulk workflow import (id/version are optional)"""
+    id: Optional[int] = None
+    version: Optional[int] = None
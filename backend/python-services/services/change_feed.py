@@ -0,0 +1,184 @@
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Deque, Optional, Set, Tuple
+
+from config.settings import settings
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_SUBSCRIBERS = registry.gauge(
+    "change_feed_subscribers",
+    "Clients connected to the workflow change feed"
+)
+CHANGE_FEED_EVENTS = registry.counter(
+    "change_feed_events_total",
+    "Workflow change events received from Postgres"
+)
+CHANGE_FEED_DROPPED = registry.counter(
+    "change_feed_dropped_subscribers_total",
+    "Subscribers disconnected because they fell too far behind"
+)
+
+# SSE comment sent on idle streams so proxies do not close them
+HEARTBEAT = b": keep-alive\n\n"
+
+def sse_frame(event: str, data: dict, event_id: Optional[str] = None) -> bytes:
+    """One Server-Sent Events frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'))}")
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+class ChangeFeedFull(Exception):
+    """The change feed already has the maximum number of subscribers"""
+
+class Subscription:
+    """One connected client: a bounded queue of encoded frames"""
+
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.closed = False
+
+    def push(self, frame: bytes) -> bool:
+        """Queue a frame; False when the client is too far behind to keep up"""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    def close(self, frame: Optional[bytes] = None):
+        """End the stream after the frames already queued (and an optional last frame)"""
+        if self.closed:
+            return
+        self.closed = True
+        if frame is not None and self.queue.full():
+            # Make room so the client learns why it was disconnected
+            self.queue.get_nowait()
+        if frame is not None:
+            self.queue.put_nowait(frame)
+        # None marks the end of the stream
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+class WorkflowChangeFeed:
+    """
+    Fans workflow change notifications out to Server-Sent Events clients.
+
+    Fed by the shared NotificationListener (one Postgres connection for the
+    whole process, see sql/006_workflow_change_notify.sql), so subscribers
+    hold no database connection. Each event is encoded once and the same
+    bytes are queued for every subscriber. A subscriber whose queue fills up
+    is sent a "resync" event and disconnected instead of slowing the others
+    down. Recent events are kept so a reconnecting client can resume from
+    its Last-Event-ID.
+    """
+
+    def __init__(self, max_subscribers: int, queue_size: int, replay_size: int):
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self._subscribers: Set[Subscription] = set()
+        self._recent: Deque[Tuple[int, bytes]] = deque(maxlen=replay_size)
+        # Event ids are "<epoch>-<sequence>"; the epoch tells ids of an earlier process apart
+        self.epoch = format(int(time.time() * 1000), "x")
+        self._last_id = 0
+        self.events = 0
+        self.dropped = 0
+
+    def _parse_event_id(self, event_id: str) -> Optional[int]:
+        """Sequence number of an event id issued by this process, else None"""
+        epoch, _, sequence = event_id.partition("-")
+        if epoch != self.epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, last_event_id: Optional[str] = None) -> Subscription:
+        """
+        Register a client, replaying the events after last_event_id.
+
+        When those events are no longer kept, or the id comes from another
+        process, the client gets a "resync" event telling it to refetch.
+        """
+        if len(self._subscribers) >= self.max_subscribers:
+            raise ChangeFeedFull(f"Change feed is full ({self.max_subscribers} subscribers)")
+        subscription = Subscription(self.queue_size)
+        if last_event_id:
+            last_sequence = self._parse_event_id(last_event_id)
+            oldest = self._recent[0][0] if self._recent else self._last_id + 1
+            missed = [frame for sequence, frame in self._recent if last_sequence is not None and sequence > last_sequence]
+            if last_sequence is None or last_sequence > self._last_id or last_sequence < oldest - 1 or len(missed) > self.queue_size:
+                subscription.push(sse_frame("resync", {"reason": "missed events"}))
+            else:
+                for frame in missed:
+                    subscription.push(frame)
+        self._subscribers.add(subscription)
+        CHANGE_FEED_SUBSCRIBERS.set(len(self._subscribers))
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        CHANGE_FEED_SUBSCRIBERS.set(len(self._subscribers))
+
+    def publish(self, change: dict):
+        """Send a change event to every subscriber"""
+        self._last_id += 1
+        self.events += 1
+        CHANGE_FEED_EVENTS.inc()
+        frame = sse_frame("change", change, f"{self.epoch}-{self._last_id}")
+        self._recent.append((self._last_id, frame))
+        for subscription in list(self._subscribers):
+            if not subscription.push(frame):
+                self._drop(subscription)
+
+    def _drop(self, subscription: Subscription):
+        self.dropped += 1
+        CHANGE_FEED_DROPPED.inc()
+        logger.warning("Change feed subscriber fell behind, disconnecting it")
+        subscription.close(sse_frame("resync", {"reason": "too slow"}))
+        self.unsubscribe(subscription)
+
+    def handle_notification(self, payload: str):
+        """NOTIFY callback; payload is {"op", "id", "version", "updated_at"} as JSON"""
+        try:
+            change = json.loads(payload)
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring malformed workflow change notification: {payload!r}")
+            return
+        self.publish(change)
+
+    def handle_disconnect(self):
+        """Notifications may have been missed while the listener was down: clients must refetch"""
+        frame = sse_frame("resync", {"reason": "listener reconnected"})
+        self._recent.clear()
+        for subscription in list(self._subscribers):
+            if not subscription.push(frame):
+                self._drop(subscription)
+
+    def close(self):
+        """End every stream (shutdown)"""
+        for subscription in list(self._subscribers):
+            subscription.close()
+        self._subscribers.clear()
+        CHANGE_FEED_SUBSCRIBERS.set(0)
+
+    def stats(self) -> dict:
+        return {
+            "subscribers": len(self._subscribers),
+            "maxSubscribers": self.max_subscribers,
+            "events": self.events,
+            "lastEventId": f"{self.epoch}-{self._last_id}",
+            "droppedSubscribers": self.dropped,
+        }
+
+change_feed = WorkflowChangeFeed(
+    max_subscribers=settings.change_feed_max_subscribers,
+    queue_size=settings.change_feed_queue_size,
+    replay_size=settings.change_feed_replay_size
+)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+from typing import Callable, Dict, List, Optional
+
+import asyncpg
+
+from config.database import create_listener_connection
+
+logger = logging.getLogger(__name__)
+
+NotificationCallback = Callable[[str], None]
+DisconnectCallback = Callable[[], None]
+
+class NotificationListener:
+    """
+    Shared Postgres LISTEN/NOTIFY listener.
+
+    Holds a single dedicated connection (outside the pool) and dispatches
+    notification payloads to the callbacks subscribed to each channel. If the
+    connection drops, disconnect callbacks are fired and the listener
+    reconnects in the background with exponential backoff.
+    """
+
+    def __init__(self, max_backoff_seconds: float = 30.0):
+        self._connection: Optional[asyncpg.Connection] = None
+        self._callbacks: Dict[str, List[NotificationCallback]] = {}
+        self._disconnect_callbacks: List[DisconnectCallback] = []
+        self._reconnect_task: Optional[asyncio.Task] = None
+        self._max_backoff_seconds = max_backoff_seconds
+        self._stopping = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connection is not None and not self._connection.is_closed()
+
+    async def start(self):
+        """Open the listener connection and LISTEN on every subscribed channel"""
+        self._stopping = False
+        connection = await create_listener_connection()
+        connection.add_termination_listener(self._on_terminated)
+        for channel in self._callbacks:
+            await connection.add_listener(channel, self._dispatch)
+        self._connection = connection
+        logger.info(f"Notification listener started on channels: {list(self._callbacks)}")
+
+    async def stop(self):
+        """Close the listener connection and cancel any pending reconnect"""
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._connection and not self._connection.is_closed():
+            await self._connection.close()
+        self._connection = None
+        logger.info("Notification listener stopped")
+
+    async def subscribe(self, channel: str, callback: NotificationCallback):
+        """Register a callback for a channel, issuing LISTEN if already connected"""
+        first_subscriber = channel not in self._callbacks
+        self._callbacks.setdefault(channel, []).append(callback)
+        if first_subscriber and self.connected:
+            await self._connection.add_listener(channel, self._dispatch)
+
+    def on_disconnect(self, callback: DisconnectCallback):
+        """Register a callback fired when notifications may have been missed"""
+        self._disconnect_callbacks.append(callback)
+
+    def _dispatch(self, connection, pid, channel, payload):
+        for callback in self._callbacks.get(channel, []):
+            try:
+                callback(payload)
+            except Exception as e:
+                logger.error(f"Notification callback failed for channel {channel}: {str(e)}", exc_info=True)
+
+    def _on_terminated(self, connection):
+        if self._stopping:
+            return
+        logger.warning("Notification listener connection lost, scheduling reconnect")
+        self._connection = None
+        for callback in self._disconnect_callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"Disconnect callback failed: {str(e)}", exc_info=True)
+        self.schedule_reconnect()
+
+    def schedule_reconnect(self):
+        """Keep retrying start() in the background with exponential backoff until it succeeds"""
+        if not self._reconnect_task or self._reconnect_task.done():
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        backoff = 1.0
+        while not self._stopping:
+            try:
+                await self.start()
+                return
+            except Exception as e:
+                logger.warning(f"Notification listener reconnect failed: {str(e)}; retrying in {backoff:.0f}s")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self._max_backoff_seconds)
+
+notification_listener = NotificationListener()
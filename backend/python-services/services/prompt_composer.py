@@ -0,0 +1,81 @@
+import logging
+from typing import Callable, Iterator, List
+
+from utils.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+STEP_SEPARATOR = "\n\n"
+
+def render_step(item: dict) -> str:
+    """
+    Render the prompt block for a single workflow step.
+
+    Args:
+        item: Workflow step dictionary
+
+    Returns:
+        Formatted block for the step
+    """
+    step_id = item.get("id", "")
+    node = item.get("node", "")
+    prerequisite = item.get("prerequisite") or ""
+    prompt = item.get("prompt") or ""
+    note = item.get("note") or ""
+    # Numbers (and any other JSON value) are rendered as their text
+    if type(prerequisite) is not str or type(prompt) is not str or type(note) is not str:
+        prerequisite, prompt, note = str(prerequisite), str(prompt), str(note)
+    prerequisite = prerequisite.strip()
+    prompt = prompt.strip()
+    note = note.strip()
+
+    block_lines = [
+        f"## STEP {step_id}: Invoke node `{node}`"
+    ]
+
+    if prerequisite:
+        block_lines.append(f"**PREREQUISITES TO EXECUTE THIS STEP**\n{prerequisite}\n**INSTRUCTIONS OF THE STEP:**")
+
+    if prompt:
+        block_lines.append(prompt)
+
+    if note:
+        block_lines.append(f"**IMPORTANT NOTE**\n{note}")
+
+    return "\n".join(block_lines)
+
+@profiled("compose")
+def compose_prompt(workflow_data: List[dict]) -> str:
+    """
+    Compose a formatted prompt from workflow steps.
+
+    Every step is rendered on each call. Rendering is a strip and a copy
+    of the step's text, which is cheaper than the hashing any per-step
+    cache would need to find the block again (benchmarks/bench_compose_prompt.py).
+
+    Args:
+        workflow_data: List of workflow step dictionaries
+
+    Returns:
+        Formatted prompt string combining all workflow steps
+    """
+    return STEP_SEPARATOR.join([render_step(item) for item in workflow_data])
+
+def iter_prompt(workflow_data: List[dict]) -> Iterator[str]:
+    """
+    Yield the prompt piece by piece (blocks and separators).
+
+    Suitable for a StreamingResponse or any writer, without building the
+    full string or an intermediate list of blocks.
+    """
+    first = True
+    for item in workflow_data:
+        if not first:
+            yield STEP_SEPARATOR
+        first = False
+        yield render_step(item)
+
+def write_prompt(workflow_data: List[dict], write: Callable[[str], object]):
+    """Write the prompt into a file-like writer (e.g. io.StringIO.write)"""
+    for piece in iter_prompt(workflow_data):
+        write(piece)
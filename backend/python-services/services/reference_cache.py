@@ -0,0 +1,264 @@
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from config.settings import settings
+from models.document import DocumentConfig
+from utils.profiling import name_statements
+from utils.single_flight import single_flight
+from utils.transport import json_bytes, make_etag
+
+logger = logging.getLogger(__name__)
+
+DOCTYPES_KEY = "doctypes"
+DOCUMENT_CONFIGS_KEY = "document_configs"
+DATAPOINTS_KEY = "datapoints"
+
+# Which cache entries a change to each source table invalidates
+TABLE_KEYS = {
+    "gpt_doc_config": (DOCTYPES_KEY, DOCUMENT_CONFIGS_KEY),
+    "mortgage_workflow": (DATAPOINTS_KEY,),
+}
+
+DOCTYPES_QUERY = "SELECT DISTINCT doctype FROM common.gpt_doc_config ORDER BY doctype"
+
+DOCUMENT_CONFIGS_QUERY = """
+    SELECT
+        doctype, doc_category, doc_provider, is_multiborrower,
+        borrower_field_name, ssn_field_name, dynamic_borrower_tag
+    FROM common.gpt_doc_config
+    ORDER BY doctype
+"""
+
+DATAPOINTS_QUERY = """
+    SELECT DISTINCT id, data_point as "datapointName"
+    FROM common.mortgage_workflow
+    WHERE data_point IS NOT NULL
+    ORDER BY data_point
+"""
+name_statements({
+    "doctypes": DOCTYPES_QUERY,
+    "document_configs": DOCUMENT_CONFIGS_QUERY,
+    "datapoints": DATAPOINTS_QUERY,
+})
+
+class TTLCache:
+    """
+    Size-bounded LRU cache whose entries also expire after a fixed TTL.
+
+    Not thread-safe; intended to be used from the event loop only.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: str) -> Optional[Any]:
+        """Return a live entry without touching counters or LRU order"""
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def set(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, *keys: str):
+        for key in keys:
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "maxEntries": self.max_entries,
+            "ttlSeconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+@dataclass
+class DocumentConfigIndex:
+    """gpt_doc_config rows indexed by doctype, category and provider"""
+    rows: List[DocumentConfig] = field(default_factory=list)
+    by_doctype: Dict[str, List[DocumentConfig]] = field(default_factory=dict)
+    by_category: Dict[str, List[DocumentConfig]] = field(default_factory=dict)
+    by_provider: Dict[str, List[DocumentConfig]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, rows: List[DocumentConfig]) -> "DocumentConfigIndex":
+        index = cls(rows=rows)
+        for row in rows:
+            index.by_doctype.setdefault(row.doctype, []).append(row)
+            if row.doc_category is not None:
+                index.by_category.setdefault(row.doc_category, []).append(row)
+            if row.doc_provider is not None:
+                index.by_provider.setdefault(row.doc_provider, []).append(row)
+        return index
+
+    def filter(
+        self,
+        doctype: Optional[str] = None,
+        category: Optional[str] = None,
+        provider: Optional[str] = None
+    ) -> List[DocumentConfig]:
+        """Return rows matching every given filter, using the narrowest index"""
+        if doctype is not None:
+            candidates = self.by_doctype.get(doctype, [])
+        elif category is not None:
+            candidates = self.by_category.get(category, [])
+        elif provider is not None:
+            candidates = self.by_provider.get(provider, [])
+        else:
+            return list(self.rows)
+
+        return [
+            row for row in candidates
+            if (category is None or row.doc_category == category)
+            and (provider is None or row.doc_provider == provider)
+        ]
+
+class ReferenceDataCache:
+    """
+    In-process cache for rarely changing reference data.
+
+    Holds the doctype list, the indexed gpt_doc_config rows and the workflow
+    datapoint list. Entries expire after a TTL and are dropped early when a
+    Postgres NOTIFY arrives on the configured channel (payload is the source
+    table name) or when the router writes to mortgage_workflow.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self._cache = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._flights = single_flight("reference-cache")
+        # Bumped on every invalidation so loads that raced a change are not stored
+        self.generation = 0
+        self.notifications = 0
+        self._etags: Dict[str, tuple] = {}
+        self._bodies: Dict[str, tuple] = {}
+
+    async def _get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self._cache.get(key)
+        if value is not None:
+            return value
+
+        # Only one coroutine reloads a given key; the others share its result
+        return await self._flights.do((key, self.generation), lambda: self._load(key, loader))
+
+    async def _load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = self.generation
+        value = await loader()
+        if generation == self.generation:
+            self._cache.set(key, value)
+            logger.debug(f"Reference cache loaded '{key}'")
+        return value
+
+    async def get_doctypes(self, pool) -> List[str]:
+        """Unique document types from gpt_doc_config"""
+        async def load():
+            rows = await pool.fetch(DOCTYPES_QUERY)
+            return [row["doctype"] for row in rows]
+        return await self._get_or_load(DOCTYPES_KEY, load)
+
+    async def get_document_configs(self, pool) -> DocumentConfigIndex:
+        """All gpt_doc_config rows indexed by doctype, category and provider"""
+        async def load():
+            rows = await pool.fetch(DOCUMENT_CONFIGS_QUERY)
+            return DocumentConfigIndex.build([DocumentConfig(**dict(row)) for row in rows])
+        return await self._get_or_load(DOCUMENT_CONFIGS_KEY, load)
+
+    async def get_datapoints(self, pool) -> List[dict]:
+        """Workflow datapoints as {id, datapointName} dicts"""
+        async def load():
+            rows = await pool.fetch(DATAPOINTS_QUERY)
+            return [{"id": row["id"], "datapointName": row["datapointName"]} for row in rows]
+        return await self._get_or_load(DATAPOINTS_KEY, load)
+
+    def etag(self, key: str, value: Any) -> str:
+        """Content-derived ETag for a cached value, computed once per loaded value"""
+        memo = self._etags.get(key)
+        if memo is not None and memo[0] is value:
+            return memo[1]
+        etag = make_etag(key, repr(value))
+        self._etags[key] = (value, etag)
+        return etag
+
+    def json_body(self, key: str, value: Any) -> bytes:
+        """JSON serialization of a cached value, computed once per loaded value"""
+        memo = self._bodies.get(key)
+        if memo is not None and memo[0] is value:
+            return memo[1]
+        body = json_bytes(value)
+        self._bodies[key] = (value, body)
+        return body
+
+    def invalidate_table(self, table: str):
+        """Drop every entry derived from the given source table"""
+        self.generation += 1
+        keys = TABLE_KEYS.get(table)
+        if keys is None:
+            logger.warning(f"Unknown reference table '{table}', clearing reference cache")
+            self._cache.clear()
+            return
+        self._cache.invalidate(*keys)
+
+    def handle_notification(self, payload: str):
+        """NOTIFY callback; payload is the name of the table that changed"""
+        self.notifications += 1
+        table = (payload or "").strip().split(".")[-1]
+        logger.info(f"Reference data change notification for '{table}'")
+        if table:
+            self.invalidate_table(table)
+        else:
+            self.clear()
+
+    def clear(self):
+        self.generation += 1
+        self._cache.clear()
+
+    def stats(self) -> dict:
+        stats = self._cache.stats()
+        stats["coalescedLoads"] = self._flights.coalesced
+        stats["notifications"] = self.notifications
+        stats["generation"] = self.generation
+        return stats
+
+reference_cache = ReferenceDataCache(
+    max_entries=settings.reference_cache_max_entries,
+    ttl_seconds=settings.reference_cache_ttl_seconds
+)
@@ -0,0 +1,254 @@
+import base64
+import json
+import logging
+import random
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from config.settings import settings
+from utils.profiling import name_statements
+
+logger = logging.getLogger(__name__)
+
+SAMPLING_MODES = ("first", "random", "stratified")
+
+SOURCE_TABLE = "common.sub_document_indexing"
+
+# Planner estimate of the indexing table's rows (-1 or 0 when never analyzed)
+TABLE_ROWS_QUERY = f"SELECT reltuples::bigint FROM pg_class WHERE oid = '{SOURCE_TABLE}'::regclass"
+name_statements({"loan_sample_table_rows": TABLE_ROWS_QUERY})
+
+@dataclass
+class LoanSample:
+    """One page of sampled loans"""
+    loan_details: List[dict]
+    next_cursor: Optional[str]
+    seed: Optional[int]
+    sample_percent: Optional[float]
+
+def encode_cursor(value) -> str:
+    """Opaque, URL-safe cursor for the position after the last returned loan"""
+    return base64.urlsafe_b64encode(json.dumps(value).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+class TestDataSampler:
+    """
+    Picks loans (and their borrowers) to run a workflow test against.
+
+    Loans are chosen on the server with one statement per page:
+
+    - first: loans in loan_number order, keyset-paged on loan_number
+    - random: loans ordered by a seeded hash of loan_number, keyset-paged on
+      (hash, loan_number); the same seed always yields the same sample
+    - stratified: loans ranked by the seeded hash within each doc_type; a
+      loan takes its best rank over the doc_types it has, and pages are
+      keyset-paged on (rank, loan_number), so every doc_type contributes its
+      next loans to each page and no loan comes back on a later page
+
+    first reads only the page from the (doc_type, loan_number) index. random
+    and stratified hash and sort every candidate loan on each page, so their
+    candidates come from a TABLESAMPLE SYSTEM (block-level, REPEATABLE with
+    the seed) subset of the indexing rows: sample_percent when given,
+    otherwise a percentage keeping the scan near max_scan_rows rows when the
+    table is larger than that. The percentage is carried in the cursor so
+    every page reads the same subset. Borrowers are then aggregated per loan
+    with array_agg from the full table, so the sampled loans still list all
+    of their borrowers.
+    """
+
+    def __init__(self, pool, max_scan_rows: Optional[int] = None):
+        self.pool = pool
+        self.max_scan_rows = settings.test_sample_max_scan_rows if max_scan_rows is None else max_scan_rows
+
+    async def default_sample_percent(self) -> Optional[float]:
+        """TABLESAMPLE percentage reading about max_scan_rows rows, or None to read the whole table"""
+        if not self.max_scan_rows:
+            return None
+        estimate = await self.pool.fetchval(TABLE_ROWS_QUERY)
+        if not estimate or estimate <= self.max_scan_rows:
+            return None
+        return round(100.0 * self.max_scan_rows / estimate, 6)
+
+    def build_query(
+        self,
+        doc_types: List[str],
+        borrower_level: bool,
+        mode: str,
+        sample_size: int,
+        seed: Optional[int],
+        position,
+        sample_percent: Optional[float]
+    ) -> Tuple[str, list]:
+        """Build the sampling statement for the page after position (a decoded cursor); returns (query, params)"""
+        if mode not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode '{mode}'")
+
+        params: list = [doc_types]
+
+        def param(value) -> str:
+            params.append(value)
+            return f"${len(params)}"
+
+        source = SOURCE_TABLE
+        if sample_percent is not None and mode != "first":
+            source += f" TABLESAMPLE SYSTEM ({param(float(sample_percent))}) REPEATABLE ({param(float(seed))})"
+
+        conditions = ["doc_type = ANY($1)", "loan_number IS NOT NULL", "loan_number <> ''"]
+        if borrower_level:
+            conditions += ["borrower_id IS NOT NULL", "borrower_id <> ''"]
+
+        if mode == "first":
+            if position is not None:
+                conditions.append(f"loan_number > {param(str(position))}")
+            candidates = f"""
+                SELECT loan_number, NULL::bigint AS sort_key
+                FROM {source}
+                WHERE {" AND ".join(conditions)}
+                GROUP BY loan_number
+                ORDER BY loan_number
+                LIMIT {param(sample_size)}
+            """
+        elif mode == "random":
+            sort_key = f"hashtextextended(loan_number, {param(seed)})"
+            if position is not None:
+                last_key, last_loan = position[:2]
+                conditions.append(f"({sort_key}, loan_number) > ({param(int(last_key))}, {param(str(last_loan))})")
+            candidates = f"""
+                SELECT loan_number, {sort_key} AS sort_key
+                FROM {source}
+                WHERE {" AND ".join(conditions)}
+                GROUP BY loan_number
+                ORDER BY sort_key, loan_number
+                LIMIT {param(sample_size)}
+            """
+        else:
+            after = ""
+            if position is not None:
+                last_rank, last_loan = position[:2]
+                after = f"WHERE (sort_key, loan_number) > ({param(int(last_rank))}, {param(str(last_loan))})"
+            candidates = f"""
+                SELECT loan_number, sort_key
+                FROM (
+                    SELECT loan_number, MIN(rank) AS sort_key
+                    FROM (
+                        SELECT
+                            loan_number,
+                            row_number() OVER (
+                                PARTITION BY doc_type
+                                ORDER BY hashtextextended(loan_number, {param(seed)}), loan_number
+                            ) AS rank
+                        FROM (
+                            SELECT DISTINCT doc_type, loan_number
+                            FROM {source}
+                            WHERE {" AND ".join(conditions)}
+                        ) strata
+                    ) ranked
+                    GROUP BY loan_number
+                ) loans
+                {after}
+                ORDER BY sort_key, loan_number
+                LIMIT {param(sample_size)}
+            """
+
+        if not borrower_level:
+            query = f"""
+                WITH candidates AS ({candidates})
+                SELECT loan_number, sort_key, NULL::text[] AS borrower_ids
+                FROM candidates
+                ORDER BY sort_key, loan_number
+            """
+            return query, params
+
+        query = f"""
+            WITH candidates AS ({candidates})
+            SELECT c.loan_number, c.sort_key, b.borrower_ids
+            FROM candidates c
+            CROSS JOIN LATERAL (
+                SELECT array_agg(DISTINCT s.borrower_id ORDER BY s.borrower_id) AS borrower_ids
+                FROM {SOURCE_TABLE} s
+                WHERE s.loan_number = c.loan_number
+                AND s.doc_type = ANY($1)
+                AND s.borrower_id IS NOT NULL
+                AND s.borrower_id <> ''
+            ) b
+            ORDER BY c.sort_key, c.loan_number
+        """
+        return query, params
+
+    def next_cursor(self, mode: str, rows, sample_size: int, sample_percent: Optional[float]) -> Optional[str]:
+        """Cursor of the following page, or None when this page was the last"""
+        if len(rows) < sample_size:
+            return None
+        last = rows[-1]
+        if mode == "first":
+            return encode_cursor(last["loan_number"])
+        return encode_cursor([last["sort_key"], last["loan_number"], sample_percent])
+
+    async def sample(
+        self,
+        doc_types: List[str],
+        borrower_level: bool,
+        mode: str = "first",
+        sample_size: int = 100,
+        seed: Optional[int] = None,
+        cursor: Optional[str] = None,
+        sample_percent: Optional[float] = None
+    ) -> LoanSample:
+        """
+        Return one page of loans with their borrowers.
+
+        Args:
+            doc_types: Document types a loan must have been indexed with
+            borrower_level: Only keep loans with borrowers and list them
+            mode: first, random or stratified
+            sample_size: Loans per page
+            seed: Seed for random/stratified (generated when omitted)
+            cursor: nextCursor of the previous page
+            sample_percent: TABLESAMPLE SYSTEM percentage for random/stratified
+                (default: the cursor's, or one bounding the scan to max_scan_rows)
+
+        Returns:
+            LoanSample with loanDetails dicts, the next cursor, the seed and the sample percentage used
+        """
+        position = decode_cursor(cursor) if cursor else None
+        if mode != "first":
+            if seed is None:
+                seed = random.randint(0, 2 ** 31 - 1)
+            if sample_percent is None:
+                if position is not None:
+                    sample_percent = position[2] if len(position) > 2 else None
+                else:
+                    sample_percent = await self.default_sample_percent()
+        else:
+            sample_percent = None
+
+        query, params = self.build_query(doc_types, borrower_level, mode, sample_size, seed, position, sample_percent)
+        # The statement text depends on the options; name each variant for timings and the query log
+        name_statements({f"loan_sample_{mode}{'_borrowers' if borrower_level else ''}": query})
+        logger.debug(f"Sampling query: {query}")
+        rows = await self.pool.fetch(query, *params)
+
+        loan_details = []
+        for row in rows:
+            borrower_ids = row["borrower_ids"] or []
+            loan_details.append({
+                "loanNumber": row["loan_number"],
+                # First borrower (in id order) is primary, rest are not
+                "borrowerIDs": [
+                    {"id": borrower_id, "isPrimary": index == 0}
+                    for index, borrower_id in enumerate(borrower_ids)
+                ],
+            })
+
+        logger.info(f"Sampled {len(loan_details)} loans (mode={mode}, seed={seed}, sample_percent={sample_percent})")
+        return LoanSample(
+            loan_details=loan_details,
+            next_cursor=self.next_cursor(mode, rows, sample_size, sample_percent),
+            seed=seed if mode != "first" else None,
+            sample_percent=sample_percent
+        )
@@ -0,0 +1,172 @@
+import asyncio
+import hashlib
+import logging
+import random
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Optional
+
+import httpx
+
+from config.settings import settings
+from services.prompt_composer import compose_prompt
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class TestTarget:
+    """One unit of a test run: a loan, or one borrower of a loan"""
+    loan_number: str
+    borrower_id: Optional[str] = None
+    is_primary: Optional[bool] = None
+
+def build_targets(loan_details: List[dict], runtype: str) -> List[TestTarget]:
+    """Expand prepare-test loanDetails into run units (one per loan, or per borrower)"""
+    targets = []
+    for loan in loan_details:
+        borrowers = loan.get("borrowerIDs") or []
+        if runtype == "loan" or not borrowers:
+            targets.append(TestTarget(loan["loanNumber"]))
+            continue
+        for borrower in borrowers:
+            targets.append(TestTarget(loan["loanNumber"], borrower["id"], borrower.get("isPrimary")))
+    return targets
+
+def target_prompt(workflow_prompt: str, target: TestTarget) -> str:
+    """The workflow prompt followed by the loan (and borrower) it runs against"""
+    lines = [workflow_prompt, "", "## TEST TARGET", f"Loan number: {target.loan_number}"]
+    if target.borrower_id is not None:
+        lines.append(f"Borrower ID: {target.borrower_id}{' (primary)' if target.is_primary else ''}")
+    return "\n".join(lines)
+
+class StubModelClient:
+    """
+    Local stand-in for the model service.
+
+    Sleeps for a configurable latency and returns a deterministic output
+    derived from the prompt, so test runs can be exercised without a model.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+
+    async def run(self, prompt: str, target: TestTarget, workflow: dict) -> dict:
+        await asyncio.sleep(self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0))
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise RuntimeError("Stub model failure")
+        return {
+            "model": "stub",
+            "output": f"Stub result for loan {target.loan_number}",
+            "promptSha256": hashlib.sha256(prompt.encode("utf-8")).hexdigest(),
+            "promptLength": len(prompt),
+        }
+
+class HttpModelClient:
+    """Model service reached over HTTP; POSTs the prompt and target and returns the JSON reply"""
+
+    def __init__(self, url: str, timeout: float):
+        self.url = url
+        self._client = httpx.AsyncClient(timeout=timeout)
+
+    async def run(self, prompt: str, target: TestTarget, workflow: dict) -> dict:
+        response = await self._client.post(self.url, json={
+            "prompt": prompt,
+            "loanNumber": target.loan_number,
+            "borrowerId": target.borrower_id,
+            "workflowName": workflow.get("workflowName"),
+            "runtype": workflow.get("runtype"),
+        })
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self):
+        await self._client.aclose()
+
+class TestRunExecutor:
+    """
+    Runs a workflow over many loans/borrowers with bounded concurrency.
+
+    The workflow prompt is composed once per run; each target then only
+    appends its loan/borrower block. At most `concurrency` model calls are in flight and results are
+    yielded in completion order.
+
+    Args:
+        model_client: Object with `async run(prompt, target, workflow) -> dict`
+    """
+
+    def __init__(self, model_client):
+        self.model_client = model_client
+
+    async def _run_one(self, workflow_prompt: str, target: TestTarget, workflow: dict, timeout: float) -> dict:
+        result = {"type": "result", "loanNumber": target.loan_number, "borrowerId": target.borrower_id}
+        start_time = time.perf_counter()
+        try:
+            output = await asyncio.wait_for(
+                self.model_client.run(target_prompt(workflow_prompt, target), target, workflow),
+                timeout=timeout
+            )
+            result.update(status="ok", output=output)
+        except asyncio.TimeoutError:
+            result.update(status="error", error=f"Timed out after {timeout}s")
+        except Exception as e:
+            logger.warning(f"Test run failed for loan {target.loan_number}: {str(e)}")
+            result.update(status="error", error=str(e))
+        result["durationMs"] = round((time.perf_counter() - start_time) * 1000, 2)
+        return result
+
+    async def run(self, workflow: dict, loan_details: List[dict], concurrency: int, timeout: float) -> AsyncIterator[dict]:
+        """
+        Yield a start event, one result per target as it finishes, then a summary.
+
+        Closing the generator (e.g. the client disconnects) cancels the
+        outstanding model calls.
+        """
+        start_time = time.perf_counter()
+        targets = build_targets(loan_details, workflow.get("runtype") or "loan")
+        yield {"type": "start", "total": len(targets), "concurrency": concurrency}
+
+        workflow_prompt = compose_prompt(workflow.get("workflow") or [])
+        pending_targets = iter(targets)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            for target in pending_targets:
+                await results.put(await self._run_one(workflow_prompt, target, workflow, timeout))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(concurrency, len(targets)))]
+        succeeded = failed = 0
+        try:
+            for _ in range(len(targets)):
+                result = await results.get()
+                if result["status"] == "ok":
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield result
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        yield {
+            "type": "summary",
+            "total": len(targets),
+            "succeeded": succeeded,
+            "failed": failed,
+            "durationMs": round((time.perf_counter() - start_time) * 1000, 2),
+        }
+
+    async def close(self):
+        """Close the model client's connections"""
+        if hasattr(self.model_client, "close"):
+            await self.model_client.close()
+
+def create_model_client():
+    """HTTP model client when TEST_RUN_MODEL_URL is set, otherwise the local stub"""
+    if settings.test_run_model_url:
+        return HttpModelClient(settings.test_run_model_url, settings.test_run_timeout_seconds)
+    return StubModelClient(latency=settings.test_run_stub_latency_ms / 1000)
+
+test_run_executor = TestRunExecutor(create_model_client())
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from services.reference_cache import DATAPOINTS_QUERY, DOCTYPES_QUERY, DOCUMENT_CONFIGS_QUERY, reference_cache
+from services.workflow_repository import STATEMENTS, build_workflow_list_query
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+TIME_TO_READY = registry.gauge(
+    "app_time_to_ready_seconds",
+    "Seconds from application start until it reported ready",
+)
+
+# Statements run by the busiest endpoints; prepared on every new pool connection
+HOT_STATEMENT_NAMES = (
+    "workflow_details",
+    "workflow_details_batch",
+    "workflow_version",
+    "save_workflow_changes",
+    "save_workflow",
+    "save_workflow_settings",
+    "save_workflow_version",
+)
+
+def hot_statements() -> List[str]:
+    """Statement texts worth preparing before the first request needs them"""
+    statements = [DOCTYPES_QUERY, DOCUMENT_CONFIGS_QUERY, DATAPOINTS_QUERY]
+    statements.append(build_workflow_list_query()[0])
+    statements.append(build_workflow_list_query(limit=100)[0])
+    statements.extend(STATEMENTS[name] for name in HOT_STATEMENT_NAMES)
+    return statements
+
+class ReadinessState:
+    """
+    Startup progress of this process, reported by /readyz.
+
+    Times are measured from `started_at`, taken when the application modules
+    are imported, so `time_to_ready` covers pool creation, statement
+    preparation and cache priming.
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.phases: dict = {}
+        self.ready_at: Optional[float] = None
+        self.stopping = False
+        self.error: Optional[str] = None
+
+    def mark(self, phase: str):
+        """Record that a startup phase finished"""
+        self.phases[phase] = round(time.perf_counter() - self.started_at, 3)
+
+    def mark_ready(self):
+        self.ready_at = time.perf_counter()
+        self.mark("ready")
+        TIME_TO_READY.set(self.time_to_ready)
+
+    def mark_stopping(self):
+        """Report not ready from now on so the load balancer drains this instance"""
+        self.stopping = True
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None and not self.stopping
+
+    @property
+    def time_to_ready(self) -> Optional[float]:
+        return round(self.ready_at - self.started_at, 3) if self.ready_at is not None else None
+
+    def snapshot(self) -> dict:
+        return {
+            "warmedUp": self.ready_at is not None,
+            "stopping": self.stopping,
+            "timeToReadySeconds": self.time_to_ready,
+            "phases": dict(self.phases),
+            "error": self.error,
+        }
+
+async def prime_reference_cache(pool):
+    """Load the doctype, document config and datapoint lists into the reference cache"""
+    await asyncio.gather(
+        reference_cache.get_doctypes(pool),
+        reference_cache.get_document_configs(pool),
+        reference_cache.get_datapoints(pool),
+    )
+
+async def check_database(pool, timeout: float) -> Optional[str]:
+    """Round-trip to the database; returns an error description, or None when reachable"""
+    if pool is None:
+        return "Database pool not initialized"
+    try:
+        await asyncio.wait_for(pool.fetchval("SELECT 1"), timeout=timeout)
+        return None
+    except asyncio.TimeoutError:
+        return f"Database did not answer within {timeout}s"
+    except Exception as e:
+        return f"Database error: {str(e)}"
+
+readiness = ReadinessState()
@@ -0,0 +1,389 @@
+import asyncio
+import json
+import logging
+import pickle
+import tempfile
+import time
+from typing import IO, AsyncIterable, AsyncIterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+
+from config.settings import settings
+from models.workflow import WorkflowImportRecord
+from services.prompt_composer import compose_prompt
+from services.workflow_repository import WorkflowRepository, build_workflow_list_query, normalize_workflow_row
+from services.workflow_validator import validate_steps
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = """
+    id,
+    "workflowName",
+    description,
+    category,
+    doc_type,
+    other_doc,
+    version,
+    "flowType",
+    runtype,
+    data_point,
+    workflow
+"""
+
+# Rows fetched per round trip by the export cursor
+EXPORT_PREFETCH = 1000
+
+DEFAULT_IMPORT_BATCH_SIZE = 1000
+
+# Only the first errors are returned; the total is always counted
+MAX_REPORTED_ERRORS = 100
+
+# Validated batches wait in memory up to this size, then in a temporary file,
+# until the whole upload has been read
+SPOOL_MEMORY_BYTES = 64 * 1024 * 1024
+
+STAGING_TABLE = "workflow_import_staging"
+
+STAGING_COLUMNS = (
+    "line",
+    "id",
+    "workflowName",
+    "description",
+    "category",
+    "doc_type",
+    "other_doc",
+    "version",
+    "flowType",
+    "runtype",
+    "workflow",
+    "prompt",
+    "data_point",
+)
+
+CREATE_STAGING_TABLE = f"""
+    CREATE TEMP TABLE {STAGING_TABLE} (
+        line integer NOT NULL,
+        id integer,
+        "workflowName" text,
+        description text,
+        category text,
+        doc_type text,
+        other_doc text[],
+        version integer,
+        "flowType" text,
+        runtype text,
+        workflow jsonb,
+        prompt text,
+        data_point text
+    ) ON COMMIT DROP
+"""
+
+# Explicit ids are written as-is; the serial must then be moved past them. It
+# is only ever moved forward: after deletes of the highest ids, or when a
+# concurrent insert already took a higher value, MAX(id) is behind it
+SYNC_ID_SEQUENCE = """
+    SELECT setval(target.sequence, target.max_id)
+    FROM (
+        SELECT
+            pg_get_serial_sequence('common.mortgage_workflow', 'id')::regclass AS sequence,
+            (SELECT MAX(id) FROM common.mortgage_workflow) AS max_id
+    ) target
+    WHERE target.max_id > COALESCE(pg_sequence_last_value(target.sequence), 0)
+"""
+
+# The per-row change notifications of sql/006 are skipped for the rest of the
+# transaction; the import sends one notification for all its rows instead
+SUPPRESS_CHANGE_NOTIFY = "SELECT set_config('workflow_changes.suppress', 'on', true)"
+
+NOTIFY_IMPORT = "SELECT pg_notify($1, $2)"
+
+# Rows with an id: insert or overwrite, keeping the last line for duplicate ids
+UPSERT_FROM_STAGING = f"""
+    WITH merged AS (
+        INSERT INTO common.mortgage_workflow
+        (
+            id, "workflowName", description, category, doc_type, other_doc, version,
+            "flowType", runtype, workflow, prompt, data_point, updated_at
+        )
+        SELECT DISTINCT ON (id)
+            id, "workflowName", description, category, doc_type, other_doc, COALESCE(version, 1),
+            "flowType", runtype, workflow, prompt, data_point, CURRENT_TIMESTAMP
+        FROM {STAGING_TABLE}
+        WHERE id IS NOT NULL
+        ORDER BY id, line DESC
+        ON CONFLICT (id) DO UPDATE
+        SET
+            "workflowName" = EXCLUDED."workflowName",
+            description = EXCLUDED.description,
+            category = EXCLUDED.category,
+            doc_type = EXCLUDED.doc_type,
+            other_doc = EXCLUDED.other_doc,
+            version = EXCLUDED.version,
+            "flowType" = EXCLUDED."flowType",
+            runtype = EXCLUDED.runtype,
+            workflow = EXCLUDED.workflow,
+            prompt = EXCLUDED.prompt,
+            data_point = EXCLUDED.data_point,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+    )
+    SELECT
+        COUNT(*) FILTER (WHERE inserted) AS inserted,
+        COUNT(*) FILTER (WHERE NOT inserted) AS updated
+    FROM merged
+"""
+
+# Rows without an id get a new one from the serial
+INSERT_FROM_STAGING = f"""
+    INSERT INTO common.mortgage_workflow
+    (
+        "workflowName", description, category, doc_type, other_doc, version,
+        "flowType", runtype, workflow, prompt, data_point, updated_at
+    )
+    SELECT
+        "workflowName", description, category, doc_type, other_doc, COALESCE(version, 1),
+        "flowType", runtype, workflow, prompt, data_point, CURRENT_TIMESTAMP
+    FROM {STAGING_TABLE}
+    WHERE id IS NULL
+    ORDER BY line
+"""
+
+class BulkImportError(Exception):
+    """Raised when an import is rolled back because of invalid lines"""
+
+    def __init__(self, message: str, errors: List[dict], invalid: int):
+        super().__init__(message)
+        self.errors = errors
+        self.invalid = invalid
+
+def export_line(row) -> str:
+    """Serialize one mortgage_workflow row as an NDJSON line that import accepts"""
+    record = normalize_workflow_row(row)
+    steps = record.get("workflow")
+    # jsonb arrives as text unless a codec is registered on the connection
+    if isinstance(steps, str):
+        steps = json.loads(steps)
+    record["workflow"] = steps or []
+    return json.dumps(record) + "\n"
+
+async def iter_export(
+    pool,
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    flow_type: Optional[str] = None,
+    runtype: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Yield every matching workflow as an NDJSON line, ordered by id.
+
+    Rows come from a server-side cursor, so memory stays flat however many
+    workflows are exported.
+    """
+    query, params = build_workflow_list_query(
+        category=category,
+        doc_type=doc_type,
+        flow_type=flow_type,
+        runtype=runtype,
+        columns=EXPORT_COLUMNS
+    )
+    async for row in WorkflowRepository(pool).iter_list(query, params, EXPORT_PREFETCH):
+        yield export_line(row)
+
+async def iter_ndjson_lines(chunks: AsyncIterable[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Split a byte stream into (line number, line) pairs, skipping blank lines.
+
+    Only the newly received chunk is searched for newlines; the pieces of an
+    unfinished line are joined once it ends, so a long line stays linear.
+    """
+    pending: List[bytes] = []
+    line_number = 0
+    async for chunk in chunks:
+        *lines, rest = chunk.split(b"\n")
+        if lines:
+            if pending:
+                pending.append(lines[0])
+                lines[0] = b"".join(pending)
+                pending = []
+            for line in lines:
+                line_number += 1
+                if line.strip():
+                    yield line_number, line
+        if rest:
+            pending.append(rest)
+    last = b"".join(pending)
+    if last.strip():
+        yield line_number + 1, last
+
+def prepare_batch(
+    lines: List[Tuple[int, bytes]],
+    keep_ids: bool
+) -> Tuple[List[tuple], List[dict]]:
+    """
+    Validate a batch of NDJSON lines and turn them into staging records.
+
+    Each line is validated against WorkflowImportRecord (the
+    SaveWorkflowRequest fields plus the optional WorkflowDetail id/version),
+    its steps are checked like a save's, and its prompt is composed from them.
+
+    Returns:
+        Tuple of (records for copy_records_to_table, errors)
+    """
+    records = []
+    errors = []
+    for line_number, line in lines:
+        try:
+            record = WorkflowImportRecord.model_validate_json(line)
+        except ValidationError as e:
+            errors.append({
+                "line": line_number,
+                "error": "; ".join(
+                    f"{'.'.join(str(part) for part in error['loc']) or 'line'}: {error['msg']}"
+                    for error in e.errors()
+                ),
+            })
+            continue
+        if settings.validate_workflows_on_save:
+            result = validate_steps(record.workflow)
+            if not result.valid:
+                errors.append({"line": line_number, "error": result.summary()})
+                continue
+
+        records.append((
+            line_number,
+            record.id if keep_ids else None,
+            record.workflowName,
+            record.description,
+            record.category,
+            record.doc_type,
+            record.other_doc,
+            record.version,
+            record.flowType,
+            record.runtype,
+            json.dumps(record.workflow),
+            compose_prompt(record.workflow),
+            record.data_point,
+        ))
+    return records, errors
+
+def spool_batch(lines: List[Tuple[int, bytes]], keep_ids: bool, spool: Optional[IO[bytes]]) -> Tuple[int, List[dict]]:
+    """prepare_batch, appending the records to the spool (None only validates); returns (records, errors)"""
+    records, errors = prepare_batch(lines, keep_ids)
+    if records and spool is not None:
+        pickle.dump(records, spool, protocol=pickle.HIGHEST_PROTOCOL)
+    return len(records), errors
+
+def read_spooled_batch(spool: IO[bytes]) -> Optional[List[tuple]]:
+    """Next batch written by spool_batch, or None at the end"""
+    try:
+        return pickle.load(spool)
+    except EOFError:
+        return None
+
+async def import_workflows(
+    pool,
+    lines: AsyncIterable[Tuple[int, bytes]],
+    mode: str = "insert",
+    batch_size: int = DEFAULT_IMPORT_BATCH_SIZE,
+    skip_invalid: bool = False
+) -> dict:
+    """
+    Import workflows from NDJSON lines in a single transaction.
+
+    The whole upload is read first, without a database connection: lines are
+    validated and their prompts composed in batches (in a worker thread, to
+    keep the event loop responsive) and the records are spooled to memory or
+    a temporary file. Only then is a connection taken: each spooled batch is
+    copied into a temporary staging table with COPY, and the staging table is
+    merged into common.mortgage_workflow with one INSERT ... SELECT per kind
+    of row. A slow client therefore never holds a connection or an open
+    transaction.
+
+    The per-row change notifications are suppressed for the import; one
+    {"op": "import", "inserted", "updated"} notification is sent on the
+    change feed channel instead.
+
+    Args:
+        pool: asyncpg pool
+        lines: (line number, line) pairs, e.g. from iter_ndjson_lines
+        mode: "insert" always creates new workflows (ids in the file are
+            ignored); "upsert" overwrites workflows whose id exists and
+            inserts the others
+        batch_size: Lines validated and copied per batch
+        skip_invalid: Import the valid lines even when some are invalid;
+            otherwise any invalid line rolls the whole import back
+
+    Returns:
+        Summary dict (received, inserted, updated, invalid, errors, durationMs)
+
+    Raises:
+        BulkImportError: When invalid lines were found and skip_invalid is False
+    """
+    if mode not in ("insert", "upsert"):
+        raise ValueError(f"Unknown import mode '{mode}'")
+
+    started = time.perf_counter()
+    keep_ids = mode == "upsert"
+
+    received = 0
+    staged = 0
+    invalid = 0
+    errors: List[dict] = []
+    inserted = updated = 0
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES) as spool:
+        async def flush(batch):
+            nonlocal staged, invalid
+            # Once the import is bound to fail, the remaining lines are only validated
+            target = spool if skip_invalid or not invalid else None
+            count, batch_errors = await asyncio.to_thread(spool_batch, batch, keep_ids, target)
+            invalid += len(batch_errors)
+            errors.extend(batch_errors[:MAX_REPORTED_ERRORS - len(errors)])
+            staged += count if target is not None else 0
+
+        batch = []
+        async for line in lines:
+            received += 1
+            batch.append(line)
+            if len(batch) >= batch_size:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+
+        if invalid and not skip_invalid:
+            raise BulkImportError(f"{invalid} of {received} lines are invalid; nothing was imported", errors, invalid)
+
+        if staged:
+            spool.seek(0)
+            async with pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.execute(SUPPRESS_CHANGE_NOTIFY)
+                    await connection.execute(CREATE_STAGING_TABLE)
+                    while (records := await asyncio.to_thread(read_spooled_batch, spool)) is not None:
+                        await connection.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+
+                    if keep_ids:
+                        counts = await connection.fetchrow(UPSERT_FROM_STAGING)
+                        inserted, updated = counts["inserted"], counts["updated"]
+                        await connection.execute(SYNC_ID_SEQUENCE)
+                    result = await connection.execute(INSERT_FROM_STAGING)
+                    # Command tag is "INSERT 0 <rows>"
+                    inserted += int(result.split()[-1])
+                    await connection.execute(NOTIFY_IMPORT, settings.workflow_changes_channel, json.dumps({
+                        "op": "import", "inserted": inserted, "updated": updated
+                    }))
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(
+        f"Imported workflows: received={received}, inserted={inserted}, updated={updated}, "
+        f"invalid={invalid}, mode={mode}, duration={duration_ms}ms"
+    )
+    return {
+        "received": received,
+        "inserted": inserted,
+        "updated": updated,
+        "invalid": invalid,
+        "errors": errors,
+        "durationMs": duration_ms,
+    }
@@ -0,0 +1,265 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
+
+from config.settings import settings
+from utils.profiling import name_statements
+
+logger = logging.getLogger(__name__)
+
+GRAPH_COLUMNS = 'id, "workflowName", "flowType", version, "connectedPrompts", "parentOrchestrator"'
+
+GRAPH_QUERY = f"""
+    SELECT {GRAPH_COLUMNS}
+    FROM common.mortgage_workflow
+"""
+
+GRAPH_ROWS_QUERY = f"""
+    SELECT {GRAPH_COLUMNS}
+    FROM common.mortgage_workflow
+    WHERE id = ANY($1::int[])
+"""
+name_statements({"workflow_graph": GRAPH_QUERY, "workflow_graph_rows": GRAPH_ROWS_QUERY})
+
+def parse_links(values) -> List[int]:
+    """Workflow ids from a connectedPrompts/parentOrchestrator array (char(n) elements, space padded)"""
+    ids = []
+    for value in values or ():
+        text = str(value).strip()
+        if text.isdigit():
+            ids.append(int(text))
+        elif text:
+            logger.debug(f"Ignoring non-numeric workflow link '{text}'")
+    return ids
+
+def strongly_connected_components(nodes: Iterable[int], children: Dict[int, Set[int]]) -> List[List[int]]:
+    """
+    Tarjan's algorithm, iterative so deep trees do not hit the recursion limit.
+
+    Components come out in reverse topological order: a component is
+    emitted only after every component reachable from it. Successors are
+    visited in descending id order, so the reversed output lists siblings
+    in ascending id order.
+    """
+    index_of: Dict[int, int] = {}
+    lowlink: Dict[int, int] = {}
+    on_stack: Set[int] = set()
+    stack: List[int] = []
+    components: List[List[int]] = []
+    counter = 0
+
+    for start in nodes:
+        if start in index_of:
+            continue
+        work = [(start, iter(sorted(children.get(start, ()), reverse=True)))]
+        index_of[start] = lowlink[start] = counter
+        counter += 1
+        stack.append(start)
+        on_stack.add(start)
+        while work:
+            node, successors = work[-1]
+            advanced = False
+            for successor in successors:
+                if successor not in index_of:
+                    index_of[successor] = lowlink[successor] = counter
+                    counter += 1
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(sorted(children.get(successor, ()), reverse=True))))
+                    advanced = True
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index_of[successor])
+            if advanced:
+                continue
+            work.pop()
+            if work:
+                parent = work[-1][0]
+                lowlink[parent] = min(lowlink[parent], lowlink[node])
+            if lowlink[node] == index_of[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack.discard(member)
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(sorted(component))
+    return components
+
+class WorkflowGraph:
+    """
+    In-memory index of the orchestrator -> sub-workflow links.
+
+    An edge parent -> child exists when the parent lists the child in
+    connectedPrompts or the child lists the parent in parentOrchestrator.
+    The whole index is built from one narrow query on first use and after
+    a full invalidation (NOTIFY, bulk import, TTL); writes through the API
+    only mark their workflow stale, and those rows are re-read with one
+    query before the next tree is resolved.
+    """
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.nodes: Dict[int, dict] = {}
+        # Links as declared by each row, kept so a row refresh can undo them
+        self._declared: Dict[int, tuple] = {}
+        # How many rows declare each (parent, child) link; both ends may declare it
+        self._link_refs: Dict[tuple, int] = {}
+        self.children: Dict[int, Set[int]] = {}
+        self.parents: Dict[int, Set[int]] = {}
+        self._loaded_at: Optional[float] = None
+        self._stale: Set[int] = set()
+        # Bumped on every full invalidation so a load that raced one is not trusted
+        self._generation = 0
+        self._lock = asyncio.Lock()
+        self.full_loads = 0
+        self.refreshed_rows = 0
+
+    @staticmethod
+    def _declared_links(workflow_id: int, declared: tuple):
+        connected, parent_orchestrators = declared
+        for child in connected:
+            yield workflow_id, child
+        for parent in parent_orchestrators:
+            yield parent, workflow_id
+
+    def _add_row(self, row):
+        workflow_id = row["id"]
+        self.nodes[workflow_id] = {
+            "id": workflow_id,
+            "workflowName": row["workflowName"],
+            "flowType": row["flowType"],
+            "version": row["version"],
+        }
+        declared = (tuple(parse_links(row["connectedPrompts"])), tuple(parse_links(row["parentOrchestrator"])))
+        self._declared[workflow_id] = declared
+        for link in self._declared_links(workflow_id, declared):
+            self._link_refs[link] = self._link_refs.get(link, 0) + 1
+            parent, child = link
+            self.children.setdefault(parent, set()).add(child)
+            self.parents.setdefault(child, set()).add(parent)
+
+    def _remove_row(self, workflow_id: int):
+        self.nodes.pop(workflow_id, None)
+        for link in self._declared_links(workflow_id, self._declared.pop(workflow_id, ((), ()))):
+            self._link_refs[link] -= 1
+            if not self._link_refs[link]:
+                del self._link_refs[link]
+                parent, child = link
+                self.children[parent].discard(child)
+                self.parents[child].discard(parent)
+
+    def declared_links(self, workflow_id: Optional[int]) -> tuple:
+        """(connectedPrompts, parentOrchestrator) ids as stored on the workflow's own row"""
+        return self._declared.get(workflow_id, ((), ()))
+
+    def link_references(self, link: tuple) -> int:
+        """How many rows declare the (parent, child) link (0, 1 or 2)"""
+        return self._link_refs.get(link, 0)
+
+    def _build(self, rows):
+        self.nodes, self._declared, self._link_refs, self.children, self.parents = {}, {}, {}, {}, {}
+        for row in rows:
+            self._add_row(row)
+
+    def invalidate(self, *workflow_ids: int):
+        """Mark workflows as changed; with no ids the whole index is rebuilt on next use"""
+        if workflow_ids:
+            self._stale.update(workflow_ids)
+        else:
+            self._generation += 1
+            self._loaded_at = None
+
+    def handle_notification(self, payload: str):
+        """NOTIFY callback (reference data channel); payload is the changed table"""
+        table = (payload or "").strip().split(".")[-1]
+        if not table or table == "mortgage_workflow":
+            self.invalidate()
+
+    async def ensure_fresh(self, pool):
+        """Rebuild or refresh the index as needed before reading it"""
+        async with self._lock:
+            expired = self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl_seconds
+            if expired:
+                self._stale.clear()
+                generation = self._generation
+                rows = await pool.fetch(GRAPH_QUERY)
+                self._build(rows)
+                self._loaded_at = time.monotonic() if generation == self._generation else None
+                self.full_loads += 1
+                logger.info(f"Workflow graph built: {len(self.nodes)} workflows, {len(self._link_refs)} links")
+            elif self._stale:
+                stale, self._stale = list(self._stale), set()
+                rows = await pool.fetch(GRAPH_ROWS_QUERY, stale)
+                for workflow_id in stale:
+                    self._remove_row(workflow_id)
+                for row in rows:
+                    self._add_row(row)
+                self.refreshed_rows += len(stale)
+                logger.debug(f"Workflow graph refreshed {len(stale)} workflows")
+
+    def tree(self, root_id: int) -> Optional[dict]:
+        """
+        The transitive sub-workflow tree below root_id.
+
+        Returns None when the root does not exist. Nodes are returned in
+        topological order (orchestrators before their sub-workflows, members
+        of a cycle next to each other); links to missing workflows are
+        listed separately.
+        """
+        if root_id not in self.nodes:
+            return None
+
+        reachable = []
+        depth = {root_id: 0}
+        queue = deque([root_id])
+        while queue:
+            node = queue.popleft()
+            reachable.append(node)
+            for child in sorted(self.children.get(node, ())):
+                if child not in depth:
+                    depth[child] = depth[node] + 1
+                    queue.append(child)
+
+        components = strongly_connected_components(reachable, self.children)
+        order = [node for component in reversed(components) for node in component]
+        cycles = [
+            component for component in reversed(components)
+            if len(component) > 1 or component[0] in self.children.get(component[0], ())
+        ]
+
+        nodes = []
+        missing = []
+        for node in order:
+            if node in self.nodes:
+                nodes.append(dict(
+                    self.nodes[node],
+                    children=sorted(self.children.get(node, ())),
+                    depth=depth[node],
+                ))
+            else:
+                missing.append(node)
+
+        return {
+            "rootId": root_id,
+            "nodes": nodes,
+            "topologicalOrder": [node for node in order if node in self.nodes],
+            "cycles": cycles,
+            "missing": missing,
+            "maxDepth": max(depth.values()),
+        }
+
+    def stats(self) -> dict:
+        return {
+            "workflows": len(self.nodes),
+            "links": len(self._link_refs),
+            "loaded": self._loaded_at is not None,
+            "stale": len(self._stale),
+            "fullLoads": self.full_loads,
+            "refreshedRows": self.refreshed_rows,
+        }
+
+workflow_graph = WorkflowGraph(ttl_seconds=settings.workflow_graph_ttl_seconds)
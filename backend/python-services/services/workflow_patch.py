@@ -0,0 +1,130 @@
+import asyncio
+import json
+import logging
+import random
+from datetime import datetime
+from typing import List, Optional
+
+from pydantic import ValidationError
+
+from config.settings import settings
+from models.workflow import SaveWorkflowRequest
+from services.prompt_composer import compose_prompt
+from services.workflow_repository import WorkflowRepository, normalize_workflow_row
+from services.workflow_validator import validate_steps
+from utils.json_patch import ROOT, apply_patch, touched_members
+
+logger = logging.getLogger(__name__)
+
+# Top-level members of the patched document, i.e. the SaveWorkflowRequest fields
+DOCUMENT_FIELDS = tuple(SaveWorkflowRequest.model_fields)
+
+# Upper bound of the random pause before the n-th re-apply is n times this
+SAVE_RETRY_BACKOFF_SECONDS = 0.01
+
+class WorkflowVersionConflict(Exception):
+    """The workflow moved on from the version (or updated_at) the change was made against"""
+
+    def __init__(self, workflow_id: int, base_version: int, current_version: int, current_updated_at: Optional[datetime] = None):
+        super().__init__(
+            f"Workflow {workflow_id} is at version {current_version}, the change was made against version {base_version}"
+            if current_version != base_version else
+            f"Workflow {workflow_id} was saved by someone else since it was read (version {current_version})"
+        )
+        self.current_version = current_version
+        self.current_updated_at = current_updated_at
+
+class InvalidPatchedWorkflow(Exception):
+    """The patch applied, but the result is not a valid workflow"""
+
+def patch_document(row) -> dict:
+    """The document a patch applies to: the SaveWorkflowRequest fields of a stored workflow"""
+    row_dict = normalize_workflow_row(row)
+    steps = row_dict.get("workflow")
+    # jsonb arrives as text unless a codec is registered on the connection
+    if isinstance(steps, str):
+        steps = json.loads(steps)
+    row_dict["workflow"] = steps or []
+    return {field: row_dict.get(field) for field in DOCUMENT_FIELDS}
+
+def patched_request(row, patch: List[dict]) -> SaveWorkflowRequest:
+    """Apply the patch to a stored workflow and validate the result as a save"""
+    document = apply_patch(patch_document(row), patch)
+    if not isinstance(document, dict):
+        raise InvalidPatchedWorkflow("The patched workflow must be an object")
+    unknown = sorted(set(document) - set(DOCUMENT_FIELDS))
+    if unknown:
+        raise InvalidPatchedWorkflow(f"Unknown workflow fields: {', '.join(unknown)}")
+    try:
+        request = SaveWorkflowRequest.model_validate(document)
+    except ValidationError as e:
+        problems = "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in e.errors())
+        raise InvalidPatchedWorkflow(f"Invalid patched workflow: {problems}") from e
+    if settings.validate_workflows_on_save:
+        result = validate_steps(request.workflow)
+        if not result.valid:
+            raise InvalidPatchedWorkflow(f"Invalid patched workflow: {result.summary()}")
+    return request
+
+async def patch_workflow(
+    pool,
+    workflow_id: int,
+    patch: List[dict],
+    base_version: int,
+    save_as_version: bool = False,
+    expected_updated_at: Optional[datetime] = None,
+    rebase: bool = True
+) -> Optional[dict]:
+    """
+    Apply an RFC 6902 JSON Patch to a stored workflow and save the result.
+
+    No lock is held while the patch is applied: the save is a compare-and-swap
+    on the version and updated_at that were read. When another save lands in
+    between at the same version, the patch is re-applied to the new state (up
+    to SAVE_CONFLICT_RETRIES times, with a short jittered backoff) unless rebase is off; its "test" ops guard
+    against edits that no longer fit. When the patch does not touch /workflow,
+    neither the steps nor the prompt are re-composed, re-serialized or rewritten.
+
+    Returns:
+        The saved row (id, workflowName, version, updated_at), or None when the workflow does not exist
+
+    Raises:
+        WorkflowVersionConflict: the workflow is no longer at base_version (or expected_updated_at)
+        JsonPatchError: the patch is malformed, does not apply or a test op failed
+        InvalidPatchedWorkflow: the patched document fails SaveWorkflowRequest validation
+    """
+    touched = touched_members(patch)
+    # A root replace/add/move rewrites every member, the steps included
+    steps_changed = save_as_version or "workflow" in touched or ROOT in touched
+    repository = WorkflowRepository(pool)
+    attempts = settings.save_conflict_retries + 1 if rebase else 1
+
+    for attempt in range(1, attempts + 1):
+        row = await repository.get_for_patch(workflow_id)
+        if row is None:
+            return None
+        if row["version"] != base_version or (expected_updated_at is not None and row["updated_at"] != expected_updated_at):
+            raise WorkflowVersionConflict(workflow_id, base_version, row["version"], row["updated_at"])
+
+        request = patched_request(row, patch)
+        guards = (row["version"], row["updated_at"])
+        if not steps_changed:
+            logger.debug(f"Patch of workflow {workflow_id} only changes settings")
+            saved = await repository.save_settings(workflow_id, request, *guards)
+        else:
+            composed_prompt = compose_prompt(request.workflow)
+            if save_as_version:
+                saved = await repository.save_version(workflow_id, request, composed_prompt, *guards)
+            else:
+                saved = await repository.save(workflow_id, request, composed_prompt, *guards)
+        if saved is not None:
+            return saved
+        logger.info(f"Workflow {workflow_id} changed while being patched (attempt {attempt}/{attempts})")
+        if attempt < attempts:
+            # Jittered backoff so patches racing on one workflow do not retry in lockstep
+            await asyncio.sleep(random.uniform(0, SAVE_RETRY_BACKOFF_SECONDS * attempt))
+
+    current = await repository.get_version(workflow_id)
+    if current is None:
+        return None
+    raise WorkflowVersionConflict(workflow_id, base_version, current["version"] or 1, current["updated_at"])
@@ -0,0 +1,616 @@
+import hashlib
+import json
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from utils.profiling import name_statements
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_LIST_COLUMNS = """
+    id,
+    "workflowName",
+    description,
+    category,
+    doc_type,
+    other_doc,
+    version,
+    "flowType",
+    data_point,
+    runtype
+"""
+
+WORKFLOW_DETAIL_COLUMNS = """
+    id, category, doc_type, prompt, is_informational, data_point, is_contextual,
+    output_structure, other_doc, output_category, note, is_image_analysis,
+    updated_at, isconsistent, iterations, model_name, "workflowName", description,
+    workflow, "flowType", version, "connectedPrompts", "parentOrchestrator", runtype
+"""
+
+# Every statement the repository runs, by name. asyncpg prepares each distinct
+# statement text once per connection and reuses the server-side prepared
+# statement afterwards, so keeping the text in one place (rather than inline
+# per handler) guarantees a single Parse per connection for each of them.
+# Saves take optional compare-and-swap guards (expected version and/or
+# updated_at; NULL skips a guard). The row is only written when it still
+# matches, and Postgres re-checks the guards against a row a concurrent save
+# just committed, so a lost update shows up as "no row returned" instead of
+# needing a lock held across the read-modify-write.
+STATEMENTS = {
+    "workflow_details": f"""
+        SELECT {WORKFLOW_DETAIL_COLUMNS}
+        FROM common.mortgage_workflow
+        WHERE id = $1
+    """,
+    "workflow_details_batch": f"""
+        SELECT {WORKFLOW_DETAIL_COLUMNS}
+        FROM common.mortgage_workflow
+        WHERE id = ANY($1::int[])
+    """,
+    "workflow_version": """
+        SELECT id, updated_at, version
+        FROM common.mortgage_workflow
+        WHERE id = $1
+    """,
+    "create_workflow": """
+        INSERT INTO common.mortgage_workflow
+        (
+            "workflowName",
+            category,
+            doc_type,
+            other_doc,
+            version,
+            "flowType",
+            updated_at
+        )
+        VALUES
+        (
+            $1, $2, $3, $4, $5, $6, CURRENT_TIMESTAMP
+        )
+        RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType"
+    """,
+    "update_workflow": """
+        UPDATE common.mortgage_workflow
+        SET
+            "workflowName" = $1,
+            description = $2,
+            category = $3,
+            doc_type = $4,
+            other_doc = $5,
+            version = $6,
+            "flowType" = $7,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = $8
+        RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType"
+    """,
+    "delete_workflow": """
+        DELETE FROM common.mortgage_workflow
+        WHERE id = $1
+        RETURNING id
+    """,
+    "save_workflow": """
+        UPDATE common.mortgage_workflow
+        SET
+            "workflowName" = $1,
+            description = $2,
+            category = $3,
+            doc_type = $4,
+            other_doc = $5,
+            "flowType" = $6,
+            runtype = $7,
+            workflow = $8,
+            prompt = $9,
+            data_point = $10,
+            steps_hash = $14,
+            settings_hash = $15,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = $11
+          AND ($12::bigint IS NULL OR COALESCE(version, 1) = $12)
+          AND ($13::timestamp IS NULL OR updated_at = $13)
+        RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType", runtype, updated_at
+    """,
+    # Settings-only save: the workflow and prompt columns are left untouched,
+    # so Postgres keeps their (TOASTed) values instead of rewriting them.
+    # $13 optionally requires the stored steps to still hash the same.
+    "save_workflow_settings": """
+        UPDATE common.mortgage_workflow
+        SET
+            "workflowName" = $1,
+            description = $2,
+            category = $3,
+            doc_type = $4,
+            other_doc = $5,
+            "flowType" = $6,
+            runtype = $7,
+            data_point = $8,
+            settings_hash = $12,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = $9
+          AND ($10::bigint IS NULL OR COALESCE(version, 1) = $10)
+          AND ($11::timestamp IS NULL OR updated_at = $11)
+          AND ($13::text IS NULL OR steps_hash = $13)
+        RETURNING id, "workflowName", version, updated_at
+    """,
+    # Change-aware save in one statement (hashes from sql/005), same parameters
+    # as save_workflow. Identical hashes write nothing and return the stored
+    # row as "unchanged"; an unchanged steps hash keeps the stored workflow and
+    # prompt values (Postgres then reuses their TOASTed data) as "settings";
+    # anything else is a "full" save. The CASEs read the row being updated, so
+    # a concurrent change of the steps is never overwritten with stale ones.
+    "save_workflow_changes": """
+        WITH previous AS (
+            SELECT id, "workflowName", description, category, doc_type, other_doc,
+                COALESCE(version, 1) AS version, "flowType", runtype, updated_at, steps_hash, settings_hash
+            FROM common.mortgage_workflow
+            WHERE id = $11
+              AND ($12::bigint IS NULL OR COALESCE(version, 1) = $12)
+              AND ($13::timestamp IS NULL OR updated_at = $13)
+        ), saved AS (
+            UPDATE common.mortgage_workflow
+            SET
+                "workflowName" = $1,
+                description = $2,
+                category = $3,
+                doc_type = $4,
+                other_doc = $5,
+                "flowType" = $6,
+                runtype = $7,
+                workflow = CASE WHEN steps_hash IS NOT DISTINCT FROM $14 THEN workflow ELSE $8::jsonb END,
+                prompt = CASE WHEN steps_hash IS NOT DISTINCT FROM $14 THEN prompt ELSE $9 END,
+                data_point = $10,
+                steps_hash = $14,
+                settings_hash = $15,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = $11
+              AND ($12::bigint IS NULL OR COALESCE(version, 1) = $12)
+              AND ($13::timestamp IS NULL OR updated_at = $13)
+              AND (steps_hash IS DISTINCT FROM $14 OR settings_hash IS DISTINCT FROM $15)
+            RETURNING id, "workflowName", description, category, doc_type, other_doc, version, "flowType", runtype, updated_at
+        )
+        SELECT saved.*,
+            CASE WHEN previous.steps_hash IS NOT DISTINCT FROM $14 THEN 'settings' ELSE 'full' END AS outcome
+        FROM saved
+        LEFT JOIN previous ON previous.id = saved.id
+        UNION ALL
+        SELECT id, "workflowName", description, category, doc_type, other_doc, version, "flowType", runtype, updated_at,
+            'unchanged' AS outcome
+        FROM previous
+        WHERE steps_hash = $14 AND settings_hash = $15
+          AND NOT EXISTS (SELECT 1 FROM saved)
+    """,
+    "workflow_for_patch": """
+        SELECT
+            "workflowName", description, category, doc_type, other_doc, "flowType",
+            runtype, workflow, data_point, COALESCE(version, 1) AS version, updated_at
+        FROM common.mortgage_workflow
+        WHERE id = $1
+    """,
+    # Archives the current steps as a version row and saves the new ones in
+    # one statement; the cost is one workflow, not the whole history.
+    "save_workflow_version": """
+        WITH current_workflow AS (
+            SELECT id, workflow, COALESCE(version, 1) AS version
+            FROM common.mortgage_workflow
+            WHERE id = $11
+              AND ($12::bigint IS NULL OR COALESCE(version, 1) = $12)
+              AND ($13::timestamp IS NULL OR updated_at = $13)
+            FOR UPDATE
+        ), archived AS (
+            INSERT INTO common.mortgage_workflow_version (workflow_id, version, workflow, step_count)
+            SELECT
+                id,
+                version,
+                workflow,
+                CASE WHEN jsonb_typeof(workflow) = 'array' THEN jsonb_array_length(workflow) END
+            FROM current_workflow
+            WHERE workflow IS NOT NULL
+            ON CONFLICT (workflow_id, version) DO UPDATE
+            SET workflow = EXCLUDED.workflow,
+                step_count = EXCLUDED.step_count,
+                created_at = CURRENT_TIMESTAMP
+        )
+        UPDATE common.mortgage_workflow mw
+        SET
+            "workflowName" = $1,
+            description = $2,
+            category = $3,
+            doc_type = $4,
+            other_doc = $5,
+            "flowType" = $6,
+            runtype = $7,
+            workflow = $8,
+            version = current_workflow.version + 1,
+            prompt = $9,
+            data_point = $10,
+            steps_hash = $14,
+            settings_hash = $15,
+            updated_at = CURRENT_TIMESTAMP
+        FROM current_workflow
+        WHERE mw.id = current_workflow.id
+        RETURNING mw.id, mw."workflowName", mw.version, mw.updated_at
+    """,
+    "list_workflow_versions": """
+        SELECT
+            COALESCE(mw.version, 1) AS current_version,
+            v.version,
+            v.created_at,
+            v.step_count,
+            pg_column_size(v.workflow) AS size_bytes
+        FROM common.mortgage_workflow mw
+        LEFT JOIN common.mortgage_workflow_version v ON v.workflow_id = mw.id
+        WHERE mw.id = $1
+        ORDER BY v.version DESC
+    """,
+    "get_workflow_version": """
+        SELECT version, created_at, workflow
+        FROM common.mortgage_workflow_version
+        WHERE workflow_id = $1 AND version = $2
+        UNION ALL
+        SELECT COALESCE(version, 1), updated_at, workflow
+        FROM common.mortgage_workflow
+        WHERE id = $1 AND COALESCE(version, 1) = $2
+        LIMIT 1
+    """,
+}
+name_statements(STATEMENTS)
+
+def build_workflow_list_query(
+    cursor: Optional[int] = None,
+    limit: Optional[int] = None,
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    flow_type: Optional[str] = None,
+    runtype: Optional[str] = None,
+    columns: str = WORKFLOW_LIST_COLUMNS
+) -> Tuple[str, list]:
+    """
+    Build the keyset-paginated workflow list query.
+
+    Args:
+        cursor: Only return workflows with an id greater than this value
+        limit: Maximum number of rows to return (None for no limit)
+        category, doc_type, flow_type, runtype: Optional equality filters
+        columns: Select list (defaults to the WorkflowDetail columns)
+
+    Returns:
+        Tuple of (query, params) ready for asyncpg
+    """
+    conditions = []
+    params = []
+
+    for column, value in (
+        ("id >", cursor),
+        ("category =", category),
+        ("doc_type =", doc_type),
+        ('"flowType" =', flow_type),
+        ("runtype =", runtype),
+    ):
+        if value is not None:
+            params.append(value)
+            conditions.append(f"{column} ${len(params)}")
+
+    query = f"SELECT {columns} FROM common.mortgage_workflow"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+
+    if limit is not None:
+        params.append(limit)
+        query += f" LIMIT ${len(params)}"
+
+    return query, params
+
+def escape_like(text: str) -> str:
+    """Escape LIKE wildcards so the text matches literally"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def build_workflow_search_query(
+    text: str,
+    limit: int,
+    offset: int = 0,
+    category: Optional[str] = None,
+    doc_type: Optional[str] = None,
+    flow_type: Optional[str] = None,
+    runtype: Optional[str] = None,
+    columns: str = WORKFLOW_LIST_COLUMNS
+) -> Tuple[str, list]:
+    """
+    Build the ranked workflow search query (needs sql/004_workflow_search.sql).
+
+    A workflow matches when its search_text (name, description, datapoint,
+    document type and step prompts) contains the text, or is word-similar to
+    it (pg_trgm `<%`, for typos); both use the trigram index. Matches in the
+    name rank first, then the document type, then description/datapoint, and
+    ties are broken by name similarity and id. Only the short columns are
+    scored, so ranking stays cheap when many workflows match.
+
+    Returns:
+        Tuple of (query, params) ready for asyncpg; rows carry a `score` column
+    """
+    needle = " ".join(text.lower().split())
+    params: list = [needle, f"%{escape_like(needle)}%"]
+    conditions = ["(search_text LIKE $2 OR $1 <% search_text)"]
+
+    for column, value in (
+        ("category =", category),
+        ("doc_type =", doc_type),
+        ('"flowType" =', flow_type),
+        ("runtype =", runtype),
+    ):
+        if value is not None:
+            params.append(value)
+            conditions.append(f"{column} ${len(params)}")
+
+    params.extend([limit, offset])
+    query = f"""
+        SELECT {columns},
+            (lower(coalesce("workflowName", data_point, '')) LIKE $2)::int * 4
+            + (lower(coalesce(doc_type, '')) LIKE $2)::int * 2
+            + (lower(coalesce(description, '') || ' ' || coalesce(data_point, '')) LIKE $2)::int
+            + word_similarity($1, lower(coalesce("workflowName", data_point, ''))) AS score
+        FROM common.mortgage_workflow
+        WHERE {" AND ".join(conditions)}
+        ORDER BY score DESC, id
+        LIMIT ${len(params) - 1} OFFSET ${len(params)}
+    """
+    return query, params
+
+def steps_json(steps: List[dict]) -> str:
+    """Canonical JSON of workflow steps (sorted keys, compact), as written to the jsonb column"""
+    return json.dumps(steps, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def settings_hash(request) -> str:
+    """Hash of every SaveWorkflowRequest field except the steps"""
+    return content_hash(json.dumps(
+        [request.workflowName, request.description, request.category, request.doc_type,
+         request.other_doc, request.flowType, request.runtype, request.data_point],
+        separators=(",", ":"), ensure_ascii=False
+    ))
+
+def normalize_workflow_row(row) -> dict:
+    """
+    Convert a mortgage_workflow list row into WorkflowDetail fields.
+
+    Handles other_doc stored as a comma-separated string (old format) and falls
+    back to data_point when workflowName is not present.
+    """
+    row_dict = dict(row)
+    # Handle other_doc - can be array (list) or string for backward compatibility
+    if row_dict.get('other_doc'):
+        if isinstance(row_dict['other_doc'], str):
+            # Old format: comma-separated string
+            other_docs_str = row_dict['other_doc']
+            row_dict['other_doc'] = [doc.strip() for doc in other_docs_str.split(',') if doc.strip()]
+        # else: already a list from database array type
+    else:
+        row_dict['other_doc'] = None
+
+    # Use data_point as workflowName if workflowName is not present
+    if not row_dict.get('workflowName') and row_dict.get('data_point'):
+        row_dict['workflowName'] = row_dict['data_point']
+
+    return row_dict
+
+class WorkflowRepository:
+    """
+    Data access for common.mortgage_workflow.
+
+    Writes are single statements that use RETURNING to detect a missing row,
+    so each one costs one round trip and one pool acquisition. Operations that
+    need several statements run on one acquired connection inside a
+    transaction.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def fetch_list(self, query: str, params: list):
+        """Run a query built by build_workflow_list_query"""
+        return await self.pool.fetch(query, *params)
+
+    async def iter_list(self, query: str, params: list, prefetch: int):
+        """
+        Yield rows of a list query from a server-side cursor.
+
+        Rows are fetched in batches of `prefetch` inside a single read-only
+        transaction, so memory stays flat regardless of the table size.
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.transaction(readonly=True):
+                async for row in connection.cursor(query, *params, prefetch=prefetch):
+                    yield row
+
+    async def search(self, query: str, params: list):
+        """Run a query built by build_workflow_search_query"""
+        return await self.pool.fetch(query, *params)
+
+    async def get_details(self, workflow_id: int):
+        """Full workflow row, or None when it does not exist"""
+        return await self.pool.fetchrow(STATEMENTS["workflow_details"], workflow_id)
+
+    async def get_details_many(self, workflow_ids: List[int]):
+        """Full rows for every existing id, in no particular order (one query)"""
+        return await self.pool.fetch(STATEMENTS["workflow_details_batch"], workflow_ids)
+
+    async def get_version(self, workflow_id: int):
+        """id/updated_at/version of a workflow, or None when it does not exist"""
+        return await self.pool.fetchrow(STATEMENTS["workflow_version"], workflow_id)
+
+    async def create(self, workflow):
+        """Insert a workflow from a CreateWorkflowRequest and return the new row"""
+        return await self.pool.fetchrow(
+            STATEMENTS["create_workflow"],
+            workflow.workflowName,
+            workflow.category,
+            workflow.doc_type,
+            workflow.other_doc,
+            workflow.version,
+            workflow.flowType
+        )
+
+    async def update_metadata(self, workflow_id: int, workflow):
+        """Update workflow settings from a CreateWorkflowRequest; None when not found"""
+        return await self.pool.fetchrow(
+            STATEMENTS["update_workflow"],
+            workflow.workflowName,
+            workflow.description,
+            workflow.category,
+            workflow.doc_type,
+            workflow.other_doc,
+            workflow.version,
+            workflow.flowType,
+            workflow_id
+        )
+
+    async def delete(self, workflow_id: int) -> bool:
+        """Delete a workflow; False when it did not exist"""
+        deleted_id = await self.pool.fetchval(STATEMENTS["delete_workflow"], workflow_id)
+        return deleted_id is not None
+
+    async def save(
+        self,
+        workflow_id: int,
+        request,
+        composed_prompt: str,
+        expected_version: Optional[int] = None,
+        expected_updated_at: Optional[datetime] = None,
+        serialized_steps: Optional[str] = None,
+        only_changes: bool = False
+    ):
+        """
+        Overwrite steps and settings from a SaveWorkflowRequest, storing their
+        content hashes; None when not found or a guard does not match.
+
+        With only_changes, what the stored hashes show as unchanged is not
+        written and the row carries an outcome column (unchanged, settings
+        or full). Pass serialized_steps when steps_json(request.workflow)
+        was already built.
+        """
+        serialized_steps = serialized_steps or steps_json(request.workflow)
+        return await self.pool.fetchrow(
+            STATEMENTS["save_workflow_changes" if only_changes else "save_workflow"],
+            request.workflowName,
+            request.description,
+            request.category,
+            request.doc_type,
+            request.other_doc,
+            request.flowType,
+            request.runtype,
+            # Workflow list as a JSON string for the JSONB column
+            serialized_steps,
+            composed_prompt,
+            request.data_point,
+            workflow_id,
+            expected_version,
+            expected_updated_at,
+            content_hash(serialized_steps),
+            settings_hash(request)
+        )
+
+    async def save_settings(
+        self,
+        workflow_id: int,
+        request,
+        expected_version: Optional[int] = None,
+        expected_updated_at: Optional[datetime] = None,
+        expected_steps_hash: Optional[str] = None
+    ):
+        """
+        Save everything but the steps and prompt from a SaveWorkflowRequest.
+
+        Returns None when not found or a guard does not match, including
+        expected_steps_hash: the stored steps no longer hash to that value.
+        """
+        return await self.pool.fetchrow(
+            STATEMENTS["save_workflow_settings"],
+            request.workflowName,
+            request.description,
+            request.category,
+            request.doc_type,
+            request.other_doc,
+            request.flowType,
+            request.runtype,
+            request.data_point,
+            workflow_id,
+            expected_version,
+            expected_updated_at,
+            settings_hash(request),
+            expected_steps_hash
+        )
+
+    async def get_for_patch(self, workflow_id: int):
+        """Settings, steps, version and updated_at of a workflow"""
+        return await self.pool.fetchrow(STATEMENTS["workflow_for_patch"], workflow_id)
+
+    async def save_version(self, workflow_id: int, request, composed_prompt: str, expected_version: Optional[int] = None, expected_updated_at: Optional[datetime] = None):
+        """
+        Archive the current steps into mortgage_workflow_version and save the new ones.
+
+        A single statement appends one version row and bumps the version
+        column, so the cost does not grow with the history. Returns None when
+        the workflow does not exist or a guard does not match.
+        """
+        serialized_steps = steps_json(request.workflow)
+        return await self.pool.fetchrow(
+            STATEMENTS["save_workflow_version"],
+            request.workflowName,
+            request.description,
+            request.category,
+            request.doc_type,
+            request.other_doc,
+            request.flowType,
+            request.runtype,
+            serialized_steps,
+            composed_prompt,
+            request.data_point,
+            workflow_id,
+            expected_version,
+            expected_updated_at,
+            content_hash(serialized_steps),
+            settings_hash(request)
+        )
+
+    async def list_versions(self, workflow_id: int):
+        """
+        Version metadata (no steps) newest first, or None when the workflow does not exist.
+
+        Returns a dict with currentVersion and a list of archived versions.
+        """
+        rows = await self.pool.fetch(STATEMENTS["list_workflow_versions"], workflow_id)
+        if not rows:
+            return None
+
+        return {
+            "currentVersion": rows[0]["current_version"],
+            "versions": [
+                {
+                    "version": row["version"],
+                    "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
+                    "stepCount": row["step_count"],
+                    "sizeBytes": row["size_bytes"],
+                }
+                for row in rows
+                if row["version"] is not None
+            ],
+        }
+
+    async def get_version_steps(self, workflow_id: int, version: int) -> Optional[dict]:
+        """Steps of one archived (or the current) version, or None when not found"""
+        row = await self.pool.fetchrow(STATEMENTS["get_workflow_version"], workflow_id, version)
+        if not row:
+            return None
+
+        steps = row["workflow"]
+        # jsonb arrives as text unless a codec is registered on the connection
+        if isinstance(steps, str):
+            steps = json.loads(steps)
+
+        return {
+            "version": row["version"],
+            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
+            "workflow": steps,
+        }
@@ -0,0 +1,49 @@
+import logging
+from datetime import datetime
+from typing import Optional, Tuple
+
+from services.prompt_composer import compose_prompt
+from services.workflow_repository import WorkflowRepository, steps_json
+
+logger = logging.getLogger(__name__)
+
+# What a save wrote: nothing, the settings columns only, or steps, prompt and settings
+SAVE_UNCHANGED = "unchanged"
+SAVE_SETTINGS = "settings"
+SAVE_FULL = "full"
+
+async def save_workflow_changes(
+    pool,
+    workflow_id: int,
+    request,
+    expected_version: Optional[int] = None,
+    expected_updated_at: Optional[datetime] = None
+) -> Tuple[Optional[dict], Optional[str]]:
+    """
+    Save a workflow, writing only what changed, in one statement.
+
+    The payload is hashed (canonical steps JSON and settings) and the guarded
+    UPDATE compares the hashes with those stored by the previous save. An
+    identical payload writes nothing and returns the stored row, so
+    updated_at is not bumped. When only settings differ, the workflow and
+    prompt columns keep their stored values. The prompt is composed up front,
+    since the statement decides whether it is written.
+
+    Returns:
+        (row, outcome): the saved (or current) row with version and
+        updated_at, and SAVE_UNCHANGED, SAVE_SETTINGS or SAVE_FULL. row is
+        None when the workflow does not exist or no longer matches
+        expected_version/expected_updated_at.
+    """
+    serialized_steps = steps_json(request.workflow)
+    composed_prompt = compose_prompt(request.workflow)
+    row = await WorkflowRepository(pool).save(
+        workflow_id, request, composed_prompt, expected_version, expected_updated_at,
+        serialized_steps=serialized_steps, only_changes=True
+    )
+    if row is None:
+        return None, None
+    outcome = row["outcome"]
+    if outcome == SAVE_UNCHANGED:
+        logger.info(f"Workflow {workflow_id} unchanged, nothing written")
+    return row, outcome
@@ -0,0 +1,409 @@
+import logging
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set, Union
+
+from pydantic import StrictFloat, StrictInt, StrictStr, TypeAdapter, ValidationError
+from typing_extensions import NotRequired, TypedDict
+
+from config.settings import settings
+from services.workflow_graph import WorkflowGraph, strongly_connected_components
+from utils.profiling import profiled
+
+logger = logging.getLogger(__name__)
+
+# Node types offered by the workflow builder
+NODE_TYPES = frozenset({
+    "text extraction",
+    "image extraction",
+    "analysis",
+    "document eligibility check",
+    "insights executor",
+    "output generator",
+})
+
+# Only the first issues are returned; the totals are always counted
+MAX_REPORTED_ISSUES = 100
+
+# "Step 3", "step #3", "Steps 2 and 4" in a (lowercased) prerequisite
+_STEP_REFERENCE = re.compile(r"steps?\s*#?\s*(\d+(?:\s*(?:,|and|&|or)\s*#?\s*\d+)*)")
+_NUMBER = re.compile(r"\d+")
+
+# Scalars as clients send them: 3, 3.0 and "3" ids, numeric prompts (booleans are not scalars here)
+Scalar = Union[StrictInt, StrictFloat, StrictStr]
+
+class WorkflowStep(TypedDict):
+    """Fields the API composes prompts from; other fields pass through unchecked"""
+    id: Scalar
+    node: StrictStr
+    prerequisite: NotRequired[Optional[Scalar]]
+    prompt: NotRequired[Optional[Scalar]]
+    note: NotRequired[Optional[Scalar]]
+
+# Built once: pydantic-core compiles the schema into its validator at import time.
+# It only runs to explain steps that fail the plain type check below.
+STEPS_SCHEMA = TypeAdapter(List[WorkflowStep])
+
+_ID_TYPES = frozenset({int, float, str})
+_TEXT_TYPES = frozenset({int, float, str, type(None)})
+
+def step_key(value):
+    """
+    Step ids as compared with each other and with "Step 3" in a prerequisite:
+    numeric ids (3, 3.0 and "3") as int, other text ids stripped, anything else None
+    """
+    if type(value) is int:
+        return value
+    if type(value) is float:
+        return int(value) if value.is_integer() else value
+    if type(value) is str:
+        value = value.strip()
+        if value.isdigit():
+            return int(value)
+        return value or None
+    return None
+
+class PrerequisiteParser:
+    """
+    Step ids named in prerequisites, memoized by prerequisite text.
+
+    Parsing is the costliest part of validating a large workflow, and saves
+    of the same workflow repeat almost all of their prerequisites, so the
+    ids are cached; when max_entries is reached the cache starts over.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._references: Dict[str, tuple] = {}
+
+    def cached(self, text: str) -> Optional[tuple]:
+        """The ids parsed earlier from this text, if any"""
+        return self._references.get(text)
+
+    def parse(self, text: str) -> tuple:
+        references = self._references.get(text)
+        if references is None:
+            references = ()
+            lowered = text.lower()
+            if "step" in lowered:
+                numbers = []
+                for listed in _STEP_REFERENCE.findall(lowered):
+                    if listed.isdigit():
+                        numbers.append(int(listed))
+                    else:
+                        numbers.extend(map(int, _NUMBER.findall(listed)))
+                references = tuple(numbers)
+            if len(self._references) >= self.max_entries:
+                self._references.clear()
+            self._references[text] = references
+        return references
+
+    def clear(self):
+        self._references.clear()
+
+prerequisite_parser = PrerequisiteParser(max_entries=settings.workflow_validation_cache_size)
+
+def prerequisite_references(text: str) -> tuple:
+    """Step ids named in a prerequisite ("Step 2 must be complete", "steps 3 and 4")"""
+    return prerequisite_parser.parse(text)
+
+class WorkflowValidationResult:
+    """Errors (which block a save) and warnings found in one workflow"""
+
+    def __init__(self):
+        self.errors: List[dict] = []
+        self.warnings: List[dict] = []
+        self.error_count = 0
+        self.warning_count = 0
+
+    def error(self, code: str, message: str, step: Optional[int] = None, step_id=None):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ISSUES:
+            self.errors.append(_issue(code, message, step, step_id))
+
+    def warning(self, code: str, message: str, step: Optional[int] = None, step_id=None):
+        self.warning_count += 1
+        if len(self.warnings) < MAX_REPORTED_ISSUES:
+            self.warnings.append(_issue(code, message, step, step_id))
+
+    @property
+    def valid(self) -> bool:
+        return self.error_count == 0
+
+    def summary(self, limit: int = 5) -> str:
+        """The first error messages on one line"""
+        messages = [issue["message"] for issue in self.errors[:limit]]
+        if self.error_count > len(messages):
+            messages.append(f"and {self.error_count - len(messages)} more")
+        return "; ".join(messages)
+
+    def to_dict(self) -> dict:
+        return {
+            "valid": self.valid,
+            "errorCount": self.error_count,
+            "warningCount": self.warning_count,
+            "errors": sorted(self.errors, key=_issue_order),
+            "warnings": sorted(self.warnings, key=_issue_order),
+        }
+
+def _issue_order(issue: dict) -> int:
+    """Issues of the whole workflow first, then by step"""
+    return issue.get("step") or 0
+
+def _issue(code: str, message: str, step: Optional[int], step_id) -> dict:
+    issue = {"code": code, "message": message}
+    if step is not None:
+        issue["step"] = step
+    if step_id is not None:
+        issue["stepId"] = step_id
+    return issue
+
+def _well_typed(steps: List) -> bool:
+    """What STEPS_SCHEMA accepts, checked with plain type lookups instead of a per-step model"""
+    return all(
+        type(step) is dict
+        and type(step.get("id")) in _ID_TYPES
+        and type(step.get("node")) is str
+        and type(step.get("prerequisite")) in _TEXT_TYPES
+        and type(step.get("prompt")) in _TEXT_TYPES
+        and type(step.get("note")) in _TEXT_TYPES
+        for step in steps
+    )
+
+def _schema_errors(steps: List, result: WorkflowValidationResult) -> bool:
+    """Check the step types; False when some step does not match (reported through STEPS_SCHEMA)"""
+    if _well_typed(steps):
+        return True
+    try:
+        STEPS_SCHEMA.validate_python(steps)
+        return True
+    except ValidationError as e:
+        reported = set()
+        for error in e.errors(include_url=False):
+            location = error["loc"]
+            position = location[0] + 1 if location and isinstance(location[0], int) else None
+            # Union members add their own location parts; report a field once
+            field = str(location[1]) if len(location) > 1 else ""
+            if (position, field) in reported:
+                continue
+            reported.add((position, field))
+            if field == "node" and error["type"] == "missing":
+                result.error("missing_node", f"Step {position}: node is required", position)
+            elif field == "id":
+                result.error("invalid_step", f"Step {position}: id is required and must be a number or a string", position)
+            elif field in ("prerequisite", "prompt", "note"):
+                result.error("invalid_step", f"Step {position}: {field} must be text or a number", position)
+            else:
+                result.error("invalid_step", f"Step {position}: {field + ': ' if field else ''}{error['msg']}", position)
+        return False
+
+def _step_positions(steps: List[dict], result: WorkflowValidationResult) -> Dict:
+    """Position (0-based) of every step id, reporting duplicates (the first one wins)"""
+    ids = [step.get("id") for step in steps]
+    keys = ids if all(type(value) is int for value in ids) else [step_key(value) for value in ids]
+    positions = dict(zip(keys, range(len(keys))))
+    if len(positions) == len(keys) and None not in positions:
+        return positions
+
+    positions = {}
+    for position, key in enumerate(keys):
+        if key is None:
+            continue
+        first = positions.setdefault(key, position)
+        if first != position:
+            result.error(
+                "duplicate_step_id",
+                f"Step {position + 1}: id {ids[position]} is already used by step {first + 1}",
+                position + 1, ids[position]
+            )
+    return positions
+
+def _step_links(steps: List[dict], positions: Dict, low: int, high: int, prerequisites: bool = True) -> Dict[int, Set[int]]:
+    """
+    Links between the positions low..high: a step runs before the step it is
+    connected to and, with prerequisites, a prerequisite runs before its step
+    """
+    edges: Dict[int, Set[int]] = {}
+    for position in range(low, high + 1):
+        step = steps[position]
+        prerequisite = step.get("prerequisite")
+        if prerequisites and prerequisite and type(prerequisite) is str:
+            for reference in prerequisite_parser.parse(prerequisite):
+                source = positions.get(reference)
+                if source is not None and source != position and low <= source <= high:
+                    edges.setdefault(source, set()).add(position)
+        target = positions.get(step_key(step.get("connectedTo")))
+        if target is not None and target != position and low <= target <= high:
+            edges.setdefault(position, set()).add(target)
+    return edges
+
+@profiled("validate")
+def validate_steps(steps: List, result: Optional[WorkflowValidationResult] = None) -> WorkflowValidationResult:
+    """
+    Check the steps of a workflow.
+
+    Errors are structural: steps that are not objects or have a missing or
+    mistyped id or node, duplicate step ids, connectedTo links naming a step
+    that does not exist, and steps connected to each other in a cycle.
+
+    Prerequisites are free text written for the model, so what is read out
+    of them is only ever a warning: a "Step 9" that does not exist, a step
+    named in its own prerequisite ("Complete steps 1 and 2" on step 2), a
+    prerequisite on a later step and steps waiting for each other through
+    their prerequisites. Unknown node types are warnings too.
+
+    Each check is a single pass over the steps, mostly list comprehensions
+    that only fall back to a per-step loop to report what is wrong. The step
+    order is taken as the candidate topological order: a cycle needs a link
+    pointing backwards, so the cycle search only runs when there is one, and
+    only over the steps between the ends of the backward links.
+    """
+    result = result if result is not None else WorkflowValidationResult()
+    valid_schema = _schema_errors(steps, result)
+    # Keep positions aligned when some steps are not objects (already reported)
+    steps = steps if valid_schema else [step if type(step) is dict else {} for step in steps]
+    positions = _step_positions(steps, result)
+
+    nodes = [step.get("node") for step in steps]
+    if not valid_schema or not NODE_TYPES.issuperset(nodes):
+        for position, node in enumerate(nodes):
+            if type(node) is not str or node in NODE_TYPES:
+                continue
+            if node.strip():
+                result.warning("unknown_node", f"Step {position + 1}: unknown node type '{node}'", position + 1, steps[position].get("id"))
+            else:
+                result.error("missing_node", f"Step {position + 1}: node is required", position + 1, steps[position].get("id"))
+
+    # Span of the links pointing backwards (all of them, and connectedTo only);
+    # every cycle lies within it
+    low, high = len(steps), -1
+    connected_low, connected_high = len(steps), -1
+    cached, parse = prerequisite_parser.cached, prerequisite_parser.parse
+    for position, prerequisite in enumerate([step.get("prerequisite") for step in steps]):
+        if not prerequisite or type(prerequisite) is not str:
+            continue
+        for reference in cached(prerequisite) or parse(prerequisite):
+            source = positions.get(reference)
+            if source is not None and source < position:
+                continue
+            step_id = steps[position].get("id")
+            if source is None:
+                result.warning(
+                    "unknown_prerequisite",
+                    f"Step {position + 1}: prerequisite refers to step {reference}, which does not exist",
+                    position + 1, step_id
+                )
+            elif source == position:
+                result.warning("own_prerequisite", f"Step {position + 1}: prerequisite refers to the step itself", position + 1, step_id)
+            else:
+                result.warning(
+                    "forward_prerequisite",
+                    f"Step {position + 1}: prerequisite refers to step {reference}, which comes later",
+                    position + 1, step_id
+                )
+                low, high = min(low, position), max(high, source)
+    prerequisites_backward = low < high
+
+    connections = [step.get("connectedTo") for step in steps]
+    if connections.count(None) != len(connections):
+        for position, connected in enumerate(connections):
+            if connected is None:
+                continue
+            target = positions.get(step_key(connected))
+            step_id = steps[position].get("id")
+            if target is None:
+                result.error(
+                    "unknown_connection",
+                    f"Step {position + 1}: connectedTo refers to step {connected}, which does not exist",
+                    position + 1, step_id
+                )
+            elif target == position:
+                result.error("cycle", f"Step {position + 1}: step is connected to itself", position + 1, step_id)
+            elif target < position:
+                low, high = min(low, target), max(high, position)
+                connected_low, connected_high = min(connected_low, target), max(connected_high, position)
+
+    # With every link pointing forward the step order is a topological order
+    cyclic: Set[int] = set()
+    if connected_low < connected_high:
+        edges = _step_links(steps, positions, connected_low, connected_high, prerequisites=False)
+        for component in strongly_connected_components(sorted(edges), edges):
+            if len(component) > 1:
+                cyclic.update(component)
+                members = ", ".join(str(position + 1) for position in component)
+                result.error("cycle", f"Steps {members} are connected to each other in a cycle", component[0] + 1)
+    if prerequisites_backward:
+        edges = _step_links(steps, positions, low, high)
+        for component in strongly_connected_components(sorted(edges), edges):
+            if len(component) > 1 and cyclic.isdisjoint(component):
+                members = ", ".join(str(position + 1) for position in component)
+                result.warning("prerequisite_cycle", f"Steps {members} wait for each other through their prerequisites", component[0] + 1)
+
+    return result
+
+def orchestrator_cycle(
+    graph: WorkflowGraph,
+    workflow_id: Optional[int],
+    connected: Optional[Iterable[int]] = None,
+    parents: Optional[Iterable[int]] = None
+) -> Optional[List[int]]:
+    """
+    A cycle of orchestrator links through workflow_id, or None.
+
+    connected/parents replace the connectedPrompts/parentOrchestrator the
+    workflow declares today (None keeps the stored ones); links declared by
+    other workflows are kept. Breadth-first from the workflow's children,
+    so the whole check is linear in the size of the graph.
+    """
+    children = set(graph.children.get(workflow_id, ())) if workflow_id is not None else set()
+    parent_ids = set(graph.parents.get(workflow_id, ())) if workflow_id is not None else set()
+    declared_connected, declared_parents = graph.declared_links(workflow_id)
+    if connected is not None:
+        children = {child for child in children if graph.link_references((workflow_id, child)) > (child in declared_connected)}
+        children.update(connected)
+    if parents is not None:
+        parent_ids = {parent for parent in parent_ids if graph.link_references((parent, workflow_id)) > (parent in declared_parents)}
+        parent_ids.update(parents)
+
+    if workflow_id is not None and workflow_id in children:
+        return [workflow_id, workflow_id]
+
+    # Walk down from the children; reaching one of the parents closes the loop
+    came_from: Dict[int, Optional[int]] = {child: None for child in children}
+    queue = deque(sorted(children))
+    while queue:
+        node = queue.popleft()
+        if node in parent_ids:
+            path = [node]
+            while came_from[path[-1]] is not None:
+                path.append(came_from[path[-1]])
+            return [workflow_id] + path[::-1] + [workflow_id]
+        for child in sorted(graph.children.get(node, ())):
+            if child != workflow_id and child not in came_from:
+                came_from[child] = node
+                queue.append(child)
+    return None
+
+def validate_links(
+    graph: WorkflowGraph,
+    workflow_id: Optional[int],
+    connected: Optional[List[int]] = None,
+    parents: Optional[List[int]] = None,
+    result: Optional[WorkflowValidationResult] = None
+) -> WorkflowValidationResult:
+    """
+    Check the orchestrator links of a workflow against the graph index
+    (already refreshed by the caller): linked workflows must exist and the
+    links must not form a cycle through it.
+    """
+    result = result if result is not None else WorkflowValidationResult()
+    for field, ids in (("connectedPrompts", connected), ("parentOrchestrator", parents)):
+        for linked in ids or ():
+            if linked not in graph.nodes and linked != workflow_id:
+                result.error("unknown_workflow", f"{field} refers to workflow {linked}, which does not exist")
+
+    cycle = orchestrator_cycle(graph, workflow_id, connected, parents)
+    if cycle is not None:
+        shown = " -> ".join("this workflow" if node is None else str(node) for node in cycle)
+        result.error("orchestrator_cycle", f"Orchestrator links form a cycle: {shown}")
+    return result
@@ -0,0 +1,21 @@
+-- Notify API instances when reference data changes so they can drop their
+-- in-process reference data cache (see services/reference_cache.py).
+-- The payload is the name of the table that changed.
+
+CREATE OR REPLACE FUNCTION common.notify_reference_data_changed()
+RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('reference_data_changed', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS gpt_doc_config_reference_notify ON common.gpt_doc_config;
+CREATE TRIGGER gpt_doc_config_reference_notify
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON common.gpt_doc_config
+    FOR EACH STATEMENT EXECUTE FUNCTION common.notify_reference_data_changed();
+
+DROP TRIGGER IF EXISTS mortgage_workflow_reference_notify ON common.mortgage_workflow;
+CREATE TRIGGER mortgage_workflow_reference_notify
+    AFTER INSERT OR UPDATE OF data_point OR DELETE OR TRUNCATE ON common.mortgage_workflow
+    FOR EACH STATEMENT EXECUTE FUNCTION common.notify_reference_data_changed();
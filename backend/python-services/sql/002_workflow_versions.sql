@@ -0,0 +1,25 @@
+-- Append-only store for superseded workflow versions.
+-- Replaces rewriting the whole historicalworkflow JSONB column on every
+-- "save as new version": archiving a version now inserts one row.
+
+CREATE TABLE IF NOT EXISTS common.mortgage_workflow_version (
+    workflow_id INTEGER NOT NULL REFERENCES common.mortgage_workflow (id) ON DELETE CASCADE,
+    version     INTEGER NOT NULL,
+    workflow    JSONB NOT NULL,
+    step_count  INTEGER,
+    created_at  TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (workflow_id, version)
+);
+
+-- Backfill versions previously kept in historicalworkflow ({"<version>": [steps]})
+INSERT INTO common.mortgage_workflow_version (workflow_id, version, workflow, step_count)
+SELECT
+    mw.id,
+    history.key::int,
+    history.value,
+    CASE WHEN jsonb_typeof(history.value) = 'array' THEN jsonb_array_length(history.value) END
+FROM common.mortgage_workflow mw
+CROSS JOIN LATERAL jsonb_each(mw.historicalworkflow) AS history
+WHERE jsonb_typeof(mw.historicalworkflow) = 'object'
+  AND history.key ~ '^[0-9]+$'
+ON CONFLICT (workflow_id, version) DO NOTHING;
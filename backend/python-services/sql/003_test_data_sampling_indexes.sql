@@ -0,0 +1,13 @@
+-- Indexes used by the /workflows/prepare-test sampler.
+-- CONCURRENTLY avoids blocking writes on the (very large) indexing table;
+-- run this file outside a transaction block.
+
+-- Candidate selection: doc_type filter, then loans grouped by loan_number
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sub_document_indexing_doc_type_loan_idx
+    ON common.sub_document_indexing (doc_type, loan_number)
+    WHERE loan_number IS NOT NULL AND loan_number <> '';
+
+-- Borrower aggregation for the sampled loans
+CREATE INDEX CONCURRENTLY IF NOT EXISTS sub_document_indexing_loan_borrower_idx
+    ON common.sub_document_indexing (loan_number, doc_type, borrower_id)
+    WHERE borrower_id IS NOT NULL AND borrower_id <> '';
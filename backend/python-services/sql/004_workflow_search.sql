@@ -0,0 +1,22 @@
+-- Trigram search over workflows for GET /workflows/search.
+-- search_text is a lower-cased concatenation of the searchable fields and of
+-- every step prompt, kept up to date by Postgres on each write. Adding the
+-- stored column rewrites the table once; the index is then built
+-- CONCURRENTLY, so run this file outside a transaction block.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE common.mortgage_workflow
+    ADD COLUMN IF NOT EXISTS search_text TEXT GENERATED ALWAYS AS (
+        lower(
+            coalesce("workflowName", '') || ' ' ||
+            coalesce(description, '') || ' ' ||
+            coalesce(data_point, '') || ' ' ||
+            coalesce(doc_type, '') || ' ' ||
+            coalesce(jsonb_path_query_array(workflow, '$[*].prompt')::text, '')
+        )
+    ) STORED;
+
+-- Serves both substring (LIKE '%...%') and fuzzy (<%) matching
+CREATE INDEX CONCURRENTLY IF NOT EXISTS mortgage_workflow_search_text_trgm_idx
+    ON common.mortgage_workflow USING gin (search_text gin_trgm_ops);
@@ -0,0 +1,37 @@
+-- Content hashes for change detection on PUT /workflows/{id}/save.
+-- steps_hash covers the canonical JSON of the workflow steps (and so the
+-- prompt composed from them), settings_hash the other saved fields. The API
+-- writes both on every save and skips saves whose payload hashes the same.
+-- Existing rows start with NULL hashes, which never match, so their first
+-- save after this migration writes as before.
+
+ALTER TABLE common.mortgage_workflow
+    ADD COLUMN IF NOT EXISTS steps_hash TEXT,
+    ADD COLUMN IF NOT EXISTS settings_hash TEXT;
+
+-- Any write that changes the content without setting a new hash (metadata
+-- updates, bulk import, manual edits) clears it, so a stale hash can never
+-- make the API skip a save that would change something.
+CREATE OR REPLACE FUNCTION common.mortgage_workflow_reset_content_hash()
+RETURNS trigger AS $$
+BEGIN
+    IF NEW.steps_hash IS NOT DISTINCT FROM OLD.steps_hash
+       AND (NEW.workflow IS DISTINCT FROM OLD.workflow OR NEW.prompt IS DISTINCT FROM OLD.prompt) THEN
+        NEW.steps_hash := NULL;
+    END IF;
+    IF NEW.settings_hash IS NOT DISTINCT FROM OLD.settings_hash
+       AND ROW(NEW."workflowName", NEW.description, NEW.category, NEW.doc_type, NEW.other_doc,
+               NEW."flowType", NEW.runtype, NEW.data_point)
+           IS DISTINCT FROM
+           ROW(OLD."workflowName", OLD.description, OLD.category, OLD.doc_type, OLD.other_doc,
+               OLD."flowType", OLD.runtype, OLD.data_point) THEN
+        NEW.settings_hash := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mortgage_workflow_reset_content_hash ON common.mortgage_workflow;
+CREATE TRIGGER mortgage_workflow_reset_content_hash
+    BEFORE UPDATE ON common.mortgage_workflow
+    FOR EACH ROW EXECUTE FUNCTION common.mortgage_workflow_reset_content_hash();
@@ -0,0 +1,44 @@
+-- Publish every change to common.mortgage_workflow on the workflow_changes
+-- channel for the SSE change feed (GET /workflows/changes). The payload is
+-- small JSON: {"op", "id", "version", "updated_at"}, well under the 8000
+-- byte NOTIFY limit. Notifications are sent at commit, so subscribers never
+-- see a change that was rolled back. A TRUNCATE sends {"op": "truncate"}.
+-- Bulk imports set workflow_changes.suppress for their transaction and send
+-- one {"op": "import", "inserted", "updated"} notification instead of one per row.
+
+CREATE OR REPLACE FUNCTION common.notify_workflow_changed()
+RETURNS trigger AS $$
+DECLARE
+    changed RECORD;
+BEGIN
+    IF current_setting('workflow_changes.suppress', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'TRUNCATE' THEN
+        PERFORM pg_notify('workflow_changes', json_build_object('op', 'truncate')::text);
+        RETURN NULL;
+    END IF;
+    IF TG_OP = 'DELETE' THEN
+        changed := OLD;
+    ELSE
+        changed := NEW;
+    END IF;
+    PERFORM pg_notify('workflow_changes', json_build_object(
+        'op', lower(TG_OP),
+        'id', changed.id,
+        'version', COALESCE(changed.version, 1),
+        'updated_at', changed.updated_at
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS mortgage_workflow_change_notify ON common.mortgage_workflow;
+CREATE TRIGGER mortgage_workflow_change_notify
+    AFTER INSERT OR UPDATE OR DELETE ON common.mortgage_workflow
+    FOR EACH ROW EXECUTE FUNCTION common.notify_workflow_changed();
+
+DROP TRIGGER IF EXISTS mortgage_workflow_change_notify_truncate ON common.mortgage_workflow;
+CREATE TRIGGER mortgage_workflow_change_notify_truncate
+    AFTER TRUNCATE ON common.mortgage_workflow
+    FOR EACH STATEMENT EXECUTE FUNCTION common.notify_workflow_changed();
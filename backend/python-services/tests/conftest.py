@@ -0,0 +1,5 @@
+import os
+
+# Settings require DB credentials at import time; the tests never connect
+for name in ("DB_HOST", "DB_USERNAME", "DB_PASSWORD", "DB_NAME"):
+    os.environ.setdefault(name, "test")
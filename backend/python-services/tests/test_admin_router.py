@@ -0,0 +1,23 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import admin_router
+from config.settings import settings
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(admin_router.router)
+    return TestClient(app)
+
+def test_disabled_without_a_token(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", None)
+    assert client.get("/admin/queries", headers={"X-Admin-Token": ""}).status_code == 403
+
+def test_token_required(client, monkeypatch):
+    monkeypatch.setattr(settings, "admin_token", "secret")
+    assert client.get("/admin/queries").status_code == 401
+    assert client.post("/admin/cache/clear", headers={"X-Admin-Token": "wrong"}).status_code == 401
+    assert client.post("/admin/queries/reset", headers={"X-Admin-Token": "secret"}).status_code == 200
+    assert client.get("/admin/queries?plans=true", headers={"X-Admin-Token": "secret"}).status_code == 200
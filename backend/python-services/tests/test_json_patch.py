@@ -0,0 +1,86 @@
+import pytest
+
+from utils.json_patch import ROOT, JsonPatchError, JsonPatchTestFailed, apply_patch, json_equal, parse_pointer, touched_members
+
+def test_parse_pointer_unescapes_tokens():
+    assert parse_pointer("") == []
+    assert parse_pointer("/a~1b/c~0d/0") == ["a/b", "c~d", "0"]
+    with pytest.raises(ValueError):
+        parse_pointer("a/b")
+
+def test_add_replace_remove():
+    document = {"workflow": [{"id": 1}, {"id": 2}], "description": "old"}
+    document = apply_patch(document, [
+        {"op": "add", "path": "/workflow/1", "value": {"id": 3}},
+        {"op": "replace", "path": "/description", "value": "new"},
+        {"op": "remove", "path": "/workflow/0"},
+    ])
+    assert document == {"workflow": [{"id": 3}, {"id": 2}], "description": "new"}
+
+def test_array_end_index_appends_only_for_add():
+    document = apply_patch({"workflow": [1]}, [{"op": "add", "path": "/workflow/-", "value": 2}])
+    assert document == {"workflow": [1, 2]}
+    with pytest.raises(JsonPatchError):
+        apply_patch({"workflow": [1]}, [{"op": "replace", "path": "/workflow/-", "value": 2}])
+    with pytest.raises(JsonPatchError):
+        apply_patch({"workflow": [1]}, [{"op": "remove", "path": "/workflow/-"}])
+
+@pytest.mark.parametrize("index", ["01", "-1", "x", "5"])
+def test_invalid_array_indexes_are_rejected(index):
+    with pytest.raises(JsonPatchError):
+        apply_patch({"workflow": [1, 2]}, [{"op": "replace", "path": f"/workflow/{index}", "value": 0}])
+
+def test_move_and_copy():
+    document = {"workflow": [{"id": 1}, {"id": 2}], "other": {}}
+    document = apply_patch(document, [
+        {"op": "move", "from": "/workflow/0", "path": "/workflow/-"},
+        {"op": "copy", "from": "/workflow/0", "path": "/other/first"},
+    ])
+    assert document == {"workflow": [{"id": 2}, {"id": 1}], "other": {"first": {"id": 2}}}
+    # The copy is independent of its source
+    document["other"]["first"]["id"] = 9
+    assert document["workflow"][0] == {"id": 2}
+
+def test_move_into_own_child_is_rejected():
+    with pytest.raises(JsonPatchError, match="own children"):
+        apply_patch({"a": {"b": {}}}, [{"op": "move", "from": "/a", "path": "/a/b/c"}])
+
+def test_move_to_same_location_is_a_no_op():
+    assert apply_patch({"a": 1}, [{"op": "move", "from": "/a", "path": "/a"}]) == {"a": 1}
+
+def test_test_op_uses_json_equality():
+    document = {"flag": True, "count": 1, "ratio": 1.0}
+    apply_patch(document, [
+        {"op": "test", "path": "/count", "value": 1.0},
+        {"op": "test", "path": "/flag", "value": True},
+    ])
+    with pytest.raises(JsonPatchTestFailed):
+        apply_patch(document, [{"op": "test", "path": "/count", "value": True}])
+    with pytest.raises(JsonPatchTestFailed):
+        apply_patch(document, [{"op": "test", "path": "/flag", "value": 1}])
+    assert json_equal({"a": [1, {"b": None}]}, {"a": [1.0, {"b": None}]})
+    assert not json_equal({"a": 1}, {"a": 1, "b": 2})
+
+def test_root_pointer_replaces_the_document():
+    replaced = apply_patch({"a": 1}, [{"op": "replace", "path": "", "value": {"b": 2}}])
+    assert replaced == {"b": 2}
+    assert apply_patch({"a": 1}, [{"op": "test", "path": "", "value": {"a": 1}}]) == {"a": 1}
+    with pytest.raises(JsonPatchError):
+        apply_patch({"a": 1}, [{"op": "remove", "path": ""}])
+
+def test_errors_name_the_failing_operation():
+    with pytest.raises(JsonPatchError) as error:
+        apply_patch({"a": 1}, [{"op": "test", "path": "/a", "value": 1}, {"op": "remove", "path": "/missing"}])
+    assert error.value.index == 1
+    for operation in ({"op": "bogus", "path": "/a"}, {"op": "add", "path": "/a"}, {"op": "move", "path": "/a"}, {"op": "add", "path": 1, "value": 0}):
+        with pytest.raises(JsonPatchError):
+            apply_patch({"a": 1}, [operation])
+
+def test_touched_members():
+    patch = [
+        {"op": "replace", "path": "/workflow/3/prompt", "value": "x"},
+        {"op": "move", "from": "/description", "path": "/data_point"},
+        {"op": "test", "path": "not a pointer", "value": 1},
+    ]
+    assert touched_members(patch) == {"workflow", "description", "data_point"}
+    assert touched_members([{"op": "replace", "path": "", "value": {}}]) == {ROOT}
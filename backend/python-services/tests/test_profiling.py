@@ -0,0 +1,21 @@
+import os
+
+from utils.profiling import sampler_path
+
+def test_request_id_is_stripped_to_a_file_name(tmp_path):
+    path = sampler_path(str(tmp_path), "../../etc/x y")
+    assert os.path.dirname(path) == os.path.realpath(tmp_path)
+    assert path.endswith("-etcxy.folded")
+
+def test_empty_request_id_gets_a_random_name(tmp_path):
+    first, second = sampler_path(str(tmp_path), "../"), sampler_path(str(tmp_path), None)
+    assert os.path.dirname(first) == os.path.dirname(second) == os.path.realpath(tmp_path)
+    assert first != second
+
+def test_symlink_out_of_the_directory_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr("time.strftime", lambda fmt: "20240101T000000")
+    outside = tmp_path / "outside.folded"
+    output_dir = tmp_path / "profiles"
+    output_dir.mkdir()
+    (output_dir / "20240101T000000-abc.folded").symlink_to(outside)
+    assert sampler_path(str(output_dir), "abc") is None
@@ -0,0 +1,20 @@
+from services.prompt_composer import compose_prompt, iter_prompt, render_step
+
+def test_render_step():
+    block = render_step({"id": 2, "node": "analysis", "prerequisite": " Step 1 ", "prompt": "Extract.\n", "note": ""})
+    assert block == "## STEP 2: Invoke node `analysis`\n**PREREQUISITES TO EXECUTE THIS STEP**\nStep 1\n**INSTRUCTIONS OF THE STEP:**\nExtract."
+
+def test_any_json_value_is_rendered_as_text():
+    assert render_step({"id": 1, "node": {"type": "analysis"}}) == "## STEP 1: Invoke node `{'type': 'analysis'}`"
+    assert render_step({"id": 1, "node": "analysis", "prompt": 42, "note": 1.5}).endswith("\n42\n**IMPORTANT NOTE**\n1.5")
+
+def test_values_that_compare_equal_render_differently():
+    steps = [{"id": True, "node": "a"}, {"id": 1, "node": "a"}, {"id": 1.0, "node": "a"}]
+    assert compose_prompt(steps).split("\n\n") == [
+        "## STEP True: Invoke node `a`", "## STEP 1: Invoke node `a`", "## STEP 1.0: Invoke node `a`"
+    ]
+
+def test_streamed_prompt_matches():
+    steps = [{"id": position, "node": "analysis", "prompt": f"Step {position}"} for position in range(1, 6)]
+    assert "".join(iter_prompt(steps)) == compose_prompt(steps)
+    assert "".join(iter_prompt([])) == compose_prompt([]) == ""
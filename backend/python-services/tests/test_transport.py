@@ -0,0 +1,74 @@
+import asyncio
+import zlib
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+
+from utils.transport import CompressionMiddleware, make_etag, not_modified, set_etag
+
+ETAG = make_etag("workflows", 7)
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=10)
+
+    @app.get("/data")
+    async def data(request: Request):
+        cached = not_modified(request, ETAG)
+        if cached is not None:
+            return cached
+        response = JSONResponse({"rows": ["x" * 20] * 10})
+        set_etag(response, ETAG)
+        return response
+
+    return TestClient(app)
+
+def test_not_modified_echoes_the_encoded_etag(client):
+    first = client.get("/data", headers={"Accept-Encoding": "gzip"})
+    assert first.headers["ETag"] == ETAG[:-1] + '-gzip"'
+    revalidated = client.get("/data", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["ETag"]})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == first.headers["ETag"]
+    plain = client.get("/data", headers={"Accept-Encoding": "identity", "If-None-Match": f'"other", {ETAG}'})
+    assert plain.status_code == 304
+    assert plain.headers["ETag"] == ETAG
+
+async def stream(rows, delay=0.0):
+    """Send the rows through the middleware as a streamed NDJSON response; returns the body messages"""
+    sent = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/x-ndjson")]})
+        for row in rows:
+            await send({"type": "http.response.body", "body": row, "more_body": True})
+            await asyncio.sleep(delay)
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            sent.append(message["body"])
+
+    middleware = CompressionMiddleware(app, flush_size=4096, flush_interval=0.02)
+    scope = {"type": "http", "headers": [(b"accept-encoding", b"gzip")]}
+    await middleware(scope, None, send)
+    return sent
+
+@pytest.mark.asyncio
+async def test_fast_streams_are_flushed_by_size():
+    rows = [b'{"loan": "%d", "status": "ok"}\n' % number for number in range(2000)]
+    sent = await stream(rows)
+    assert zlib.decompress(b"".join(sent), 31) == b"".join(rows)
+    # A flush per row would write more messages than there are rows
+    assert len(sent) < len(rows) // 10
+
+@pytest.mark.asyncio
+async def test_slow_streams_are_flushed_by_time():
+    rows = [b'{"loan": "%d"}\n' % number for number in range(3)]
+    sent = await stream(rows, delay=0.05)
+    decompressor = zlib.decompressobj(31)
+    delivered = [decompressor.decompress(chunk) for chunk in sent]
+    # Each row reaches the client before the next one is produced
+    assert [chunk for chunk in delivered if chunk] == rows
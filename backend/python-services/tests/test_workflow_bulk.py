@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from services import workflow_bulk
+from services.workflow_bulk import BulkImportError, import_workflows, iter_ndjson_lines
+
+async def chunks_of(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+async def collect(lines):
+    return [line async for line in lines]
+
+def line(name, **fields):
+    return json.dumps(dict({
+        "workflowName": name, "category": "income", "doc_type": "W2", "flowType": "agentic",
+        "runtype": "loan", "workflow": [{"id": 1, "node": "analysis", "prompt": "Extract."}],
+    }, **fields)).encode("utf-8")
+
+class RecordingConnection:
+    def __init__(self):
+        self.statements = []
+        self.copied = []
+
+    async def execute(self, query, *args):
+        self.statements.append((query, args))
+        return "INSERT 0 %d" % len(self.copied) if query == workflow_bulk.INSERT_FROM_STAGING else "SELECT 1"
+
+    async def copy_records_to_table(self, table, *, records, columns):
+        self.copied.extend(records)
+
+    def transaction(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+class RecordingPool:
+    def __init__(self):
+        self.connection = RecordingConnection()
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+        return self.connection
+
+@pytest.mark.asyncio
+async def test_lines_split_across_chunks():
+    lines = await collect(iter_ndjson_lines(chunks_of(b'{"a"', b": 1}\n\n", b'{"b": ', b"2", b'}\n{"c": 3}')))
+    assert lines == [(1, b'{"a": 1}'), (3, b'{"b": 2}'), (4, b'{"c": 3}')]
+
+@pytest.mark.asyncio
+async def test_long_line_in_many_chunks():
+    payload = b"x" * 100000
+    chunks = [payload[i:i + 7] for i in range(0, len(payload), 7)] + [b"\ny\n"]
+    assert await collect(iter_ndjson_lines(chunks_of(*chunks))) == [(1, payload), (2, b"y")]
+
+@pytest.mark.asyncio
+async def test_import_copies_every_batch_and_notifies_once():
+    pool = RecordingPool()
+    body = b"\n".join(line(f"W{i}") for i in range(5))
+    result = await import_workflows(pool, iter_ndjson_lines(chunks_of(body)), batch_size=2)
+    assert result["inserted"] == 5
+    assert [record[2] for record in pool.connection.copied] == [f"W{i}" for i in range(5)]
+    statements = [query for query, args in pool.connection.statements]
+    assert statements[0] == workflow_bulk.SUPPRESS_CHANGE_NOTIFY
+    notifications = [args for query, args in pool.connection.statements if query == workflow_bulk.NOTIFY_IMPORT]
+    assert len(notifications) == 1
+    assert json.loads(notifications[0][1]) == {"op": "import", "inserted": 5, "updated": 0}
+
+@pytest.mark.asyncio
+async def test_invalid_import_never_takes_a_connection():
+    pool = RecordingPool()
+    body = line("W1") + b"\n" + b'{"workflowName": 5}\n' + line("W3")
+    with pytest.raises(BulkImportError) as rejected:
+        await import_workflows(pool, iter_ndjson_lines(chunks_of(body)), batch_size=1)
+    assert rejected.value.invalid == 1
+    assert pool.acquired == 0
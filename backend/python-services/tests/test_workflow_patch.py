@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+
+from services import workflow_patch
+
+UPDATED_AT = datetime.datetime(2024, 1, 1)
+
+def stored_row(steps):
+    return {
+        "workflowName": "Income", "description": None, "category": "income", "doc_type": "W2",
+        "other_doc": None, "flowType": "agentic", "runtype": "loan", "workflow": steps,
+        "data_point": None, "version": 3, "updated_at": UPDATED_AT,
+    }
+
+class FakeRepository:
+    """Records which save the patch ends up calling"""
+
+    row = None
+
+    def __init__(self, pool):
+        self.calls = []
+        FakeRepository.instance = self
+
+    async def get_for_patch(self, workflow_id):
+        return self.row
+
+    async def save(self, workflow_id, request, composed_prompt, *guards):
+        self.calls.append(("save", request, composed_prompt))
+        return {"id": workflow_id, "version": 4}
+
+    async def save_version(self, workflow_id, request, composed_prompt, *guards):
+        self.calls.append(("save_version", request, composed_prompt))
+        return {"id": workflow_id, "version": 4}
+
+    async def save_settings(self, workflow_id, request, *guards):
+        self.calls.append(("save_settings", request, None))
+        return {"id": workflow_id, "version": 4}
+
+@pytest.fixture
+def repository(monkeypatch):
+    monkeypatch.setattr(workflow_patch, "WorkflowRepository", FakeRepository)
+    FakeRepository.row = stored_row([{"id": 1, "node": "text extraction", "prompt": "old"}])
+    return FakeRepository
+
+@pytest.mark.asyncio
+async def test_settings_only_patch_does_not_rewrite_steps(repository):
+    patch = [{"op": "replace", "path": "/description", "value": "new"}]
+    await workflow_patch.patch_workflow(None, 7, patch, base_version=3)
+    assert [call[0] for call in repository.instance.calls] == ["save_settings"]
+
+@pytest.mark.asyncio
+async def test_step_patch_recomposes_the_prompt(repository):
+    patch = [{"op": "replace", "path": "/workflow/0/prompt", "value": "new"}]
+    await workflow_patch.patch_workflow(None, 7, patch, base_version=3)
+    (name, request, prompt), = repository.instance.calls
+    assert name == "save"
+    assert request.workflow[0]["prompt"] == "new"
+    assert "new" in prompt
+
+@pytest.mark.asyncio
+async def test_root_replace_saves_the_new_steps(repository):
+    document = workflow_patch.patch_document(repository.row)
+    document["workflow"] = [{"id": 1, "node": "text extraction", "prompt": "replaced"}]
+    await workflow_patch.patch_workflow(None, 7, [{"op": "replace", "path": "", "value": document}], base_version=3)
+    (name, request, prompt), = repository.instance.calls
+    assert name == "save"
+    assert request.workflow[0]["prompt"] == "replaced"
+    assert "replaced" in prompt
+
+@pytest.mark.asyncio
+async def test_stale_base_version_conflicts(repository):
+    with pytest.raises(workflow_patch.WorkflowVersionConflict):
+        await workflow_patch.patch_workflow(None, 7, [], base_version=2)
@@ -0,0 +1,140 @@
+import pytest
+from fastapi import HTTPException
+
+from api.workflow_router import reject_invalid_steps
+from services.workflow_graph import WorkflowGraph
+from services.workflow_validator import prerequisite_references, step_key, validate_links, validate_steps
+
+def step(step_id, node="analysis", **fields):
+    return dict(fields, id=step_id, node=node)
+
+def codes(issues):
+    return [issue["code"] for issue in issues]
+
+def graph_of(links):
+    """Graph index over workflows 1..5 with the given {id: connectedPrompts}"""
+    graph = WorkflowGraph(ttl_seconds=300)
+    graph._build([
+        {"id": workflow_id, "workflowName": f"W{workflow_id}", "flowType": "orchestrator", "version": 1,
+         "connectedPrompts": links.get(workflow_id, []), "parentOrchestrator": []}
+        for workflow_id in range(1, 6)
+    ])
+    return graph
+
+def test_valid_workflow():
+    result = validate_steps([step(1), step(2, prerequisite="Step 1 must be complete"), step(3, connectedTo=4), step(4)])
+    assert result.valid
+    assert result.to_dict()["warnings"] == []
+
+def test_scalars_are_coerced():
+    result = validate_steps([step(1.0, prompt=42), step("2", prerequisite="Step 1", note=3.5), step(3, prerequisite=7)])
+    assert result.valid
+    assert result.warning_count == 0
+    assert step_key(1.0) == step_key("1") == 1
+
+def test_mistyped_fields_are_errors():
+    result = validate_steps([{"id": True, "node": "analysis"}, {"id": 2, "node": 5}, {"id": 3, "node": "analysis", "prompt": ["x"]}, "step"])
+    assert codes(result.errors) == ["invalid_step"] * 4
+    assert [issue["step"] for issue in result.errors] == [1, 2, 3, 4]
+
+def test_missing_node_and_unknown_node():
+    result = validate_steps([{"id": 1}, step(2, node="  "), step(3, node="summarizer")])
+    assert codes(result.errors) == ["missing_node", "missing_node"]
+    assert codes(result.warnings) == ["unknown_node"]
+
+def test_duplicate_ids():
+    result = validate_steps([step(1), step("1"), step(1.0), step(2)])
+    assert codes(result.errors) == ["duplicate_step_id", "duplicate_step_id"]
+    assert result.errors[0]["message"] == "Step 2: id 1 is already used by step 1"
+
+def test_own_step_in_prerequisite_is_a_warning():
+    result = validate_steps([step(1), step(2, prerequisite="Complete steps 1 and 2 of underwriting")])
+    assert result.valid
+    assert codes(result.warnings) == ["own_prerequisite"]
+
+def test_unknown_prerequisite_is_a_warning():
+    result = validate_steps([step(1), step(2, prerequisite="Step 4 of the intake checklist")])
+    assert result.valid
+    assert codes(result.warnings) == ["unknown_prerequisite"]
+    assert result.warnings[0]["step"] == 2
+
+def test_forward_prerequisite_and_prerequisite_cycle_are_warnings():
+    steps = [step(position) for position in range(1, 6)]
+    steps[1]["prerequisite"] = "Step 4 must be complete"
+    steps[3]["prerequisite"] = "Steps 2 and 3"
+    result = validate_steps(steps)
+    assert result.valid
+    assert sorted(codes(result.warnings)) == ["forward_prerequisite", "prerequisite_cycle"]
+    cycle = next(issue for issue in result.warnings if issue["code"] == "prerequisite_cycle")
+    assert "2" in cycle["message"] and "4" in cycle["message"]
+
+def test_connection_cycle_is_an_error():
+    steps = [step(1, connectedTo=2), step(2, connectedTo=3), step(3, connectedTo=1), step(4, connectedTo=9)]
+    result = validate_steps(steps)
+    assert sorted(codes(result.errors)) == ["cycle", "unknown_connection"]
+    assert result.warning_count == 0
+
+def test_self_connection_is_an_error():
+    result = validate_steps([step(1), step(2, connectedTo="2")])
+    assert codes(result.errors) == ["cycle"]
+
+def test_connection_cycle_is_not_reported_again_as_prerequisite_cycle():
+    steps = [step(1, connectedTo=2), step(2, connectedTo=1, prerequisite="Step 3"), step(3, prerequisite="Step 2")]
+    result = validate_steps(steps)
+    assert codes(result.errors) == ["cycle"]
+    assert "prerequisite_cycle" not in codes(result.warnings)
+
+def test_cycle_search_over_a_long_chain():
+    # Every step is connected to the next and the last one back to the first:
+    # the search runs over the whole workflow without recursing
+    count = 5000
+    steps = [step(position, connectedTo=position % count + 1) for position in range(1, count + 1)]
+    result = validate_steps(steps)
+    assert codes(result.errors) == ["cycle"]
+
+def test_cycle_search_only_spans_backward_links():
+    # A cycle between steps 50 and 51 only; the other links all point forward
+    steps = [step(position, connectedTo=position + 1) for position in range(1, 100)] + [step(100)]
+    steps[50]["connectedTo"] = 50
+    result = validate_steps(steps)
+    assert codes(result.errors) == ["cycle"]
+    assert result.errors[0]["message"] == "Steps 50, 51 are connected to each other in a cycle"
+
+@pytest.mark.parametrize("text, references", [
+    ("Step 3 must be complete", (3,)),
+    ("steps #2, 4 and 5", (2, 4, 5)),
+    ("Complete steps 1 and 2 of underwriting", (1, 2)),
+    ("No prerequisites", ()),
+])
+def test_prerequisite_references(text, references):
+    assert prerequisite_references(text) == references
+
+def test_issue_limit_keeps_counting():
+    result = validate_steps([{"id": position} for position in range(1, 151)])
+    assert result.error_count == 150
+    assert len(result.errors) == 100
+    assert result.summary().endswith("and 145 more")
+
+def test_validate_links_unknown_workflow():
+    result = validate_links(graph_of({}), 1, connected=[2, 9])
+    assert codes(result.errors) == ["unknown_workflow"]
+
+def test_validate_links_orchestrator_cycle():
+    # 1 -> 2 -> 3 stored; making 1 a child of 3 closes the loop
+    graph = graph_of({1: [2], 2: [3]})
+    result = validate_links(graph, 1, parents=[3])
+    assert codes(result.errors) == ["orchestrator_cycle"]
+    assert result.errors[0]["message"] == "Orchestrator links form a cycle: 1 -> 2 -> 3 -> 1"
+
+def test_validate_links_replaced_links_are_dropped():
+    # Workflow 3 currently links back to 1; the proposed links drop that
+    graph = graph_of({1: [2], 2: [3], 3: [1]})
+    assert codes(validate_links(graph, 3, connected=[]).errors) == []
+    assert codes(validate_links(graph, 3).errors) == ["orchestrator_cycle"]
+
+def test_saves_are_rejected_on_structural_errors_only():
+    reject_invalid_steps([step(1), step(2, prerequisite="Complete steps 1 and 2 of underwriting"), step(3, prerequisite="Step 9")])
+    with pytest.raises(HTTPException) as rejected:
+        reject_invalid_steps([step(1), step(1)])
+    assert rejected.value.status_code == 422
+    assert codes(rejected.value.detail["errors"]) == ["duplicate_step_id"]
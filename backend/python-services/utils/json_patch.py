@@ -0,0 +1,173 @@
+import copy
+from typing import Any, List, Tuple
+
+OPERATIONS = ("add", "remove", "replace", "move", "copy", "test")
+
+# What touched_members() reports for the root pointer: the whole document
+ROOT = ""
+
+class JsonPatchError(ValueError):
+    """A patch is malformed or cannot be applied to the document"""
+
+    def __init__(self, message: str, index: int):
+        super().__init__(f"Operation {index}: {message}")
+        self.index = index
+
+class JsonPatchTestFailed(JsonPatchError):
+    """A "test" operation did not match, i.e. the document is not in the expected state"""
+
+def parse_pointer(pointer: str) -> List[str]:
+    """Split an RFC 6901 JSON Pointer into unescaped reference tokens"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON Pointer '{pointer}'")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+def _array_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise ValueError(f"Invalid array index '{token}'")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise ValueError(f"Array index {index} out of range")
+    return index
+
+def _resolve(document: Any, tokens: List[str]) -> Any:
+    value = document
+    for token in tokens:
+        if isinstance(value, dict):
+            if token not in value:
+                raise ValueError(f"Member '{token}' not found")
+            value = value[token]
+        elif isinstance(value, list):
+            value = value[_array_index(value, token, allow_end=False)]
+        else:
+            raise ValueError(f"Cannot descend into a {type(value).__name__} at '{token}'")
+    return value
+
+def _parent(document: Any, tokens: List[str]) -> Tuple[Any, str]:
+    if not tokens:
+        raise ValueError("The whole document cannot be the target of this operation")
+    return _resolve(document, tokens[:-1]), tokens[-1]
+
+def _add(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, token = _parent(document, tokens)
+    if isinstance(parent, dict):
+        parent[token] = value
+    elif isinstance(parent, list):
+        parent.insert(_array_index(parent, token, allow_end=True), value)
+    else:
+        raise ValueError(f"Cannot add to a {type(parent).__name__}")
+    return document
+
+def _remove(document: Any, tokens: List[str]) -> Any:
+    parent, token = _parent(document, tokens)
+    if isinstance(parent, dict):
+        if token not in parent:
+            raise ValueError(f"Member '{token}' not found")
+        return parent.pop(token)
+    if isinstance(parent, list):
+        return parent.pop(_array_index(parent, token, allow_end=False))
+    raise ValueError(f"Cannot remove from a {type(parent).__name__}")
+
+def _replace(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, token = _parent(document, tokens)
+    if isinstance(parent, list):
+        parent[_array_index(parent, token, allow_end=False)] = value
+    elif isinstance(parent, dict):
+        if token not in parent:
+            raise ValueError(f"Member '{token}' not found")
+        parent[token] = value
+    else:
+        raise ValueError(f"Cannot replace inside a {type(parent).__name__}")
+    return document
+
+def json_equal(a: Any, b: Any) -> bool:
+    """JSON value equality: unlike ==, true is not equal to 1"""
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(json_equal(a[key], b[key]) for key in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(json_equal(x, y) for x, y in zip(a, b))
+    if isinstance(a, (int, float)) and isinstance(b, (int, float)):
+        return a == b
+    return type(a) is type(b) and a == b
+
+def touched_members(patch: List[dict]) -> set:
+    """
+    Top-level members of the document that the patch reads or writes.
+
+    An operation on the root pointer ("") reports ROOT, which stands for
+    every member.
+    """
+    members = set()
+    for operation in patch:
+        for key in ("path", "from"):
+            pointer = operation.get(key)
+            if isinstance(pointer, str):
+                try:
+                    tokens = parse_pointer(pointer)
+                except ValueError:
+                    continue
+                members.add(tokens[0] if tokens else ROOT)
+    return members
+
+def apply_patch(document: Any, patch: List[dict]) -> Any:
+    """
+    Apply an RFC 6902 JSON Patch and return the patched document.
+
+    The document is modified in place (only the root can be replaced, which
+    is why the result is returned), so large documents are not copied. Ops
+    run in order; when one fails the document is left partially patched and
+    must be discarded by the caller.
+
+    Raises:
+        JsonPatchTestFailed: a "test" operation did not match
+        JsonPatchError: any other malformed or inapplicable operation
+    """
+    for index, operation in enumerate(patch):
+        if not isinstance(operation, dict):
+            raise JsonPatchError("must be an object", index)
+        op = operation.get("op")
+        if op not in OPERATIONS:
+            raise JsonPatchError(f"unknown op '{op}'", index)
+        if not isinstance(operation.get("path"), str):
+            raise JsonPatchError("'path' must be a string", index)
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise JsonPatchError(f"'{op}' requires a 'value'", index)
+        if op in ("move", "copy") and not isinstance(operation.get("from"), str):
+            raise JsonPatchError(f"'{op}' requires a 'from' pointer", index)
+
+        try:
+            tokens = parse_pointer(operation["path"])
+            if op == "add":
+                document = _add(document, tokens, copy.deepcopy(operation["value"]))
+            elif op == "remove":
+                _remove(document, tokens)
+            elif op == "replace":
+                document = _replace(document, tokens, copy.deepcopy(operation["value"]))
+            elif op == "test":
+                if not json_equal(_resolve(document, tokens), operation["value"]):
+                    raise JsonPatchTestFailed(f"test failed at '{operation['path']}'", index)
+            else:
+                from_tokens = parse_pointer(operation["from"])
+                if op == "move":
+                    if tokens[:len(from_tokens)] == from_tokens and len(tokens) > len(from_tokens):
+                        raise ValueError("Cannot move a value into one of its own children")
+                    value = _remove(document, from_tokens)
+                else:
+                    value = copy.deepcopy(_resolve(document, from_tokens))
+                document = _add(document, tokens, value)
+        except JsonPatchError:
+            raise
+        except ValueError as e:
+            raise JsonPatchError(str(e), index) from e
+
+    return document
@@ -0,0 +1,125 @@
+import copy
+import json
+import logging
+import queue
+import random
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+# Request id of the request being handled ("-" outside requests)
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Whether INFO/DEBUG records of the current request are kept (None outside requests)
+log_sampled_var: ContextVar[Optional[bool]] = ContextVar("log_sampled", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s"
+TEXT_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_sample_rate = 1.0
+_listener: Optional[QueueListener] = None
+
+def sample_request() -> bool:
+    """Decide whether the INFO/DEBUG logs of a new request are kept"""
+    return _sample_rate >= 1.0 or random.random() < _sample_rate
+
+class RequestContextFilter(logging.Filter):
+    """
+    Stamp records with the current request id and apply request sampling.
+
+    WARNING and above always pass; lower levels are dropped for requests that
+    were not sampled. Runs on the calling thread, before the record is queued,
+    so dropped records cost almost nothing.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        if record.levelno >= logging.WARNING:
+            return True
+        return log_sampled_var.get() is not False
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, request id, message and extras"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "requestId": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class _RecordQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps records structured.
+
+    The stock prepare() formats the whole record on the calling thread and
+    flattens it into a string; here only the message is merged with its args
+    (they may not be safe to read later) and tracebacks are rendered, leaving
+    the formatting itself to the listener thread.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def configure_logging(level: str = "INFO", log_format: str = "json", sample_rate: float = 1.0):
+    """
+    Route every log record through a queue to a background writer thread.
+
+    Handlers on the event loop only enqueue records; a QueueListener thread
+    formats them (JSON or text) and writes them to stdout.
+
+    Args:
+        level: Root log level
+        log_format: "json" for structured records, "text" for the classic format
+        sample_rate: Fraction of requests whose INFO/DEBUG records are kept
+    """
+    global _listener, _sample_rate
+    stop_logging()
+    _sample_rate = sample_rate
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter(TEXT_FORMAT, datefmt=TEXT_DATE_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _RecordQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,284 @@
+import logging
+import time
+import uuid
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.logging_config import log_sampled_var, request_id_var, sample_request
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast cached reads up to slow exports
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Seconds; pool waits are normally sub-millisecond
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+class Counter(_Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+class Gauge(_Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str):
+        self._values[labels] = value
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self._values.items())
+        ]
+
+class CallbackGauge(_Metric):
+    """Gauge read at scrape time; the callback returns {label values: value}"""
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], callback: Callable[[], Dict[tuple, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in sorted(self.callback().items())
+        ]
+
+class Histogram(_Metric):
+    """
+    Fixed-bucket histogram.
+
+    observe() only increments one bucket (found by bisection); cumulative
+    counts are computed at scrape time.
+    """
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Process-local metrics rendered in the Prometheus text exposition format.
+
+    Metrics are updated from the event loop only, so no locking is needed.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric '{metric.name}' is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def callback_gauge(self, name: str, documentation: str, labelnames: Sequence[str], callback) -> CallbackGauge:
+        return self._register(CallbackGauge(name, documentation, labelnames, callback))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                logger.warning(f"Skipping metric {metric.name}: {str(e)}")
+                continue
+            lines.extend(metric.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status"),
+)
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ("method",),
+)
+HTTP_REQUEST_ERRORS = registry.counter(
+    "http_request_errors_total",
+    "HTTP requests that ended with a 5xx status or an unhandled exception",
+    ("method", "route", "status"),
+)
+DB_POOL_ACQUIRE_WAIT = registry.histogram(
+    "db_pool_acquire_wait_seconds",
+    "Time spent waiting for a database connection from the pool",
+    ("pool",),
+    buckets=POOL_WAIT_BUCKETS,
+)
+
+# Paths that are not worth a latency series (or an access log line) of their own.
+# The change feed is a stream held open for hours: it would pin the in-flight
+# gauge and the top latency bucket (change_feed_subscribers counts its clients).
+UNINSTRUMENTED_PATHS = ("/metrics", "/livez", "/readyz", "/api/v1/workflows/changes")
+
+def route_template(scope: Scope) -> str:
+    """Route path template (e.g. /api/v1/workflows/{workflow_id}) to keep label cardinality bounded"""
+    route = scope.get("route")
+    path_format = getattr(route, "path_format", None) or getattr(route, "path", None)
+    if path_format is None:
+        return "unmatched"
+    return scope.get("root_path", "") + path_format
+
+class RequestInstrumentationMiddleware:
+    """
+    Pure ASGI middleware giving every request an id, metrics and one access log line.
+
+    The request id comes from the X-Request-ID header (or is generated), is
+    available to every log record emitted while handling the request and is
+    echoed back in the response. Whether the request's INFO/DEBUG logs are
+    kept is decided once here (see utils.logging_config.sample_request).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        request_id_token = request_id_var.set(request_id)
+        sampled_token = log_sampled_var.set(sample_request())
+
+        method = scope["method"]
+        path = scope["path"]
+        status: Optional[int] = None
+        start_time = time.perf_counter()
+        instrumented = path not in UNINSTRUMENTED_PATHS
+        if instrumented:
+            HTTP_REQUESTS_IN_FLIGHT.inc(method)
+
+        async def send_with_request_id(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        except Exception as e:
+            status = 500
+            logger.error(
+                f"Request failed: {method} {path} - Error: {str(e)} - Time: {time.perf_counter() - start_time:.3f}s",
+                exc_info=True
+            )
+            raise
+        finally:
+            duration = time.perf_counter() - start_time
+            if instrumented:
+                HTTP_REQUESTS_IN_FLIGHT.dec(method)
+                self._record(scope, method, path, status or 500, duration)
+            log_sampled_var.reset(sampled_token)
+            request_id_var.reset(request_id_token)
+
+    def _record(self, scope: Scope, method: str, path: str, status: int, duration: float):
+        route = route_template(scope)
+        status_label = str(status)
+        HTTP_REQUEST_DURATION.observe(duration, method, route, status_label)
+        if status >= 500:
+            HTTP_REQUEST_ERRORS.inc(method, route, status_label)
+
+        level = logging.ERROR if status >= 500 else logging.INFO
+        if logger.isEnabledFor(level):
+            logger.log(
+                level,
+                f"Request completed: {method} {path} - Status: {status} - Time: {duration:.3f}s",
+                extra={"method": method, "path": path, "route": route, "status": status, "durationMs": round(duration * 1000, 2)}
+            )
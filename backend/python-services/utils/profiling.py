@@ -0,0 +1,314 @@
+import asyncio
+import functools
+import hmac
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.logging_config import log_sampled_var, request_id_var
+
+logger = logging.getLogger(__name__)
+
+# Profile of the request being handled; None (the default) means profiling is off
+request_profile_var: ContextVar[Optional["RequestProfile"]] = ContextVar("request_profile", default=None)
+
+# Statements listed individually in Server-Timing (the slowest ones)
+MAX_TIMED_STATEMENTS = 10
+
+_WHITESPACE = re.compile(r"\s+")
+_statement_names: Dict[str, str] = {}
+# Request ids come from the client (X-Request-ID); only these characters reach a file name
+_UNSAFE_FILE_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+
+def name_statements(statements: Dict[str, str]):
+    """Register readable names ({name: sql}) used instead of the SQL text in timings"""
+    for name, query in statements.items():
+        _statement_names[query] = name
+
+def statement_label(query: str) -> str:
+    """Registered name of a statement, else its first 80 characters on one line"""
+    name = _statement_names.get(query)
+    if name is None:
+        name = _WHITESPACE.sub(" ", query).strip()[:80]
+    return name
+
+def current_profile() -> Optional["RequestProfile"]:
+    return request_profile_var.get()
+
+class RequestProfile:
+    """
+    Where one request spent its time.
+
+    Spans are wall-clock totals per name and may overlap (app includes db and
+    compose, for instance). Statements are timed individually by label.
+    """
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self.statements: Dict[str, list] = {}
+        self.sampler_file: Optional[str] = None
+
+    def add(self, name: str, seconds: float):
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def add_statement(self, query: str, seconds: float):
+        self.add("db", seconds)
+        timing = self.statements.get(query)
+        if timing is None:
+            self.statements[query] = [seconds, 1]
+        else:
+            timing[0] += seconds
+            timing[1] += 1
+
+    def _entries(self, total: float):
+        """(name, milliseconds, description) rows in Server-Timing order"""
+        spans = self.spans
+        yield "total", total * 1000, None
+        if "pool" in spans:
+            yield "pool", spans["pool"] * 1000, f"connection wait, {self.counts['pool']} acquires"
+        if "db" in spans:
+            yield "db", spans["db"] * 1000, f"{self.counts['db']} statements"
+            slowest = sorted(self.statements.items(), key=lambda item: item[1][0], reverse=True)[:MAX_TIMED_STATEMENTS]
+            for index, (query, (seconds, count)) in enumerate(slowest, 1):
+                yield f"db-{index}", seconds * 1000, f"{statement_label(query)} x{count}"
+        if "app" in spans:
+            yield "app", spans["app"] * 1000, "endpoint"
+        if "handler" in spans:
+            framework = max(spans["handler"] - spans.get("app", 0.0), 0.0)
+            yield "pydantic", framework * 1000, "request parsing and validation, response serialization"
+        for name in ("compose", "validate", "json"):
+            if name in spans:
+                yield name, spans[name] * 1000, f"{self.counts[name]} calls"
+        if self.sampler_file:
+            yield "sampler", None, self.sampler_file
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing header value"""
+        entries = []
+        for name, milliseconds, description in self._entries(total):
+            entry = name if milliseconds is None else f"{name};dur={milliseconds:.3f}"
+            if description:
+                # Quoted-string; keep it printable ASCII without quotes or backslashes
+                text = description.encode("ascii", "replace").decode("ascii").replace("\\", "/").replace('"', "'")
+                entry += f';desc="{text}"'
+            entries.append(entry)
+        return ", ".join(entries)
+
+    def breakdown(self, total: float) -> dict:
+        """The same timings as a dict for the log"""
+        return {
+            name: {"ms": round(milliseconds, 3), "desc": description} if description else round(milliseconds, 3)
+            for name, milliseconds, description in self._entries(total)
+            if milliseconds is not None
+        }
+
+def profiled(name: str) -> Callable:
+    """Add the time of each call of the decorated function to the current profile under name"""
+    def decorate(function):
+        if asyncio.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                profile = request_profile_var.get()
+                if profile is None:
+                    return await function(*args, **kwargs)
+                start_time = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                finally:
+                    profile.add(name, time.perf_counter() - start_time)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = request_profile_var.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add(name, time.perf_counter() - start_time)
+        return wrapper
+    return decorate
+
+class ProfiledRoute(APIRoute):
+    """
+    APIRoute that, for profiled requests, times the endpoint function ("app")
+    and the whole route handler; the difference is FastAPI's request parsing,
+    pydantic validation and response serialization.
+    """
+
+    def get_route_handler(self):
+        endpoint = self.dependant.call
+        if asyncio.iscoroutinefunction(endpoint):
+            self.dependant.call = profiled("app")(endpoint)
+        handler = super().get_route_handler()
+
+        async def profiled_handler(request):
+            profile = request_profile_var.get()
+            if profile is None:
+                return await handler(request)
+            start_time = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                profile.add("handler", time.perf_counter() - start_time)
+
+        return profiled_handler
+
+def sampler_path(output_dir: str, request_id: Optional[str]) -> Optional[str]:
+    """
+    Stack file of a request: the request id stripped to [A-Za-z0-9_-] (a
+    random hex id when nothing is left), or None when the path would still
+    resolve outside output_dir
+    """
+    label = _UNSAFE_FILE_CHARS.sub("", request_id or "")[:64] or uuid.uuid4().hex
+    directory = os.path.realpath(output_dir)
+    path = os.path.realpath(os.path.join(directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{label}.folded"))
+    if os.path.dirname(path) != directory:
+        logger.warning(f"Stack sampler file for request {label} resolves outside {directory}; not sampling")
+        return None
+    return path
+
+class StackSampler(threading.Thread):
+    """
+    Samples the stack of one thread (the event loop) at a fixed interval and
+    writes the counts in folded format ("frame;frame;frame count" per line),
+    which flamegraph.pl and speedscope render as a flamegraph.
+
+    The event loop runs every concurrent request, so their frames show up in
+    the samples as well. Only one sampler runs at a time.
+    """
+
+    _running = threading.Lock()
+
+    def __init__(self, thread_id: int, interval: float, path: str):
+        super().__init__(name="request-stack-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.path = path
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+
+    @classmethod
+    def start_for(cls, thread_id: int, interval: float, path: str) -> Optional["StackSampler"]:
+        """Start a sampler unless one is already running"""
+        if not cls._running.acquire(blocking=False):
+            return None
+        sampler = cls(thread_id, interval, path)
+        sampler.start()
+        return sampler
+
+    def stop(self):
+        self._stopped.set()
+
+    def run(self):
+        try:
+            while not self._stopped.wait(self.interval):
+                frame = sys._current_frames().get(self.thread_id)
+                if frame is None:
+                    break
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.samples[";".join(reversed(stack))] += 1
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as output:
+                for stack, count in self.samples.most_common():
+                    output.write(f"{stack} {count}\n")
+        except Exception as e:
+            logger.warning(f"Stack sampler failed: {str(e)}")
+        finally:
+            self._running.release()
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware enabling per-request profiling on demand.
+
+    A request is profiled when its X-Profile header carries the configured
+    token (the timings are then returned in a Server-Timing header; add
+    X-Profile-Sampler: true to also capture a stack-sample file) or when it
+    falls in the sampled fraction (timings are only logged). Requests that
+    are not profiled pay one header scan and nothing else: every hook checks
+    request_profile_var and returns straight away when it is unset.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        token: Optional[str] = None,
+        sample_rate: float = 0.0,
+        output_dir: str = "profiles",
+        sampler_interval: float = 0.005
+    ):
+        self.app = app
+        self.token = token.encode("latin-1") if token else None
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.sampler_interval = sampler_interval
+
+    def _requested(self, headers) -> tuple:
+        """(profile with Server-Timing, capture stack samples) asked for by the request headers"""
+        profile = sampler = False
+        for name, value in headers:
+            if name == b"x-profile":
+                profile = hmac.compare_digest(value, self.token)
+            elif name == b"x-profile-sampler":
+                sampler = value.lower() in (b"1", b"true", b"yes")
+        return profile, profile and sampler
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        requested, sample_stacks = self._requested(scope["headers"]) if self.token else (False, False)
+        if not requested and not (self.sample_rate and random.random() < self.sample_rate):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        profile_token = request_profile_var.set(profile)
+        # Keep the logs of a profiled request even when log sampling is on
+        sampled_token = log_sampled_var.set(True)
+        sampler = None
+        if sample_stacks:
+            path = sampler_path(self.output_dir, request_id_var.get())
+            sampler = StackSampler.start_for(threading.get_ident(), self.sampler_interval, path) if path else None
+            if sampler is not None:
+                profile.sampler_file = os.path.basename(path)
+        start_time = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start" and requested:
+                MutableHeaders(scope=message).append("Server-Timing", profile.server_timing(time.perf_counter() - start_time))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            total = time.perf_counter() - start_time
+            if sampler is not None:
+                sampler.stop()
+            logger.info(
+                f"Profile: {scope['method']} {scope['path']} - {total * 1000:.3f}ms",
+                extra={"profile": profile.breakdown(total)}
+            )
+            log_sampled_var.reset(sampled_token)
+            request_profile_var.reset(profile_token)
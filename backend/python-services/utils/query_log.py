@@ -0,0 +1,290 @@
+import asyncio
+import json
+import logging
+import random
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, List, Optional
+
+from utils.metrics import registry
+from utils.profiling import statement_label
+
+logger = logging.getLogger(__name__)
+
+DB_SLOW_STATEMENTS = registry.counter(
+    "db_slow_statements_total",
+    "SQL statements slower than the slow query threshold"
+)
+DB_STATEMENT_EXPLAINS = registry.counter(
+    "db_statement_explains_total",
+    "EXPLAIN (ANALYZE, BUFFERS) runs for slow statements by outcome",
+    ("outcome",)
+)
+
+# Key of the entry that aggregates the statements past max_statements
+OTHER_STATEMENTS = "(other statements)"
+
+_WHITESPACE = re.compile(r"\s+")
+_WRITES = re.compile(r"\b(insert|update|delete|merge|for\s+update|for\s+share)\b")
+
+def explainable(query: str) -> bool:
+    """Whether re-running the statement under EXPLAIN ANALYZE is harmless (a plain read)"""
+    text = query.lstrip().lower()
+    return text.startswith(("select", "with")) and not _WRITES.search(text)
+
+def parameter_shape(value) -> str:
+    """Type and size of a bind parameter, without its value"""
+    if value is None:
+        return "null"
+    if isinstance(value, (str, bytes)):
+        return f"{type(value).__name__}({len(value)})"
+    if isinstance(value, (list, tuple)):
+        element = type(value[0]).__name__ if value else "empty"
+        return f"{element}[{len(value)}]"
+    return type(value).__name__
+
+def status_rows(status) -> int:
+    """Row count of a command status such as 'UPDATE 3' or 'INSERT 0 1'"""
+    count = str(status or "").rpartition(" ")[2]
+    return int(count) if count.isdigit() else 0
+
+def _node_label(node: dict) -> str:
+    label = node.get("Node Type", "?")
+    if "Index Name" in node:
+        label += f" using {node['Index Name']}"
+    if "Relation Name" in node:
+        label += f" on {node['Relation Name']}"
+    return label
+
+def _plan_shape(node: dict) -> str:
+    """Node types, relations and indexes of a plan tree, e.g. Sort(Seq Scan on t)"""
+    children = node.get("Plans") or ()
+    label = _node_label(node)
+    return f"{label}({', '.join(_plan_shape(child) for child in children)})" if children else label
+
+def summarize_plan(document) -> dict:
+    """The parts of an EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) result worth comparing between runs"""
+    explained = document[0]
+    root = explained["Plan"]
+    seq_scans = []
+    nodes = [root]
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get("Plans") or ())
+        if node.get("Node Type") == "Seq Scan":
+            seq_scans.append({
+                "relation": node.get("Relation Name"),
+                "rows": node.get("Actual Rows", 0) * node.get("Actual Loops", 1),
+                "rowsRemovedByFilter": node.get("Rows Removed by Filter", 0),
+            })
+    return {
+        "planningMs": explained.get("Planning Time"),
+        "executionMs": explained.get("Execution Time"),
+        "estimatedRows": root.get("Plan Rows"),
+        "actualRows": root.get("Actual Rows"),
+        "sharedHitBlocks": root.get("Shared Hit Blocks"),
+        "sharedReadBlocks": root.get("Shared Read Blocks"),
+        "seqScans": seq_scans,
+        "shape": _plan_shape(root),
+    }
+
+class StatementStats:
+    """Latency and row-count aggregates of one statement, plus its last captured plan"""
+
+    __slots__ = (
+        "query", "calls", "errors", "total", "max", "rows", "max_rows", "slow_calls",
+        "recent", "explainable", "plan", "plan_changes", "explained_at"
+    )
+
+    def __init__(self, query: str, window: int, can_explain: bool):
+        self.query = query
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.max_rows = 0
+        self.slow_calls = 0
+        # Durations of the latest calls, for the percentiles
+        self.recent: Deque[float] = deque(maxlen=window)
+        self.explainable = can_explain
+        self.plan: Optional[dict] = None
+        self.plan_changes = 0
+        self.explained_at: Optional[float] = None
+
+    def to_dict(self, include_plan: bool) -> dict:
+        recent = sorted(self.recent)
+        succeeded = self.calls - self.errors
+        result = {
+            "statement": OTHER_STATEMENTS if self.query == OTHER_STATEMENTS else statement_label(self.query),
+            "sql": _WHITESPACE.sub(" ", self.query).strip(),
+            "calls": self.calls,
+            "errors": self.errors,
+            "totalMs": round(self.total * 1000, 3),
+            "meanMs": round(self.total / self.calls * 1000, 3) if self.calls else 0.0,
+            "p50Ms": round(recent[len(recent) // 2] * 1000, 3) if recent else 0.0,
+            "p95Ms": round(recent[min(len(recent) - 1, int(len(recent) * 0.95))] * 1000, 3) if recent else 0.0,
+            "maxMs": round(self.max * 1000, 3),
+            "rows": self.rows,
+            "meanRows": round(self.rows / succeeded, 2) if succeeded else 0.0,
+            "maxRows": self.max_rows,
+            "slowCalls": self.slow_calls,
+            "plan": None,
+        }
+        if self.plan is not None:
+            plan = dict(self.plan, changes=self.plan_changes)
+            if not include_plan:
+                plan.pop("plan")
+            result["plan"] = plan
+        return result
+
+# Sort keys accepted by QueryLog.stats()
+STATEMENT_SORTS = {
+    "total": lambda stats: stats.total,
+    "mean": lambda stats: stats.total / stats.calls if stats.calls else 0.0,
+    "max": lambda stats: stats.max,
+    "calls": lambda stats: stats.calls,
+    "rows": lambda stats: stats.rows,
+    "slow": lambda stats: stats.slow_calls,
+}
+
+class QueryLog:
+    """
+    Per-statement latency/row-count aggregates and the slow query log.
+
+    Every statement run on a pooled connection is recorded under its SQL
+    text. Statements slower than the threshold are logged (as warnings, so
+    log sampling keeps them) with the shapes of their parameters, never the
+    values. A sampled fraction of slow reads is re-run on an idle
+    connection of the same pool under EXPLAIN (ANALYZE, BUFFERS), in a
+    read-only transaction with a statement timeout, at most once per
+    statement per explain_interval and one at a time. A plan whose shape
+    differs from the previous capture is logged as a plan change.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        explain_sample_rate: float,
+        explain_interval: float,
+        explain_timeout: float,
+        max_statements: int,
+        window: int
+    ):
+        # A threshold of 0 turns the slow query log (and EXPLAIN capture) off
+        self.threshold = threshold_ms / 1000 if threshold_ms > 0 else float("inf")
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_interval = explain_interval
+        self.explain_timeout = explain_timeout
+        self.max_statements = max_statements
+        self.window = window
+        self._statements: Dict[str, StatementStats] = {}
+        self._explain_task: Optional[asyncio.Task] = None
+        self.explains = 0
+
+    def _track(self, query: str) -> StatementStats:
+        if len(self._statements) >= self.max_statements:
+            query = OTHER_STATEMENTS
+            stats = self._statements.get(query)
+            if stats is not None:
+                return stats
+        stats = self._statements[query] = StatementStats(
+            query, self.window, query != OTHER_STATEMENTS and explainable(query)
+        )
+        return stats
+
+    def record(self, query: str, args: tuple, seconds: float, rows: Optional[int], pool=None):
+        """Account one statement run; rows is None when it failed"""
+        stats = self._statements.get(query)
+        if stats is None:
+            stats = self._track(query)
+        stats.calls += 1
+        stats.total += seconds
+        stats.recent.append(seconds)
+        if seconds > stats.max:
+            stats.max = seconds
+        if rows is None:
+            stats.errors += 1
+        else:
+            stats.rows += rows
+            if rows > stats.max_rows:
+                stats.max_rows = rows
+        if seconds < self.threshold:
+            return
+
+        stats.slow_calls += 1
+        DB_SLOW_STATEMENTS.inc()
+        label = statement_label(query)
+        logger.warning(
+            f"Slow query {label}: {seconds * 1000:.1f}ms, {'failed' if rows is None else f'{rows} rows'}",
+            extra={
+                "statement": label,
+                "durationMs": round(seconds * 1000, 3),
+                "rows": rows,
+                "params": [parameter_shape(value) for value in args],
+            }
+        )
+        if pool is not None and stats.explainable and self._should_explain(stats, pool):
+            stats.explained_at = time.monotonic()
+            self._explain_task = asyncio.get_running_loop().create_task(self._explain(stats, args, seconds, pool))
+
+    def _should_explain(self, stats: StatementStats, pool) -> bool:
+        if not self.explain_sample_rate or random.random() >= self.explain_sample_rate:
+            return False
+        if stats.explained_at is not None and time.monotonic() - stats.explained_at < self.explain_interval:
+            return False
+        if self._explain_task is not None and not self._explain_task.done():
+            return False
+        # Never queue behind requests for a connection just to explain
+        return pool.get_idle_size() > 0
+
+    async def _explain(self, stats: StatementStats, args: tuple, seconds: float, pool):
+        label = statement_label(stats.query)
+        try:
+            # The raw asyncpg pool: the EXPLAIN itself is not recorded or profiled
+            async with pool.pool.acquire(timeout=self.explain_timeout) as connection:
+                async with connection.transaction(readonly=True):
+                    await connection.execute(f"SET LOCAL statement_timeout = {int(self.explain_timeout * 1000)}")
+                    document = await connection.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {stats.query}", *args)
+            if isinstance(document, str):
+                document = json.loads(document)
+            plan = summarize_plan(document)
+        except Exception as e:
+            DB_STATEMENT_EXPLAINS.inc("failed")
+            logger.warning(f"Could not EXPLAIN slow query {label}: {str(e)}")
+            return
+
+        DB_STATEMENT_EXPLAINS.inc("captured")
+        self.explains += 1
+        previous = stats.plan
+        if previous is not None and previous["shape"] != plan["shape"]:
+            stats.plan_changes += 1
+            logger.warning(
+                f"Plan changed for {label}",
+                extra={"statement": label, "previousShape": previous["shape"], "shape": plan["shape"]}
+            )
+        stats.plan = dict(
+            plan,
+            capturedAt=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            pool=pool.name,
+            triggerMs=round(seconds * 1000, 3),
+            plan=document,
+        )
+        logger.info(f"Captured plan for slow query {label}: {plan['shape']}", extra={"statement": label, "plan": plan})
+
+    def stats(self, sort: str = "total", limit: int = 50, include_plans: bool = False) -> dict:
+        statements: List[StatementStats] = sorted(self._statements.values(), key=STATEMENT_SORTS[sort], reverse=True)
+        return {
+            "thresholdMs": None if self.threshold == float("inf") else round(self.threshold * 1000, 3),
+            "explainSampleRate": self.explain_sample_rate,
+            "tracked": len(self._statements),
+            "maxStatements": self.max_statements,
+            "slowCalls": sum(stats.slow_calls for stats in statements),
+            "explains": self.explains,
+            "statements": [stats.to_dict(include_plans) for stats in statements[:limit]],
+        }
+
+    def reset(self):
+        self._statements.clear()
@@ -0,0 +1,75 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from utils.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_CALLS = registry.counter(
+    "single_flight_calls_total",
+    "Read requests by single-flight group and outcome (leader ran the load, coalesced shared it)",
+    ("group", "outcome")
+)
+
+def flight_key(route: str, **params) -> tuple:
+    """Key of a read: the route plus its parameters, sorted and without unset (None) ones"""
+    return (route,) + tuple(sorted((name, value) for name, value in params.items() if value is not None))
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical reads into one in-flight call.
+
+    The first caller for a key starts the load; callers arriving while it
+    runs await the same task and get the same result (or exception).
+    Nothing is kept once the load finishes, so this is not a cache: a
+    request that starts after the load completed runs its own.
+
+    The load runs in its own task, so a caller that goes away (client
+    disconnect) does not cancel the result the others are waiting for.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            SINGLE_FLIGHT_CALLS.inc(self.name, "leader")
+            task = asyncio.ensure_future(load())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+        else:
+            self.coalesced += 1
+            SINGLE_FLIGHT_CALLS.inc(self.name, "coalesced")
+            logger.debug(f"Single-flight '{self.name}' joined in-flight load for {key}")
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # Retrieve the exception so an unawaited failure is not logged as "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+    def stats(self) -> dict:
+        return {"leaders": self.leaders, "coalesced": self.coalesced, "inFlight": len(self._calls)}
+
+_groups: Dict[str, SingleFlight] = {}
+
+def single_flight(name: str) -> SingleFlight:
+    """The process-wide single-flight group with this name"""
+    group: Optional[SingleFlight] = _groups.get(name)
+    if group is None:
+        group = _groups[name] = SingleFlight(name)
+    return group
+
+def single_flight_stats() -> Dict[str, dict]:
+    return {name: group.stats() for name, group in _groups.items()}
@@ -0,0 +1,300 @@
+import asyncio
+import hashlib
+import json
+import zlib
+from typing import Optional
+
+from fastapi import Request, Response
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from utils.profiling import profiled
+
+try:
+    import brotli
+except ImportError:  # listed in requirements.txt; without it only gzip is offered
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the stdlib encoder produces the same bytes
+    orjson = None
+
+# Content types worth compressing; everything else is passed through untouched
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+# Suffixes appended to a strong ETag when the representation is compressed
+ENCODING_ETAG_SUFFIXES = {"gzip": "-gzip", "br": "-br"}
+
+def make_etag(*parts) -> str:
+    """Build a strong ETag from the given version parts (not the response body)"""
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+def _strip_etag(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_ETAG_SUFFIXES.values():
+        if tag.endswith(f'{suffix}"'):
+            return tag[:-len(suffix) - 1] + '"'
+    return tag
+
+def matched_etag(request: Request, etag: str) -> Optional[str]:
+    """
+    The If-None-Match entry that matches the given ETag, as the client sent it
+    (with any -gzip/-br suffix), or None when nothing matches.
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    if header.strip() == "*":
+        return etag
+    for candidate in header.split(","):
+        if _strip_etag(candidate) == etag:
+            return candidate.strip()
+    return None
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True when the request's If-None-Match header matches the given ETag"""
+    return matched_etag(request, etag) is not None
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    """
+    Return a 304 response when the client already holds this ETag, else None.
+
+    The 304 repeats the tag the client matched, so a compressed representation
+    keeps its encoding suffix and the client's cached copy stays valid.
+    """
+    matched = matched_etag(request, etag)
+    if matched is not None:
+        return Response(status_code=304, headers={"ETag": matched, "Cache-Control": "no-cache"})
+    return None
+
+def set_etag(response: Response, etag: str):
+    """Attach the ETag to a 200 response and ask clients to revalidate it"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+
+@profiled("json")
+def json_bytes(content) -> bytes:
+    """
+    Serialize plain JSON data (dicts, lists, str, int, bool, None) to bytes.
+
+    Output is identical to FastAPI's JSONResponse (compact separators, UTF-8,
+    non-ASCII left unescaped); orjson is used when installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def json_response(content, headers: Optional[dict] = None) -> Response:
+    """
+    JSON response for data that is already in response shape.
+
+    Returning a Response skips FastAPI's response_model validation and
+    jsonable_encoder pass, so only use it for data built to match the model.
+    """
+    return Response(content=json_bytes(content), media_type="application/json", headers=headers)
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick br or gzip from an Accept-Encoding header, honouring q-values"""
+    preferences = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        preferences[name] = quality
+
+    candidates = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = preferences.get(encoding, preferences.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+class _Encoder:
+    """Incremental gzip/brotli compressor"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            # wbits=31 produces a gzip container
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(data)
+        return self._compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.flush()
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing responses with brotli (when accepted) or gzip.
+
+    Bodies smaller than minimum_size, non-text content types and responses
+    that already carry a Content-Encoding are passed through. Streaming
+    responses are compressed chunk by chunk. They are flushed once flush_size
+    bytes are pending, or flush_interval seconds after the oldest pending
+    chunk, so NDJSON consumers still receive slow rows promptly while fast
+    streams compress across rows.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        flush_size: int = 65536,
+        flush_interval: float = 0.1,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(self, encoding, send)
+        try:
+            await self.app(scope, receive, responder.send)
+        finally:
+            responder.cancel_flush()
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.downstream = send
+        self.start_message: Optional[Message] = None
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+        # Uncompressed bytes written since the last flush, and the timer that flushes them
+        self.pending = 0
+        self.flush_task: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()
+
+    def cancel_flush(self):
+        if self.flush_task is not None:
+            self.flush_task.cancel()
+            self.flush_task = None
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.middleware.flush_interval)
+        async with self.lock:
+            self.flush_task = None
+            if not self.pending:
+                return
+            self.pending = 0
+            chunk = self.encoder.flush()
+            try:
+                await self.downstream({"type": "http.response.body", "body": chunk, "more_body": True})
+            except Exception:
+                # The client went away; the application's next send reports it
+                pass
+
+    def _should_compress(self, headers: MutableHeaders) -> bool:
+        if self.start_message["status"] in (204, 304):
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        # Event streams are long-lived; a compressor per open stream costs more memory than it saves
+        return content_type.startswith(COMPRESSIBLE_TYPES) and not content_type.startswith("text/event-stream")
+
+    def _mark_encoded(self, headers: MutableHeaders):
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        etag = headers.get("etag")
+        if etag and etag.endswith('"') and not etag.startswith("W/"):
+            headers["ETag"] = etag[:-1] + ENCODING_ETAG_SUFFIXES[self.encoding] + '"'
+
+    async def send(self, message: Message):
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            self.start_message = message
+            return
+
+        if message_type != "http.response.body" or self.passthrough:
+            await self.downstream(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if not self._should_compress(headers) or (not more_body and len(body) < self.middleware.minimum_size):
+                self.passthrough = True
+                await self.downstream(self.start_message)
+                await self.downstream(message)
+                return
+
+            self.encoder = _Encoder(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+            self._mark_encoded(headers)
+
+            if not more_body:
+                # Whole body available: compress in one go and set the exact length
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(compressed))
+                await self.downstream(self.start_message)
+                await self.downstream({"type": "http.response.body", "body": compressed})
+                return
+
+            del headers["Content-Length"]
+            await self.downstream(self.start_message)
+
+        # The lock keeps a timed flush from interleaving with this chunk
+        async with self.lock:
+            if not more_body:
+                self.cancel_flush()
+                chunk = self.encoder.compress(body) + self.encoder.finish()
+                await self.downstream({"type": "http.response.body", "body": chunk})
+                return
+
+            chunk = self.encoder.compress(body)
+            self.pending += len(body)
+            if self.pending >= self.middleware.flush_size:
+                self.cancel_flush()
+                self.pending = 0
+                chunk += self.encoder.flush()
+            elif self.pending and self.flush_task is None:
+                self.flush_task = asyncio.create_task(self._flush_later())
+            if chunk:
+                await self.downstream({"type": "http.response.body", "body": chunk, "more_body": True})